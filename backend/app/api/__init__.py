@@ -2,7 +2,7 @@
 API路由模块
 """
 from fastapi import APIRouter
-from . import auth, users, gardens, orders, services, community, reminders, smart_reminders, iot
+from . import auth, users, gardens, orders, services, community, reminders, smart_reminders, iot, system
 
 api_router = APIRouter()
 
@@ -16,3 +16,4 @@ api_router.include_router(community.router, prefix="/community", tags=["社区"]
 api_router.include_router(reminders.router, prefix="/reminders", tags=["任务提醒"])
 api_router.include_router(smart_reminders.router, prefix="/smart-reminders", tags=["智能提醒"])
 api_router.include_router(iot.router, prefix="/iot", tags=["物联网"])
+api_router.include_router(system.router, prefix="/system", tags=["系统"])
@@ -9,6 +9,7 @@ from app.core.security import create_access_token
 from app.models.user import User
 from app.schemas.user import WechatLoginRequest, LoginResponse, User as UserSchema
 from app.utils.wechat import wechat_api
+from app.api.deps import invalidate_user_cache
 
 router = APIRouter()
 
@@ -20,7 +21,7 @@ class TestLoginRequest(BaseModel):
 
 
 @router.post("/wechat-login", response_model=LoginResponse, summary="微信登录")
-async def wechat_login(
+def wechat_login(
     login_data: WechatLoginRequest,
     db: Session = Depends(get_db)
 ):
@@ -71,7 +72,7 @@ async def wechat_login(
 
 
 @router.post("/test-login", response_model=LoginResponse, summary="测试登录（开发用）")
-async def test_login(
+def test_login(
     login_data: TestLoginRequest,
     db: Session = Depends(get_db)
 ):
@@ -111,6 +112,9 @@ async def test_login(
             db.commit()
             db.refresh(user)
 
+            # 角色已变更，清除认证缓存中的用户快照
+            invalidate_user_cache(user.id)
+
     # 如果是新用户，自动创建菜地
     if is_new_user and login_data.role == 'tenant':
         from garden_images import get_random_garden_data
@@ -2,9 +2,12 @@
 社区功能API路由
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import Optional
-from app.core.database import get_db
+from sqlalchemy.exc import IntegrityError
+from typing import Dict, List, Optional
+from app.core.database import get_db, get_async_db
 from app.models.post import Post
 from app.models.comment import Comment
 from app.models.like import Like
@@ -21,17 +24,91 @@ from app.schemas.post import (
     CommentListResponse
 )
 from app.api.deps import get_current_user
+from app.api.pagination import keyset_paginate_async
+from app.services.post_counter import PostCounterService
 
 router = APIRouter()
 
 
+async def _load_authors(db: AsyncSession, user_ids) -> Dict[int, User]:
+    """一次 IN 查询加载作者信息，返回 {user_id: User}"""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+    result = await db.execute(select(User).filter(User.id.in_(user_ids)))
+    return {user.id: user for user in result.scalars().all()}
+
+
+async def _assemble_post_details(
+    db: AsyncSession,
+    posts: List[Post],
+    viewer_id: Optional[int] = None,
+    authors: Optional[Dict[int, User]] = None
+) -> List[PostDetail]:
+    """
+    组装帖子详情列表（包含作者信息和点赞状态）
+
+    作者信息一次 IN 查询、当前用户的点赞状态一次查询、未合并的计数增量一次查询，
+    直接构造响应模型，不再经过 from_orm -> dict -> PostDetail 的往返
+
+    Args:
+        db: 异步数据库会话
+        posts: 帖子列表
+        viewer_id: 当前用户ID（为空则不查询点赞状态）
+        authors: 已知的作者信息（如"我的帖子"场景），为空则批量查询
+
+    Returns:
+        帖子详情列表（顺序与输入一致）
+    """
+    if not posts:
+        return []
+
+    post_ids = [post.id for post in posts]
+
+    if authors is None:
+        authors = await _load_authors(db, [post.user_id for post in posts])
+
+    liked_post_ids = set()
+    if viewer_id:
+        result = await db.execute(
+            select(Like.post_id).filter(
+                Like.user_id == viewer_id,
+                Like.post_id.in_(post_ids)
+            )
+        )
+        liked_post_ids = set(result.scalars().all())
+
+    pending = await PostCounterService.get_pending_async(db, post_ids)
+
+    post_details = []
+    for post in posts:
+        author = authors.get(post.user_id)
+        like_delta, comment_delta = pending.get(post.id, (0, 0))
+        post_details.append(PostDetail(
+            id=post.id,
+            user_id=post.user_id,
+            title=post.title,
+            content=post.content,
+            images=post.images,
+            like_count=max(0, (post.like_count or 0) + like_delta),
+            comment_count=max(0, (post.comment_count or 0) + comment_delta),
+            created_at=post.created_at,
+            user_nickname=author.nickname if author else None,
+            user_avatar=author.avatar if author else None,
+            is_liked=post.id in liked_post_ids
+        ))
+
+    return post_details
+
+
 # ========== 帖子接口 ==========
 
 @router.get("/posts", response_model=PostListResponse, summary="获取帖子列表")
 async def get_posts(
     skip: int = Query(0, ge=0, description="跳过数量"),
     limit: int = Query(20, ge=1, le=100, description="每页数量"),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="分页游标：首页传空字符串，之后传上一页返回的next_cursor；传入后不返回总数"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     获取社区帖子列表（公开接口，可不登录访问）
@@ -39,44 +116,35 @@ async def get_posts(
     """
     current_user = None  # 公开接口，不需要登录
 
-    # 获取总数
-    total = db.query(Post).count()
+    total = None
+    next_cursor = None
+    if cursor is not None:
+        # 游标分页，不统计总数
+        posts, next_cursor = await keyset_paginate_async(db, select(Post), [Post.created_at, Post.id], cursor, limit)
+    else:
+        # 获取总数
+        total = await db.scalar(select(func.count(Post.id)))
 
-    # 分页查询
-    posts = db.query(Post).order_by(Post.created_at.desc()).offset(skip).limit(limit).all()
+        # 分页查询
+        result = await db.execute(select(Post).order_by(Post.created_at.desc()).offset(skip).limit(limit))
+        posts = result.scalars().all()
 
     # 构造详情列表（包含用户信息和点赞状态）
-    post_details = []
-    for post in posts:
-        user = db.query(User).filter(User.id == post.user_id).first()
-
-        post_dict = PostDetail.from_orm(post).dict()
-        if user:
-            post_dict["user_nickname"] = user.nickname
-            post_dict["user_avatar"] = user.avatar
-
-        # 检查当前用户是否点赞
-        if current_user:
-            like = db.query(Like).filter(
-                Like.post_id == post.id,
-                Like.user_id == current_user.id
-            ).first()
-            post_dict["is_liked"] = like is not None
+    viewer_id = current_user.id if current_user else None
+    post_details = await _assemble_post_details(db, posts, viewer_id=viewer_id)
 
-        post_details.append(PostDetail(**post_dict))
-
-    return PostListResponse(total=total, items=post_details)
+    return PostListResponse(total=total, items=post_details, next_cursor=next_cursor)
 
 
 @router.get("/posts/{post_id}", response_model=PostDetail, summary="获取帖子详情")
 async def get_post(
     post_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取指定帖子的详细信息（公开接口）"""
     current_user = None  # 公开接口，不需要登录
 
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await db.get(Post, post_id)
 
     if not post:
         raise HTTPException(
@@ -84,26 +152,12 @@ async def get_post(
             detail="帖子不存在"
         )
 
-    user = db.query(User).filter(User.id == post.user_id).first()
-
-    post_dict = PostDetail.from_orm(post).dict()
-    if user:
-        post_dict["user_nickname"] = user.nickname
-        post_dict["user_avatar"] = user.avatar
-
-    # 检查当前用户是否点赞
-    if current_user:
-        like = db.query(Like).filter(
-            Like.post_id == post.id,
-            Like.user_id == current_user.id
-        ).first()
-        post_dict["is_liked"] = like is not None
-
-    return PostDetail(**post_dict)
+    viewer_id = current_user.id if current_user else None
+    return (await _assemble_post_details(db, [post], viewer_id=viewer_id))[0]
 
 
 @router.post("/posts", response_model=PostSchema, summary="发布帖子")
-async def create_post(
+def create_post(
     post_data: PostCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -127,7 +181,7 @@ async def create_post(
 
 
 @router.put("/posts/{post_id}", response_model=PostSchema, summary="更新帖子")
-async def update_post(
+def update_post(
     post_id: int,
     post_data: PostUpdate,
     current_user: User = Depends(get_current_user),
@@ -161,7 +215,7 @@ async def update_post(
 
 
 @router.delete("/posts/{post_id}", summary="删除帖子")
-async def delete_post(
+def delete_post(
     post_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -188,7 +242,7 @@ async def delete_post(
 # ========== 点赞接口 ==========
 
 @router.post("/posts/{post_id}/like", summary="点赞帖子")
-async def like_post(
+def like_post(
     post_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -224,16 +278,26 @@ async def like_post(
 
     db.add(like)
 
-    # 更新帖子点赞数
-    post.like_count += 1
+    # 记录点赞数增量（不直接改写帖子行，由定时任务合并）
+    PostCounterService.add_delta(db, post_id, like_delta=1)
 
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # 并发重复点赞，被唯一约束拦截
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="已经点赞过了"
+        )
+
+    like_count, _ = PostCounterService.get_counts(db, post)
 
-    return {"message": "点赞成功", "like_count": post.like_count}
+    return {"message": "点赞成功", "like_count": like_count}
 
 
 @router.delete("/posts/{post_id}/like", summary="取消点赞")
-async def unlike_post(
+def unlike_post(
     post_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -249,28 +313,29 @@ async def unlike_post(
             detail="帖子不存在"
         )
 
-    # 查找点赞记录
-    like = db.query(Like).filter(
-        Like.post_id == post_id,
-        Like.user_id == current_user.id
-    ).first()
+    # 删除点赞记录（条件删除，并发取消点赞时只有真正删除记录的请求计入增量）
+    result = db.execute(
+        delete(Like).where(
+            Like.post_id == post_id,
+            Like.user_id == current_user.id
+        )
+    )
 
-    if not like:
+    if result.rowcount != 1:
+        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="还未点赞"
         )
 
-    # 删除点赞记录
-    db.delete(like)
-
-    # 更新帖子点赞数
-    if post.like_count > 0:
-        post.like_count -= 1
+    # 记录点赞数增量（不直接改写帖子行，由定时任务合并）
+    PostCounterService.add_delta(db, post_id, like_delta=-1)
 
     db.commit()
 
-    return {"message": "取消点赞成功", "like_count": post.like_count}
+    like_count, _ = PostCounterService.get_counts(db, post)
+
+    return {"message": "取消点赞成功", "like_count": like_count}
 
 
 # ========== 评论接口 ==========
@@ -280,12 +345,12 @@ async def get_post_comments(
     post_id: int,
     skip: int = Query(0, ge=0, description="跳过数量"),
     limit: int = Query(50, ge=1, le=100, description="每页数量"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取指定帖子的评论列表"""
 
     # 检查帖子是否存在
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await db.get(Post, post_id)
 
     if not post:
         raise HTTPException(
@@ -294,29 +359,37 @@ async def get_post_comments(
         )
 
     # 获取总数
-    total = db.query(Comment).filter(Comment.post_id == post_id).count()
+    total = await db.scalar(
+        select(func.count(Comment.id)).filter(Comment.post_id == post_id)
+    )
 
     # 分页查询
-    comments = db.query(Comment).filter(Comment.post_id == post_id)\
-        .order_by(Comment.created_at.asc()).offset(skip).limit(limit).all()
+    result = await db.execute(
+        select(Comment).filter(Comment.post_id == post_id)
+        .order_by(Comment.created_at.asc()).offset(skip).limit(limit)
+    )
+    comments = result.scalars().all()
 
-    # 构造详情列表（包含用户信息）
+    # 构造详情列表（包含用户信息，作者批量查询）
+    authors = await _load_authors(db, [comment.user_id for comment in comments])
     comment_details = []
     for comment in comments:
-        user = db.query(User).filter(User.id == comment.user_id).first()
-
-        comment_dict = CommentDetail.from_orm(comment).dict()
-        if user:
-            comment_dict["user_nickname"] = user.nickname
-            comment_dict["user_avatar"] = user.avatar
-
-        comment_details.append(CommentDetail(**comment_dict))
+        author = authors.get(comment.user_id)
+        comment_details.append(CommentDetail(
+            id=comment.id,
+            post_id=comment.post_id,
+            user_id=comment.user_id,
+            content=comment.content,
+            created_at=comment.created_at,
+            user_nickname=author.nickname if author else None,
+            user_avatar=author.avatar if author else None
+        ))
 
     return CommentListResponse(total=total, items=comment_details)
 
 
 @router.post("/posts/{post_id}/comments", response_model=CommentSchema, summary="发表评论")
-async def create_comment(
+def create_comment(
     post_id: int,
     comment_data: CommentCreate,
     current_user: User = Depends(get_current_user),
@@ -342,8 +415,8 @@ async def create_comment(
 
     db.add(comment)
 
-    # 更新帖子评论数
-    post.comment_count += 1
+    # 记录评论数增量（不直接改写帖子行，由定时任务合并）
+    PostCounterService.add_delta(db, post_id, comment_delta=1)
 
     db.commit()
     db.refresh(comment)
@@ -352,7 +425,7 @@ async def create_comment(
 
 
 @router.delete("/comments/{comment_id}", summary="删除评论")
-async def delete_comment(
+def delete_comment(
     comment_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -370,12 +443,13 @@ async def delete_comment(
             detail="评论不存在或无权限操作"
         )
 
-    # 更新帖子评论数
-    post = db.query(Post).filter(Post.id == comment.post_id).first()
-    if post and post.comment_count > 0:
-        post.comment_count -= 1
+    # 条件删除，并发删除同一评论时只有真正删除记录的请求计入增量
+    result = db.execute(delete(Comment).where(Comment.id == comment.id))
+
+    if result.rowcount == 1:
+        # 记录评论数增量（不直接改写帖子行，由定时任务合并）
+        PostCounterService.add_delta(db, comment.post_id, comment_delta=-1)
 
-    db.delete(comment)
     db.commit()
 
     return {"message": "删除成功"}
@@ -388,31 +462,28 @@ async def get_my_posts(
     skip: int = Query(0, ge=0, description="跳过数量"),
     limit: int = Query(20, ge=1, le=100, description="每页数量"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取当前用户发布的帖子列表"""
 
     # 获取总数
-    total = db.query(Post).filter(Post.user_id == current_user.id).count()
+    total = await db.scalar(
+        select(func.count(Post.id)).filter(Post.user_id == current_user.id)
+    )
 
     # 分页查询
-    posts = db.query(Post).filter(Post.user_id == current_user.id)\
-        .order_by(Post.created_at.desc()).offset(skip).limit(limit).all()
-
-    # 构造详情列表
-    post_details = []
-    for post in posts:
-        post_dict = PostDetail.from_orm(post).dict()
-        post_dict["user_nickname"] = current_user.nickname
-        post_dict["user_avatar"] = current_user.avatar
-
-        # 检查点赞状态
-        like = db.query(Like).filter(
-            Like.post_id == post.id,
-            Like.user_id == current_user.id
-        ).first()
-        post_dict["is_liked"] = like is not None
-
-        post_details.append(PostDetail(**post_dict))
+    result = await db.execute(
+        select(Post).filter(Post.user_id == current_user.id)
+        .order_by(Post.created_at.desc()).offset(skip).limit(limit)
+    )
+    posts = result.scalars().all()
+
+    # 构造详情列表（作者即当前用户，点赞状态一次查询）
+    post_details = await _assemble_post_details(
+        db,
+        posts,
+        viewer_id=current_user.id,
+        authors={current_user.id: current_user}
+    )
 
     return PostListResponse(total=total, items=post_details)
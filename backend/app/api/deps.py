@@ -1,10 +1,13 @@
 """
 API依赖注入
 """
+import time
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached
+from app.core.cache import TTLCache
+from app.core.config import settings
 from app.core.database import get_db
 from app.core.security import decode_access_token
 from app.models.user import User
@@ -12,63 +15,125 @@ from app.models.user import User
 security = HTTPBearer()
 optional_security = HTTPBearer(auto_error=False)
 
+# 认证缓存
+# token -> (用户ID, 令牌过期时间戳)，省去重复的 JWT 解码与验签
+_token_cache = TTLCache(maxsize=settings.AUTH_CACHE_MAX_SIZE, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+# 用户ID -> 用户字段快照，省去每个请求的 users 表查询
+_user_cache = TTLCache(maxsize=settings.AUTH_CACHE_MAX_SIZE, ttl=settings.AUTH_CACHE_TTL_SECONDS)
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
+
+def _credentials_exception(detail: str = "无效的认证凭证") -> HTTPException:
+    """构造401认证异常"""
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def _snapshot_user(user: User) -> dict:
+    """提取用户的列字段快照"""
+    return {column.key: getattr(user, column.key) for column in User.__table__.columns}
+
+
+def _attach_user_snapshot(snapshot: dict, db: Session) -> User:
     """
-    获取当前登录用户
+    将用户快照挂载到当前会话（不发起查询）
 
-    Args:
-        credentials: HTTP Authorization凭证
-        db: 数据库会话
+    构造一个"已分离"的用户对象并以 load=False 合并进会话，
+    后续修改和 refresh 与查询得到的对象行为一致
+    """
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
 
-    Returns:
-        当前用户对象
+
+def invalidate_user_cache(user_id: int) -> None:
+    """用户信息变更后清除缓存的用户快照"""
+    _user_cache.delete(user_id)
+
+
+def _resolve_user_id(token: str) -> int:
+    """
+    解析令牌得到用户ID（带缓存）
 
     Raises:
-        HTTPException: 认证失败时抛出401错误
+        HTTPException: 令牌无效时抛出401错误
     """
-    token = credentials.credentials
-    payload = decode_access_token(token)
+    cached = _token_cache.get(token)
+    if cached is not None:
+        user_id, expire_at = cached
+        if expire_at is None or expire_at > time.time():
+            return user_id
+        _token_cache.delete(token)
 
+    payload = decode_access_token(token)
     if payload is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="无效的认证凭证",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _credentials_exception()
 
     user_id_str = payload.get("sub")
     if user_id_str is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="无效的认证凭证",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _credentials_exception()
 
     # JWT的sub字段必须是字符串，需要转换为整数
     try:
         user_id = int(user_id_str)
     except (ValueError, TypeError):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="无效的认证凭证",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _credentials_exception()
+
+    # 缓存有效期不超过令牌本身的过期时间
+    expire_at = payload.get("exp")
+    ttl = None
+    if expire_at is not None:
+        ttl = min(settings.AUTH_CACHE_TTL_SECONDS, expire_at - time.time())
+    _token_cache.set(token, (user_id, expire_at), ttl=ttl)
+
+    return user_id
+
+
+def _resolve_user(token: str, db: Session) -> User:
+    """
+    根据令牌获取当前用户
+
+    get_current_user 与 get_current_user_optional 共用
+
+    Raises:
+        HTTPException: 令牌无效或用户不存在时抛出401错误
+    """
+    user_id = _resolve_user_id(token)
+
+    snapshot = _user_cache.get(user_id)
+    if snapshot is not None:
+        return _attach_user_snapshot(snapshot, db)
 
     user = db.query(User).filter(User.id == user_id).first()
     if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="用户不存在",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _credentials_exception("用户不存在")
 
+    _user_cache.set(user_id, _snapshot_user(user))
     return user
 
 
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> User:
+    """
+    获取当前登录用户
+
+    Args:
+        credentials: HTTP Authorization凭证
+        db: 数据库会话
+
+    Returns:
+        当前用户对象
+
+    Raises:
+        HTTPException: 认证失败时抛出401错误
+    """
+    return _resolve_user(credentials.credentials, db)
+
+
 def get_current_user_optional(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
     db: Session = Depends(get_db)
@@ -92,43 +157,7 @@ def get_current_user_optional(
     if credentials is None:
         return None
 
-    token = credentials.credentials
-    payload = decode_access_token(token)
-
-    if payload is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="无效的认证凭证",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    user_id_str = payload.get("sub")
-    if user_id_str is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="无效的认证凭证",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    # JWT的sub字段必须是字符串，需要转换为整数
-    try:
-        user_id = int(user_id_str)
-    except (ValueError, TypeError):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="无效的认证凭证",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="用户不存在",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    return user
+    return _resolve_user(credentials.credentials, db)
 
 
 def get_current_admin(
@@ -2,10 +2,12 @@
 菜地API路由
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import List, Optional
 from datetime import date, datetime
-from app.core.database import get_db
+from app.core.database import get_db, get_async_db
 from app.models.garden import Garden, GardenStatus
 from app.models.user import User
 from app.models.order import Order, OrderStatus
@@ -14,29 +16,29 @@ from app.schemas.garden import (
     GardenCreate,
     GardenUpdate,
     GardenListResponse,
-    OrderInfo
+    OrderInfo,
+    RentalPeriod
 )
 from app.api.deps import get_current_user, get_current_user_optional, get_current_admin
+from app.api.pagination import keyset_paginate_async
+from app.services.rental_calendar import RentalCalendarService
 
 router = APIRouter()
 
 
-def _enrich_garden_with_order_info(garden: Garden, user_id: Optional[int], db: Session) -> dict:
+def _garden_to_dict(garden: Garden) -> dict:
     """
-    丰富菜地信息，添加订单相关数据
+    将菜地对象转换为字典，手动处理 images 字段
 
     Args:
         garden: 菜地对象
-        user_id: 当前用户ID（可选）
-        db: 数据库会话
 
     Returns:
-        包含订单信息的菜地字典
+        菜地字典（is_mine/current_order 默认为空）
     """
     import json
 
-    # 转换 garden 对象为字典，手动处理 images 字段
-    garden_dict = {
+    return {
         'id': garden.id,
         'name': garden.name,
         'area': garden.area,
@@ -47,36 +49,85 @@ def _enrich_garden_with_order_info(garden: Garden, user_id: Optional[int], db: S
         'images': json.loads(garden.images) if garden.images and isinstance(garden.images, str) else (garden.images or []),
         'video_stream_url': garden.video_stream_url,
         'created_at': garden.created_at,
-        'updated_at': garden.updated_at
+        'updated_at': garden.updated_at,
+        'is_mine': False,
+        'current_order': None
+    }
+
+
+def _build_order_info(order: Order, today: date) -> dict:
+    """根据订单构造嵌套在菜地响应中的订单信息"""
+    # 计算剩余天数
+    remaining_days = (order.end_date - today).days
+
+    return {
+        'order_id': order.id,
+        'start_date': order.start_date,
+        'end_date': order.end_date,
+        'status': order.status,
+        'remaining_days': max(0, remaining_days),
+        'is_active': remaining_days >= 0
     }
 
-    garden_dict['is_mine'] = False
-    garden_dict['current_order'] = None
 
-    # 如果用户已登录，检查是否有活跃订单
-    if user_id:
-        active_order = db.query(Order).filter(
+async def _enrich_gardens_with_order_info(gardens: List[Garden], user_id: Optional[int], db: AsyncSession) -> List[dict]:
+    """
+    批量丰富菜地信息，添加订单相关数据
+
+    一次 IN 查询取出当前用户在这些菜地上的全部活跃订单，再在内存中关联，
+    避免每块菜地单独查询一次订单
+
+    Args:
+        gardens: 菜地对象列表
+        user_id: 当前用户ID（可选）
+        db: 异步数据库会话
+
+    Returns:
+        包含订单信息的菜地字典列表（顺序与输入一致）
+    """
+    garden_dicts = [_garden_to_dict(garden) for garden in gardens]
+
+    if not user_id or not gardens:
+        return garden_dicts
+
+    today = date.today()
+    result = await db.execute(
+        select(Order).filter(
             Order.user_id == user_id,
-            Order.garden_id == garden.id,
+            Order.garden_id.in_([garden.id for garden in gardens]),
             Order.status.in_([OrderStatus.PAID, OrderStatus.ACTIVE]),
-            Order.end_date >= date.today()
-        ).first()
+            Order.end_date >= today
+        ).order_by(Order.id)
+    )
+    active_orders = result.scalars().all()
 
-        if active_order:
-            # 计算剩余天数
-            remaining_days = (active_order.end_date - date.today()).days
+    # 每块菜地只取一条活跃订单（与单条查询的 first() 行为保持一致）
+    order_by_garden = {}
+    for order in active_orders:
+        order_by_garden.setdefault(order.garden_id, order)
 
+    for garden_dict in garden_dicts:
+        active_order = order_by_garden.get(garden_dict['id'])
+        if active_order:
             garden_dict['is_mine'] = True
-            garden_dict['current_order'] = {
-                'order_id': active_order.id,
-                'start_date': active_order.start_date,
-                'end_date': active_order.end_date,
-                'status': active_order.status,
-                'remaining_days': max(0, remaining_days),
-                'is_active': remaining_days >= 0
-            }
+            garden_dict['current_order'] = _build_order_info(active_order, today)
 
-    return garden_dict
+    return garden_dicts
+
+
+async def _enrich_garden_with_order_info(garden: Garden, user_id: Optional[int], db: AsyncSession) -> dict:
+    """
+    丰富菜地信息，添加订单相关数据
+
+    Args:
+        garden: 菜地对象
+        user_id: 当前用户ID（可选）
+        db: 异步数据库会话
+
+    Returns:
+        包含订单信息的菜地字典
+    """
+    return (await _enrich_gardens_with_order_info([garden], user_id, db))[0]
 
 
 @router.get("", response_model=GardenListResponse, summary="获取菜地列表")
@@ -84,34 +135,53 @@ async def get_gardens(
     status: Optional[GardenStatus] = Query(None, description="筛选状态"),
     skip: int = Query(0, ge=0, description="跳过数量"),
     limit: int = Query(20, ge=1, le=100, description="每页数量"),
+    cursor: Optional[str] = Query(None, description="分页游标：首页传空字符串，之后传上一页返回的next_cursor；传入后不返回总数"),
+    available_from: Optional[date] = Query(None, description="可租开始日期（与available_to一起传入）"),
+    available_to: Optional[date] = Query(None, description="可租结束日期（与available_from一起传入）"),
     current_user: Optional[User] = Depends(get_current_user_optional),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     获取菜地列表
 
-    支持按状态筛选和分页，如果用户已登录会标记用户的菜地
+    支持按状态、可租时间段筛选和分页，如果用户已登录会标记用户的菜地
     """
-    query = db.query(Garden)
+    stmt = select(Garden)
 
     # 状态筛选
     if status is not None:
-        query = query.filter(Garden.status == status)
-
-    # 获取总数
-    total = query.count()
-
-    # 分页查询
-    gardens = query.order_by(Garden.id.desc()).offset(skip).limit(limit).all()
-
-    # 丰富菜地信息
+        stmt = stmt.filter(Garden.status == status)
+
+    # 可租时间段筛选（NOT EXISTS 反连接，走订单表的租期索引）
+    if available_from is not None or available_to is not None:
+        if available_from is None or available_to is None or available_to < available_from:
+            raise HTTPException(
+                status_code=400,
+                detail="可租时间段需同时传入开始和结束日期，且结束日期不早于开始日期"
+            )
+        stmt = stmt.filter(RentalCalendarService.available_condition(available_from, available_to))
+
+    total = None
+    next_cursor = None
+    if cursor is not None:
+        # 游标分页，不统计总数
+        gardens, next_cursor = await keyset_paginate_async(db, stmt, [Garden.id], cursor, limit)
+    else:
+        # 获取总数
+        total = await db.scalar(select(func.count()).select_from(stmt.subquery()))
+
+        # 分页查询
+        result = await db.execute(stmt.order_by(Garden.id.desc()).offset(skip).limit(limit))
+        gardens = result.scalars().all()
+
+    # 丰富菜地信息（批量关联订单）
     user_id = current_user.id if current_user else None
     garden_list = [
-        GardenSchema(**_ensure_video_url(_enrich_garden_with_order_info(garden, user_id, db)))
-        for garden in gardens
+        _to_garden_schema(garden_dict)
+        for garden_dict in await _enrich_gardens_with_order_info(gardens, user_id, db)
     ]
 
-    return GardenListResponse(total=total, items=garden_list)
+    return GardenListResponse(total=total, items=garden_list, next_cursor=next_cursor)
 
 
 @router.get("/my", response_model=GardenListResponse, summary="获取我的菜地")
@@ -120,15 +190,15 @@ async def get_my_gardens(
     skip: int = Query(0, ge=0, description="跳过数量"),
     limit: int = Query(20, ge=1, le=100, description="每页数量"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     获取我的菜地列表
 
     基于用户的活跃订单返回菜地列表
     """
-    # 查询用户的订单
-    query = db.query(Order).filter(
+    # 订单与菜地一次 JOIN 查出，避免逐条订单查询菜地
+    stmt = select(Order, Garden).join(Garden, Garden.id == Order.garden_id).filter(
         Order.user_id == current_user.id,
         Order.status.in_([OrderStatus.PAID, OrderStatus.ACTIVE, OrderStatus.COMPLETED])
     )
@@ -137,54 +207,26 @@ async def get_my_gardens(
     today = date.today()
     if status_filter == 'active':
         # 只显示未过期的
-        query = query.filter(Order.end_date >= today)
+        stmt = stmt.filter(Order.end_date >= today)
     elif status_filter == 'expired':
         # 只显示已过期的
-        query = query.filter(Order.end_date < today)
+        stmt = stmt.filter(Order.end_date < today)
     # 'all' 或 None - 显示全部
 
     # 获取总数
-    total = query.count()
+    total = await db.scalar(select(func.count()).select_from(stmt.subquery()))
 
     # 分页查询
-    orders = query.order_by(Order.created_at.desc()).offset(skip).limit(limit).all()
+    result = await db.execute(stmt.order_by(Order.created_at.desc()).offset(skip).limit(limit))
+    rows = result.all()
 
-    # 获取对应的菜地并丰富信息
+    # 丰富菜地信息
     garden_list = []
-    for order in orders:
-        garden = db.query(Garden).filter(Garden.id == order.garden_id).first()
-        if garden:
-            import json
-
-            remaining_days = (order.end_date - today).days
-
-            # 手动构建字典，处理 images 字段
-            garden_dict = {
-                'id': garden.id,
-                'name': garden.name,
-                'area': garden.area,
-                'price': garden.price,
-                'status': garden.status,
-                'location': garden.location,
-                'description': garden.description,
-                'images': json.loads(garden.images) if garden.images and isinstance(garden.images, str) else (garden.images or []),
-                'video_stream_url': garden.video_stream_url,
-                'created_at': garden.created_at,
-                'updated_at': garden.updated_at
-            }
-
-            garden_dict['is_mine'] = True
-            garden_dict['current_order'] = {
-                'order_id': order.id,
-                'start_date': order.start_date,
-                'end_date': order.end_date,
-                'status': order.status,
-                'remaining_days': max(0, remaining_days),
-                'is_active': remaining_days >= 0
-            }
-            # 确保有视频URL
-            garden_dict = _ensure_video_url(garden_dict)
-            garden_list.append(GardenSchema(**garden_dict))
+    for order, garden in rows:
+        garden_dict = _garden_to_dict(garden)
+        garden_dict['is_mine'] = True
+        garden_dict['current_order'] = _build_order_info(order, today)
+        garden_list.append(_to_garden_schema(garden_dict))
 
     return GardenListResponse(total=total, items=garden_list)
 
@@ -193,10 +235,10 @@ async def get_my_gardens(
 async def get_garden(
     garden_id: int,
     current_user: Optional[User] = Depends(get_current_user_optional),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取指定菜地的详细信息，包括是否是当前用户的菜地"""
-    garden = db.query(Garden).filter(Garden.id == garden_id).first()
+    garden = await db.get(Garden, garden_id)
 
     if not garden:
         raise HTTPException(
@@ -206,16 +248,38 @@ async def get_garden(
 
     # 丰富菜地信息
     user_id = current_user.id if current_user else None
-    garden_dict = _enrich_garden_with_order_info(garden, user_id, db)
+    garden_dict = await _enrich_garden_with_order_info(garden, user_id, db)
 
-    # 确保有视频URL
-    garden_dict = _ensure_video_url(garden_dict)
+    return _to_garden_schema(garden_dict)
 
-    return GardenSchema(**garden_dict)
+
+@router.get("/{garden_id}/calendar", response_model=List[RentalPeriod], summary="获取菜地租用日历")
+async def get_garden_calendar(
+    garden_id: int,
+    start_date: date = Query(..., description="开始日期"),
+    end_date: date = Query(..., description="结束日期"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取菜地在指定时间段内已被占用的租期（待支付、已支付、进行中的订单）"""
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="结束日期不能早于开始日期"
+        )
+
+    garden = await db.get(Garden, garden_id)
+    if not garden:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="菜地不存在"
+        )
+
+    result = await db.execute(RentalCalendarService.overlap_select(garden_id, start_date, end_date))
+    return [RentalPeriod.model_validate(order) for order in result.scalars().all()]
 
 
 @router.post("", response_model=GardenSchema, summary="创建菜地（管理员）")
-async def create_garden(
+def create_garden(
     garden_data: GardenCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_admin)
@@ -241,7 +305,7 @@ async def create_garden(
 
 
 @router.put("/{garden_id}", response_model=GardenSchema, summary="更新菜地（管理员）")
-async def update_garden(
+def update_garden(
     garden_id: int,
     garden_data: GardenUpdate,
     db: Session = Depends(get_db),
@@ -269,7 +333,7 @@ async def update_garden(
 
 
 @router.delete("/{garden_id}", summary="删除菜地（管理员）")
-async def delete_garden(
+def delete_garden(
     garden_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_admin)
@@ -291,7 +355,7 @@ async def delete_garden(
 
 
 @router.get("/{garden_id}/status", summary="获取菜地完整状态")
-async def get_garden_status(
+def get_garden_status(
     garden_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -450,8 +514,16 @@ def _ensure_video_url(garden_dict: dict) -> dict:
     return garden_dict
 
 
+def _to_garden_schema(garden_dict: dict) -> GardenSchema:
+    """
+    将菜地字典转换为响应Schema
+    菜地列表、我的菜地、菜地详情共用，确保视频URL处理一致
+    """
+    return GardenSchema(**_ensure_video_url(garden_dict))
+
+
 @router.post("/planting-records", summary="创建种植记录")
-async def create_planting_record(
+def create_planting_record(
     request_data: dict,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
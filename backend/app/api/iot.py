@@ -5,8 +5,9 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 from typing import Optional
 from app.core.database import get_db
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, get_current_admin
 from app.models.user import User
+from app.schemas.iot import IoTReadingBatch, IoTReadingBatchResult
 from app.services.iot_service import IoTService
 from app.services.iot_simulator import IoTSimulator
 
@@ -14,7 +15,7 @@ router = APIRouter()
 
 
 @router.get("/gardens/{garden_id}/status", summary="获取菜地传感器状态")
-async def get_garden_iot_status(
+def get_garden_iot_status(
     garden_id: int,
     auto_simulate: bool = Query(True, description="如果没有数据，是否自动生成仿真数据"),
     current_user: User = Depends(get_current_user),
@@ -36,8 +37,33 @@ async def get_garden_iot_status(
         )
 
 
+@router.post("/readings:batch", response_model=IoTReadingBatchResult, summary="批量上报传感器读数")
+def record_readings_batch(
+    batch: IoTReadingBatch,
+    current_user: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    批量上报多个传感器的读数（一次请求、一个事务，仅管理员/网关账号）
+
+    - 每条读数用 **sensor_id** 或 **device_id** 指定传感器
+    - 传感器不存在或未激活的读数不入库，在 rejected 中返回其位置和原因
+    """
+    try:
+        result = IoTService.record_readings_batch(
+            db, [reading.model_dump() for reading in batch.readings]
+        )
+        return IoTReadingBatchResult(**result)
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量上报读数失败: {str(e)}"
+        )
+
+
 @router.post("/gardens/{garden_id}/simulate", summary="生成仿真数据")
-async def simulate_garden_data(
+def simulate_garden_data(
     garden_id: int,
     realistic: bool = Query(True, description="是否生成真实场景数据"),
     current_user: User = Depends(get_current_user),
@@ -64,7 +90,7 @@ async def simulate_garden_data(
 
 
 @router.post("/gardens/{garden_id}/history", summary="生成历史数据")
-async def generate_historical_data(
+def generate_historical_data(
     garden_id: int,
     days: int = Query(7, ge=1, le=30, description="生成多少天的历史数据"),
     interval_minutes: int = Query(30, ge=5, le=120, description="数据采集间隔（分钟）"),
@@ -96,7 +122,7 @@ async def generate_historical_data(
 
 
 @router.post("/gardens/{garden_id}/weather-event", summary="模拟天气事件")
-async def create_weather_event(
+def create_weather_event(
     garden_id: int,
     event_type: str = Query(..., regex="^(rain|heat_wave|cold|drought)$"),
     duration_hours: int = Query(2, ge=1, le=24),
@@ -130,27 +156,17 @@ async def create_weather_event(
 
 
 @router.post("/update-all", summary="更新所有菜地数据")
-async def update_all_gardens(
+def update_all_gardens(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     为所有菜地更新当前传感器数据
 
-    用于批量更新所有菜地的物联网数据
+    用于批量更新所有菜地的物联网数据，菜地分片并行处理，返回每个分片的耗时和失败信息
     """
     try:
-        results = IoTSimulator.update_all_gardens(db)
-
-        success_count = sum(1 for r in results if r['success'])
-        fail_count = len(results) - success_count
-
-        return {
-            "total": len(results),
-            "success": success_count,
-            "failed": fail_count,
-            "results": results
-        }
+        return IoTSimulator.update_all_gardens(db)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -159,10 +175,11 @@ async def update_all_gardens(
 
 
 @router.get("/sensors/history", summary="获取传感器历史数据")
-async def get_sensor_history(
+def get_sensor_history(
     garden_id: int = Query(..., description="菜地ID"),
     sensor_type: Optional[str] = Query(None, description="传感器类型（可选）"),
     hours: int = Query(24, ge=1, le=168, description="查询最近多少小时的数据"),
+    resolution: str = Query("auto", regex="^(auto|raw|5m|1h|1d)$", description="数据粒度"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -172,8 +189,12 @@ async def get_sensor_history(
     - **garden_id**: 菜地ID
     - **sensor_type**: 传感器类型（可选，不指定则返回所有类型）
     - **hours**: 查询时间范围（1-168小时，即最多7天）
+    - **resolution**: 数据粒度
+      - `auto`: 自动选择满足图表点数的最粗粒度（默认）
+      - `raw`: 原始读数
+      - `5m` / `1h` / `1d`: 汇总数据，value为平均值，另含min/max/count
     """
-    from app.models.crop import IoTSensor, IoTReading
+    from app.models.crop import IoTSensor
     from datetime import datetime, timedelta
 
     try:
@@ -191,33 +212,23 @@ async def get_sensor_history(
                 "data": []
             }
 
-        # 查询历史数据
+        # 查询历史数据（所有传感器一次查询）
         start_time = datetime.now() - timedelta(hours=hours)
-        history_data = []
+        resolution, series = IoTService.get_history(db, sensors, start_time, hours, resolution)
 
-        for sensor in sensors:
-            readings = db.query(IoTReading).filter(
-                IoTReading.sensor_id == sensor.id,
-                IoTReading.reading_time >= start_time
-            ).order_by(IoTReading.reading_time).all()
-
-            history_data.append({
+        history_data = [
+            {
                 "sensor_type": sensor.sensor_type,
                 "device_id": sensor.device_id,
-                "readings": [
-                    {
-                        "time": r.reading_time.isoformat(),
-                        "value": float(r.value),
-                        "unit": r.unit,
-                        "is_abnormal": bool(r.is_abnormal)
-                    }
-                    for r in readings
-                ]
-            })
+                "readings": series.get(sensor.id, [])
+            }
+            for sensor in sensors
+        ]
 
         return {
             "garden_id": garden_id,
             "sensor_type": sensor_type,
+            "resolution": resolution,
             "time_range": {
                 "start": start_time.isoformat(),
                 "end": datetime.now().isoformat(),
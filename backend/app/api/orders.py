@@ -3,10 +3,12 @@
 """
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
-from app.core.database import get_db
+from app.core.database import get_db, get_async_db
 from app.models.order import Order, OrderStatus
 from app.models.garden import Garden, GardenStatus
 from app.models.user import User
@@ -15,55 +17,43 @@ from app.schemas.order import (
     OrderCreate,
     OrderUpdate,
     OrderDetail,
-    OrderListResponse
+    OrderListResponse,
+    MyOrdersResponse
 )
 from app.api.deps import get_current_user, get_current_admin
+from app.api.pagination import keyset_paginate_async
+from app.services.rental_calendar import RentalCalendarService, BLOCKING_STATUSES
+from app.services.statistics import StatisticsService
 
 router = APIRouter()
 
 
-@router.get("/my", response_model=OrderListResponse, summary="获取我的订单统计")
-async def get_my_orders(
+@router.get("/my", response_model=MyOrdersResponse, summary="获取我的订单统计")
+def get_my_orders(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """获取当前用户的订单统计信息（用于个人中心页面）"""
 
-    # 查询用户的所有订单
-    total = db.query(Order).filter(Order.user_id == current_user.id).count()
+    # 总数和各状态数量（一次分组查询，按用户短时缓存）
+    stats = StatisticsService.order_stats(db, current_user.id)
 
-    # 查询不同状态的订单数量
-    pending = db.query(Order).filter(
-        Order.user_id == current_user.id,
-        Order.status == OrderStatus.PENDING
-    ).count()
-
-    paid = db.query(Order).filter(
-        Order.user_id == current_user.id,
-        Order.status == OrderStatus.PAID
-    ).count()
-
-    completed = db.query(Order).filter(
-        Order.user_id == current_user.id,
-        Order.status == OrderStatus.COMPLETED
-    ).count()
-
-    # 获取最近的订单
-    orders = db.query(Order).filter(
+    # 获取最近的订单（连接菜地表，一次查询）
+    rows = db.query(Order, Garden.name, Garden.location).outerjoin(
+        Garden, Garden.id == Order.garden_id
+    ).filter(
         Order.user_id == current_user.id
     ).order_by(Order.created_at.desc()).limit(5).all()
 
     # 构造详情列表
     order_details = []
-    for order in orders:
-        garden = db.query(Garden).filter(Garden.id == order.garden_id).first()
-        order_dict = OrderDetail.from_orm(order).dict()
-        if garden:
-            order_dict["garden_name"] = garden.name
-            order_dict["garden_location"] = garden.location
+    for order, garden_name, garden_location in rows:
+        order_dict = OrderDetail.model_validate(order).model_dump()
+        order_dict["garden_name"] = garden_name
+        order_dict["garden_location"] = garden_location
         order_details.append(OrderDetail(**order_dict))
 
-    return OrderListResponse(total=total, items=order_details)
+    return MyOrdersResponse(total=stats["total"], items=order_details, by_status=stats["by_status"])
 
 
 @router.get("", response_model=OrderListResponse, summary="获取订单列表")
@@ -71,12 +61,13 @@ async def get_orders(
     skip: int = Query(0, ge=0, description="跳过数量"),
     limit: int = Query(20, ge=1, le=100, description="每页数量"),
     status: Optional[str] = Query(None, description="订单状态筛选"),
+    cursor: Optional[str] = Query(None, description="分页游标：首页传空字符串，之后传上一页返回的next_cursor；传入后不返回总数"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取当前用户的订单列表"""
 
-    query = db.query(Order).filter(Order.user_id == current_user.id)
+    query = select(Order).filter(Order.user_id == current_user.id)
 
     # 状态筛选（排除None和空字符串）
     if status and status.strip():
@@ -86,27 +77,40 @@ async def get_orders(
         except ValueError:
             pass  # 忽略无效的状态值
 
-    # 获取总数
-    total = query.count()
+    total = None
+    next_cursor = None
+    if cursor is not None:
+        # 游标分页，不统计总数
+        orders, next_cursor = await keyset_paginate_async(db, query, [Order.created_at, Order.id], cursor, limit)
+    else:
+        # 获取总数
+        total = await db.scalar(select(func.count()).select_from(query.subquery()))
+
+        # 分页查询
+        result = await db.execute(query.order_by(Order.created_at.desc()).offset(skip).limit(limit))
+        orders = result.scalars().all()
+
+    # 构造详情列表（包含菜地信息，菜地一次 IN 查询）
+    gardens = {}
+    garden_ids = {order.garden_id for order in orders}
+    if garden_ids:
+        result = await db.execute(select(Garden).filter(Garden.id.in_(garden_ids)))
+        gardens = {garden.id: garden for garden in result.scalars().all()}
 
-    # 分页查询
-    orders = query.order_by(Order.created_at.desc()).offset(skip).limit(limit).all()
-
-    # 构造详情列表（包含菜地信息）
     order_details = []
     for order in orders:
-        garden = db.query(Garden).filter(Garden.id == order.garden_id).first()
+        garden = gardens.get(order.garden_id)
         order_dict = OrderDetail.from_orm(order).dict()
         if garden:
             order_dict["garden_name"] = garden.name
             order_dict["garden_location"] = garden.location
         order_details.append(OrderDetail(**order_dict))
 
-    return OrderListResponse(total=total, items=order_details)
+    return OrderListResponse(total=total, items=order_details, next_cursor=next_cursor)
 
 
 @router.get("/{order_id}", response_model=OrderDetail, summary="获取订单详情")
-async def get_order(
+def get_order(
     order_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -135,7 +139,7 @@ async def get_order(
 
 
 @router.post("", response_model=OrderSchema, summary="创建订单")
-async def create_order(
+def create_order(
     order_data: OrderCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -144,13 +148,13 @@ async def create_order(
     创建新订单
 
     流程:
-    1. 验证菜地是否可用
+    1. 验证菜地是否可用（租用日历中该时间段没有占用订单）
     2. 计算租金总价
     3. 创建订单
     """
 
-    # 检查菜地是否存在且可用
-    garden = db.query(Garden).filter(Garden.id == order_data.garden_id).first()
+    # 检查菜地是否存在（锁定菜地行，同一菜地的下单串行执行，避免并发下单重叠）
+    garden = db.query(Garden).filter(Garden.id == order_data.garden_id).with_for_update().first()
 
     if not garden:
         raise HTTPException(
@@ -158,7 +162,7 @@ async def create_order(
             detail="菜地不存在"
         )
 
-    if garden.status != GardenStatus.AVAILABLE:
+    if garden.status == GardenStatus.MAINTENANCE:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="该菜地当前不可租用"
@@ -174,6 +178,14 @@ async def create_order(
             detail="结束日期必须晚于开始日期"
         )
 
+    if not RentalCalendarService.is_available(
+        db, garden.id, order_data.start_date, order_data.end_date
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="该菜地在所选时间段内已被预订"
+        )
+
     total_price = garden.price * months
 
     # 创建订单
@@ -194,7 +206,7 @@ async def create_order(
 
 
 @router.put("/{order_id}/pay", response_model=OrderSchema, summary="支付订单")
-async def pay_order(
+def pay_order(
     order_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -226,10 +238,10 @@ async def pay_order(
     order.status = OrderStatus.PAID
     order.payment_time = datetime.now()
 
-    # 更新菜地状态为已租出
+    # 按租用日历更新菜地状态（租期覆盖当天才变为已租出）
     garden = db.query(Garden).filter(Garden.id == order.garden_id).first()
     if garden:
-        garden.status = GardenStatus.RENTED
+        RentalCalendarService.sync_garden_status(db, garden)
 
     db.commit()
     db.refresh(order)
@@ -238,7 +250,7 @@ async def pay_order(
 
 
 @router.put("/{order_id}/cancel", response_model=OrderSchema, summary="取消订单")
-async def cancel_order(
+def cancel_order(
     order_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -265,11 +277,10 @@ async def cancel_order(
     # 更新订单状态
     order.status = OrderStatus.CANCELLED
 
-    # 如果菜地被租出，恢复为可用状态
-    if order.status == OrderStatus.PAID:
-        garden = db.query(Garden).filter(Garden.id == order.garden_id).first()
-        if garden and garden.status == GardenStatus.RENTED:
-            garden.status = GardenStatus.AVAILABLE
+    # 按租用日历更新菜地状态（其他订单仍覆盖当天时保持已租出）
+    garden = db.query(Garden).filter(Garden.id == order.garden_id).first()
+    if garden:
+        RentalCalendarService.sync_garden_status(db, garden)
 
     db.commit()
     db.refresh(order)
@@ -280,7 +291,7 @@ async def cancel_order(
 # ===== 管理员专用API =====
 
 @router.get("/admin/all", response_model=OrderListResponse, summary="获取所有订单（管理员）")
-async def get_all_orders(
+def get_all_orders(
     skip: int = Query(0, ge=0, description="跳过数量"),
     limit: int = Query(50, ge=1, le=100, description="每页数量"),
     status: Optional[str] = Query(None, description="订单状态筛选"),
@@ -323,7 +334,7 @@ async def get_all_orders(
 
 
 @router.put("/admin/{order_id}/status", response_model=OrderSchema, summary="更新订单状态（管理员）")
-async def update_order_status(
+def update_order_status(
     order_id: int,
     new_status: str = Query(..., description="新状态"),
     current_user: User = Depends(get_current_admin),
@@ -347,18 +358,27 @@ async def update_order_status(
             detail="无效的订单状态"
         )
 
+    # 恢复已取消的订单时检查租期是否已被占用
+    if order.status == OrderStatus.CANCELLED and order_status in BLOCKING_STATUSES:
+        if not RentalCalendarService.is_available(
+            db, order.garden_id, order.start_date, order.end_date, exclude_order_id=order.id
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="该菜地在订单时间段内已被预订"
+            )
+
     # 更新订单状态
     old_status = order.status
     order.status = order_status
 
-    # 根据状态变化更新菜地状态
+    if order_status == OrderStatus.PAID and old_status != OrderStatus.PAID:
+        order.payment_time = datetime.now()
+
+    # 按租用日历更新菜地状态
     garden = db.query(Garden).filter(Garden.id == order.garden_id).first()
     if garden:
-        if order_status == OrderStatus.PAID and old_status != OrderStatus.PAID:
-            garden.status = GardenStatus.RENTED
-            order.payment_time = datetime.now()
-        elif order_status == OrderStatus.CANCELLED and old_status == OrderStatus.PAID:
-            garden.status = GardenStatus.AVAILABLE
+        RentalCalendarService.sync_garden_status(db, garden)
 
     db.commit()
     db.refresh(order)
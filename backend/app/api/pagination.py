@@ -0,0 +1,135 @@
+"""
+游标（Keyset）分页工具
+
+列表接口默认使用 offset/limit 分页；传入 cursor 参数后切换为游标分页：
+- 按 (排序列..., id) 倒序，以上一页最后一行的键值作为下一页的起点
+- 不再执行 COUNT(*)，响应中的 total 为 None
+- 响应中的 next_cursor 为下一页游标，为 None 表示没有更多数据
+"""
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import Select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """将排序键值编码为不透明的游标字符串"""
+    payload = [
+        value.isoformat() if isinstance(value, (datetime, date)) else value
+        for value in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence) -> List[Any]:
+    """
+    解码游标字符串
+
+    Args:
+        cursor: 游标字符串
+        columns: 排序列（用于还原日期时间类型）
+
+    Returns:
+        排序键值列表
+
+    Raises:
+        HTTPException: 游标格式不正确时抛出400错误
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("cursor length mismatch")
+
+        decoded = []
+        for column, value in zip(columns, values):
+            python_type = column.type.python_type
+            if value is not None and python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif value is not None and python_type is date:
+                value = date.fromisoformat(value)
+            decoded.append(value)
+        return decoded
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的分页游标"
+        )
+
+
+def _keyset_condition(columns: Sequence, values: Sequence[Any]):
+    """
+    构造倒序游标的过滤条件
+
+    (a, b, c) < (va, vb, vc) 展开为:
+    a < va OR (a = va AND b < vb) OR (a = va AND b = vb AND c < vc)
+    """
+    clauses = []
+    for i, column in enumerate(columns):
+        equals = [columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equals, column < values[i]))
+    return or_(*clauses)
+
+
+def _keyset_page_query(query, columns: Sequence, cursor: str, limit: int):
+    """为查询（Query 或 select 语句）附加游标过滤、倒序排序和多取一条的 limit"""
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        query = query.filter(_keyset_condition(columns, values))
+
+    # 多取一条用于判断是否还有下一页
+    return query.order_by(*[column.desc() for column in columns]).limit(limit + 1)
+
+
+def _split_page(rows: list, columns: Sequence, limit: int) -> Tuple[list, Optional[str]]:
+    """截取当前页并根据最后一行生成下一页游标"""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+
+    return rows, next_cursor
+
+
+def keyset_paginate(
+    query: Query,
+    columns: Sequence,
+    cursor: str,
+    limit: int
+) -> Tuple[list, Optional[str]]:
+    """
+    对查询执行游标分页（倒序）
+
+    Args:
+        query: 已应用筛选条件的查询（不要预先 order_by）
+        columns: 排序列，最后一列必须唯一（一般为主键 id）
+        cursor: 上一页返回的游标，首页传空字符串
+        limit: 每页数量
+
+    Returns:
+        (当前页数据, 下一页游标)
+    """
+    rows = _keyset_page_query(query, columns, cursor, limit).all()
+    return _split_page(rows, columns, limit)
+
+
+async def keyset_paginate_async(
+    db: AsyncSession,
+    stmt: Select,
+    columns: Sequence,
+    cursor: str,
+    limit: int
+) -> Tuple[list, Optional[str]]:
+    """
+    对单实体 select 语句执行游标分页（倒序，异步会话）
+
+    参数与返回值同 keyset_paginate
+    """
+    result = await db.execute(_keyset_page_query(stmt, columns, cursor, limit))
+    return _split_page(list(result.scalars().all()), columns, limit)
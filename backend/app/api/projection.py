@@ -0,0 +1,51 @@
+"""
+订单关联记录的投影查询
+
+提醒、增值服务等挂在订单下的记录，列表和详情需要附带菜地名称（以及用户昵称）。
+用一条 记录 -> 订单 -> 菜地（-> 用户）的外连接查询，只取响应 Schema 需要的列，
+代替逐条查询订单和菜地
+"""
+from typing import Type
+from pydantic import BaseModel
+from sqlalchemy.orm import Query, Session
+from app.models.garden import Garden
+from app.models.order import Order
+from app.models.user import User
+
+
+def order_projection_query(db: Session, model, schema: Type[BaseModel]) -> Query:
+    """
+    构造订单关联记录的投影查询
+
+    Schema 中的 garden_name 取自 菜地.name，user_nickname 取自 用户.nickname，
+    其他字段取自 model 的同名列；只连接用到的表
+
+    Args:
+        db: 数据库会话
+        model: 带 order_id、user_id 列的 ORM 模型（如 Reminder、Service）
+        schema: 响应 Schema（需 from_attributes），查询结果可直接 model_validate
+
+    Returns:
+        未排序的查询，可继续 filter、分页（结果行按 Schema 字段名访问）
+    """
+    columns = []
+    join_garden = False
+    join_user = False
+    for name in schema.model_fields:
+        if name == "garden_name":
+            columns.append(Garden.name.label(name))
+            join_garden = True
+        elif name == "user_nickname":
+            columns.append(User.nickname.label(name))
+            join_user = True
+        else:
+            columns.append(getattr(model, name))
+
+    query = db.query(*columns).select_from(model)
+    if join_garden:
+        query = query.outerjoin(Order, Order.id == model.order_id).outerjoin(
+            Garden, Garden.id == Order.garden_id
+        )
+    if join_user:
+        query = query.outerjoin(User, User.id == model.user_id)
+    return query
@@ -2,47 +2,96 @@
 任务提醒API路由
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional
 from app.core.database import get_db
 from app.models.reminder import Reminder, TaskType, ReminderStatus
 from app.models.order import Order, OrderStatus
-from app.models.garden import Garden
 from app.models.user import User
 from app.schemas.reminder import (
     Reminder as ReminderSchema,
     ReminderCreate,
     ReminderUpdate,
+    ReminderAutoCreateBatch,
     ReminderDetail,
     ReminderListResponse,
     ReminderTemplate,
     ReminderTemplateList
 )
 from app.api.deps import get_current_user, get_current_admin
+from app.api.pagination import keyset_paginate
+from app.api.projection import order_projection_query
 
 router = APIRouter()
 
-# 提醒模板配置
+# 提醒模板配置（action 为模板中的建议时间）
 REMINDER_TEMPLATES = {
     TaskType.WATERING: {
         "content_template": "您的菜地该浇水啦！建议{action}浇水，保持土壤湿润。",
-        "interval_days": 3
+        "interval_days": 3,
+        "action": "今天下午"
     },
     TaskType.FERTILIZING: {
         "content_template": "距离上次施肥已过{interval}周，建议{action}施肥一次。",
-        "interval_days": 14
+        "interval_days": 14,
+        "action": "本周末"
     },
     TaskType.WEEDING: {
         "content_template": "您的菜地需要除草啦！建议{action}进行除草，保持菜地整洁。",
-        "interval_days": 7
+        "interval_days": 7,
+        "action": "本周"
     },
     TaskType.HARVESTING: {
         "content_template": "您的作物可以收获啦！建议{action}收获，享受丰收的喜悦。",
-        "interval_days": 30
+        "interval_days": 30,
+        "action": "近期"
     }
 }
 
+# 每种任务类型的提醒内容与订单无关，预先生成一次
+REMINDER_CONTENTS = {
+    task_type: config["content_template"].format(
+        action=config["action"],
+        interval=config["interval_days"] // 7
+    )
+    for task_type, config in REMINDER_TEMPLATES.items()
+}
+
+
+def _build_order_reminder_rows(order: Order, now: datetime) -> List[dict]:
+    """
+    按模板生成订单租期内的全部提醒行
+
+    从租期开始（已开始则从 now）起每隔 interval_days 一条，直到租期结束
+    """
+    start = max(now, datetime.combine(order.start_date, datetime.min.time()))
+    end_date = datetime.combine(order.end_date, datetime.min.time())
+    rows = []
+    for task_type, config in REMINDER_TEMPLATES.items():
+        interval = timedelta(days=config["interval_days"])
+        content = REMINDER_CONTENTS[task_type]
+
+        remind_date = start + interval
+        while remind_date <= end_date:
+            rows.append({
+                "order_id": order.id,
+                "user_id": order.user_id,
+                "task_type": task_type,
+                "content": content,
+                "remind_time": remind_date,
+                "status": ReminderStatus.PENDING
+            })
+            remind_date += interval
+    return rows
+
+
+def _insert_reminder_rows(db: Session, rows: List[dict], batch_size: int = 1000) -> None:
+    """多行插入提醒（分批，控制单条语句大小）"""
+    for i in range(0, len(rows), batch_size):
+        db.execute(insert(Reminder), rows[i:i + batch_size])
+
 
 @router.get("/templates", response_model=ReminderTemplateList, summary="获取提醒模板")
 async def get_reminder_templates():
@@ -59,46 +108,44 @@ async def get_reminder_templates():
 
 
 @router.get("", response_model=ReminderListResponse, summary="获取任务提醒列表")
-async def get_reminders(
+def get_reminders(
     status: Optional[ReminderStatus] = Query(None, description="筛选状态"),
     skip: int = Query(0, ge=0, description="跳过数量"),
     limit: int = Query(20, ge=1, le=100, description="每页数量"),
+    cursor: Optional[str] = Query(None, description="分页游标：首页传空字符串，之后传上一页返回的next_cursor；传入后不返回总数"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """获取当前用户的任务提醒列表"""
 
-    query = db.query(Reminder).filter(Reminder.user_id == current_user.id)
+    # 提醒 -> 订单 -> 菜地 连接查询，附带菜地名称
+    query = order_projection_query(db, Reminder, ReminderDetail).filter(
+        Reminder.user_id == current_user.id
+    )
 
     # 状态筛选
     if status is not None:
         query = query.filter(Reminder.status == status)
 
-    # 获取总数
-    total = query.count()
-
-    # 分页查询，按提醒时间排序
-    reminders = query.order_by(Reminder.remind_time.desc()).offset(skip).limit(limit).all()
+    total = None
+    next_cursor = None
+    if cursor is not None:
+        # 游标分页，不统计总数
+        reminders, next_cursor = keyset_paginate(query, [Reminder.remind_time, Reminder.id], cursor, limit)
+    else:
+        # 获取总数
+        total = query.count()
 
-    # 构造详情列表（包含订单和菜地信息）
-    reminder_details = []
-    for reminder in reminders:
-        order = db.query(Order).filter(Order.id == reminder.order_id).first()
-        garden = None
-        if order:
-            garden = db.query(Garden).filter(Garden.id == order.garden_id).first()
+        # 分页查询，按提醒时间排序
+        reminders = query.order_by(Reminder.remind_time.desc()).offset(skip).limit(limit).all()
 
-        reminder_dict = ReminderDetail.from_orm(reminder).dict()
-        if garden:
-            reminder_dict["garden_name"] = garden.name
+    reminder_details = [ReminderDetail.model_validate(row) for row in reminders]
 
-        reminder_details.append(ReminderDetail(**reminder_dict))
-
-    return ReminderListResponse(total=total, items=reminder_details)
+    return ReminderListResponse(total=total, items=reminder_details, next_cursor=next_cursor)
 
 
 @router.get("/pending", response_model=ReminderListResponse, summary="获取待处理的提醒")
-async def get_pending_reminders(
+def get_pending_reminders(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -110,7 +157,7 @@ async def get_pending_reminders(
     now = datetime.now()
     future_time = now + timedelta(days=1)  # 未来1天内的提醒
 
-    query = db.query(Reminder).filter(
+    query = order_projection_query(db, Reminder, ReminderDetail).filter(
         Reminder.user_id == current_user.id,
         Reminder.status == ReminderStatus.PENDING,
         Reminder.remind_time <= future_time
@@ -119,32 +166,20 @@ async def get_pending_reminders(
     total = query.count()
     reminders = query.order_by(Reminder.remind_time.asc()).all()
 
-    # 构造详情列表
-    reminder_details = []
-    for reminder in reminders:
-        order = db.query(Order).filter(Order.id == reminder.order_id).first()
-        garden = None
-        if order:
-            garden = db.query(Garden).filter(Garden.id == order.garden_id).first()
-
-        reminder_dict = ReminderDetail.from_orm(reminder).dict()
-        if garden:
-            reminder_dict["garden_name"] = garden.name
-
-        reminder_details.append(ReminderDetail(**reminder_dict))
+    reminder_details = [ReminderDetail.model_validate(row) for row in reminders]
 
     return ReminderListResponse(total=total, items=reminder_details)
 
 
 @router.get("/{reminder_id}", response_model=ReminderDetail, summary="获取提醒详情")
-async def get_reminder(
+def get_reminder(
     reminder_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """获取指定任务提醒的详细信息"""
 
-    reminder = db.query(Reminder).filter(
+    reminder = order_projection_query(db, Reminder, ReminderDetail).filter(
         Reminder.id == reminder_id,
         Reminder.user_id == current_user.id
     ).first()
@@ -155,21 +190,11 @@ async def get_reminder(
             detail="提醒不存在"
         )
 
-    # 获取关联信息
-    order = db.query(Order).filter(Order.id == reminder.order_id).first()
-    garden = None
-    if order:
-        garden = db.query(Garden).filter(Garden.id == order.garden_id).first()
-
-    reminder_dict = ReminderDetail.from_orm(reminder).dict()
-    if garden:
-        reminder_dict["garden_name"] = garden.name
-
-    return ReminderDetail(**reminder_dict)
+    return ReminderDetail.model_validate(reminder)
 
 
 @router.put("/{reminder_id}/complete", response_model=ReminderSchema, summary="标记提醒已完成")
-async def complete_reminder(
+def complete_reminder(
     reminder_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -198,7 +223,7 @@ async def complete_reminder(
 # ========== 管理员接口 ==========
 
 @router.post("/admin/create", response_model=ReminderSchema, summary="创建任务提醒（管理员）")
-async def create_reminder_admin(
+def create_reminder_admin(
     reminder_data: ReminderCreate,
     current_user: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
@@ -242,7 +267,7 @@ async def create_reminder_admin(
 
 
 @router.post("/admin/auto-create/{order_id}", summary="为订单自动创建提醒（管理员）")
-async def auto_create_reminders_for_order(
+def auto_create_reminders_for_order(
     order_id: int,
     current_user: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
@@ -267,61 +292,76 @@ async def auto_create_reminders_for_order(
             detail="订单状态不正确"
         )
 
-    created_reminders = []
-    current_date = datetime.now()
-    end_date = datetime.combine(order.end_date, datetime.min.time())
+    rows = _build_order_reminder_rows(order, datetime.now())
+    _insert_reminder_rows(db, rows)
+    db.commit()
 
-    # 为每种任务类型创建提醒
-    for task_type, config in REMINDER_TEMPLATES.items():
-        interval = config["interval_days"]
-        template = config["content_template"]
+    return {
+        "message": f"成功为订单 {order_id} 创建 {len(rows)} 条提醒",
+        "reminders": [
+            {"task_type": row["task_type"].value, "remind_time": row["remind_time"].isoformat()}
+            for row in rows
+        ]
+    }
 
-        # 根据间隔天数创建多个提醒
-        remind_date = current_date + timedelta(days=interval)
 
-        while remind_date <= end_date:
-            # 根据模板生成内容
-            if task_type == TaskType.WATERING:
-                content = template.format(action="今天下午")
-            elif task_type == TaskType.FERTILIZING:
-                weeks = interval // 7
-                content = template.format(interval=weeks, action="本周末")
-            elif task_type == TaskType.WEEDING:
-                content = template.format(action="本周")
-            elif task_type == TaskType.HARVESTING:
-                content = template.format(action="近期")
-            else:
-                content = template
-
-            # 创建提醒
-            reminder = Reminder(
-                order_id=order_id,
-                user_id=order.user_id,
-                task_type=task_type,
-                content=content,
-                remind_time=remind_date,
-                status=ReminderStatus.PENDING
-            )
-
-            db.add(reminder)
-            created_reminders.append({
-                "task_type": task_type.value,
-                "remind_time": remind_date.isoformat()
-            })
+@router.post("/admin/auto-create", summary="为多个订单批量自动创建提醒（管理员）")
+def auto_create_reminders_for_orders(
+    request: ReminderAutoCreateBatch,
+    current_user: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    为多个订单批量自动创建任务提醒（如新季度集中开租）
 
-            # 计算下一个提醒时间
-            remind_date += timedelta(days=interval)
+    一次查询所有订单，不存在、状态不正确或已创建过提醒的订单跳过（重复调用不会重复创建），
+    其余订单的提醒一次批量写入
+    """
+    order_ids = list(dict.fromkeys(request.order_ids))
+    orders = {
+        order.id: order
+        for order in db.query(Order).filter(Order.id.in_(order_ids)).all()
+    }
+    existing = {
+        order_id
+        for (order_id,) in db.query(Reminder.order_id).filter(
+            Reminder.order_id.in_(order_ids)
+        ).distinct().all()
+    }
 
+    now = datetime.now()
+    rows = []
+    created = []
+    skipped = []
+    for order_id in order_ids:
+        order = orders.get(order_id)
+        if not order:
+            skipped.append({"order_id": order_id, "reason": "订单不存在"})
+            continue
+        if order.status not in [OrderStatus.PAID, OrderStatus.ACTIVE]:
+            skipped.append({"order_id": order_id, "reason": "订单状态不正确"})
+            continue
+        if order_id in existing:
+            skipped.append({"order_id": order_id, "reason": "订单已创建过提醒"})
+            continue
+
+        order_rows = _build_order_reminder_rows(order, now)
+        rows.extend(order_rows)
+        created.append({"order_id": order_id, "created": len(order_rows)})
+
+    _insert_reminder_rows(db, rows)
     db.commit()
 
     return {
-        "message": f"成功为订单 {order_id} 创建 {len(created_reminders)} 条提醒",
-        "reminders": created_reminders
+        "message": f"成功为 {len(created)} 个订单创建 {len(rows)} 条提醒",
+        "total": len(rows),
+        "orders": created,
+        "skipped": skipped
     }
 
 
 @router.get("/admin/all", response_model=ReminderListResponse, summary="获取所有提醒（管理员）")
-async def get_all_reminders_admin(
+def get_all_reminders_admin(
     status: Optional[ReminderStatus] = Query(None, description="筛选状态"),
     skip: int = Query(0, ge=0, description="跳过数量"),
     limit: int = Query(20, ge=1, le=100, description="每页数量"),
@@ -330,7 +370,7 @@ async def get_all_reminders_admin(
 ):
     """管理员获取所有任务提醒列表"""
 
-    query = db.query(Reminder)
+    query = order_projection_query(db, Reminder, ReminderDetail)
 
     # 状态筛选
     if status is not None:
@@ -342,25 +382,13 @@ async def get_all_reminders_admin(
     # 分页查询
     reminders = query.order_by(Reminder.remind_time.desc()).offset(skip).limit(limit).all()
 
-    # 构造详情列表
-    reminder_details = []
-    for reminder in reminders:
-        order = db.query(Order).filter(Order.id == reminder.order_id).first()
-        garden = None
-        if order:
-            garden = db.query(Garden).filter(Garden.id == order.garden_id).first()
-
-        reminder_dict = ReminderDetail.from_orm(reminder).dict()
-        if garden:
-            reminder_dict["garden_name"] = garden.name
-
-        reminder_details.append(ReminderDetail(**reminder_dict))
+    reminder_details = [ReminderDetail.model_validate(row) for row in reminders]
 
     return ReminderListResponse(total=total, items=reminder_details)
 
 
 @router.put("/admin/{reminder_id}", response_model=ReminderSchema, summary="更新提醒（管理员）")
-async def update_reminder_admin(
+def update_reminder_admin(
     reminder_id: int,
     reminder_update: ReminderUpdate,
     current_user: User = Depends(get_current_admin),
@@ -391,7 +419,7 @@ async def update_reminder_admin(
 
 
 @router.delete("/admin/{reminder_id}", summary="删除提醒（管理员）")
-async def delete_reminder_admin(
+def delete_reminder_admin(
     reminder_id: int,
     current_user: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
@@ -9,7 +9,6 @@ from decimal import Decimal
 from app.core.database import get_db
 from app.models.service import Service, ServiceType, ServiceStatus
 from app.models.order import Order, OrderStatus
-from app.models.garden import Garden
 from app.models.user import User
 from app.schemas.service import (
     Service as ServiceSchema,
@@ -20,6 +19,8 @@ from app.schemas.service import (
     ServicePriceConfig
 )
 from app.api.deps import get_current_user, get_current_admin
+from app.api.pagination import keyset_paginate
+from app.api.projection import order_projection_query
 
 router = APIRouter()
 
@@ -46,54 +47,51 @@ async def get_service_prices():
 
 
 @router.get("", response_model=ServiceListResponse, summary="获取增值服务列表")
-async def get_services(
+def get_services(
     status: Optional[ServiceStatus] = Query(None, description="筛选状态"),
     skip: int = Query(0, ge=0, description="跳过数量"),
     limit: int = Query(20, ge=1, le=100, description="每页数量"),
+    cursor: Optional[str] = Query(None, description="分页游标：首页传空字符串，之后传上一页返回的next_cursor；传入后不返回总数"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """获取当前用户的增值服务列表"""
 
-    query = db.query(Service).filter(Service.user_id == current_user.id)
+    # 服务 -> 订单 -> 菜地（-> 用户）连接查询，附带菜地名称和用户昵称
+    query = order_projection_query(db, Service, ServiceDetail).filter(
+        Service.user_id == current_user.id
+    )
 
     # 状态筛选
     if status is not None:
         query = query.filter(Service.status == status)
 
-    # 获取总数
-    total = query.count()
-
-    # 分页查询
-    services = query.order_by(Service.created_at.desc()).offset(skip).limit(limit).all()
+    total = None
+    next_cursor = None
+    if cursor is not None:
+        # 游标分页，不统计总数
+        services, next_cursor = keyset_paginate(query, [Service.created_at, Service.id], cursor, limit)
+    else:
+        # 获取总数
+        total = query.count()
 
-    # 构造详情列表（包含订单和菜地信息）
-    service_details = []
-    for service in services:
-        order = db.query(Order).filter(Order.id == service.order_id).first()
-        garden = None
-        if order:
-            garden = db.query(Garden).filter(Garden.id == order.garden_id).first()
+        # 分页查询
+        services = query.order_by(Service.created_at.desc()).offset(skip).limit(limit).all()
 
-        service_dict = ServiceDetail.from_orm(service).dict()
-        if garden:
-            service_dict["garden_name"] = garden.name
-        service_dict["user_nickname"] = current_user.nickname
+    service_details = [ServiceDetail.model_validate(row) for row in services]
 
-        service_details.append(ServiceDetail(**service_dict))
-
-    return ServiceListResponse(total=total, items=service_details)
+    return ServiceListResponse(total=total, items=service_details, next_cursor=next_cursor)
 
 
 @router.get("/{service_id}", response_model=ServiceDetail, summary="获取增值服务详情")
-async def get_service(
+def get_service(
     service_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """获取指定增值服务的详细信息"""
 
-    service = db.query(Service).filter(
+    service = order_projection_query(db, Service, ServiceDetail).filter(
         Service.id == service_id,
         Service.user_id == current_user.id
     ).first()
@@ -104,22 +102,11 @@ async def get_service(
             detail="服务不存在"
         )
 
-    # 获取关联信息
-    order = db.query(Order).filter(Order.id == service.order_id).first()
-    garden = None
-    if order:
-        garden = db.query(Garden).filter(Garden.id == order.garden_id).first()
-
-    service_dict = ServiceDetail.from_orm(service).dict()
-    if garden:
-        service_dict["garden_name"] = garden.name
-    service_dict["user_nickname"] = current_user.nickname
-
-    return ServiceDetail(**service_dict)
+    return ServiceDetail.model_validate(service)
 
 
 @router.post("", response_model=ServiceSchema, summary="创建增值服务")
-async def create_service(
+def create_service(
     service_data: ServiceCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -173,7 +160,7 @@ async def create_service(
 
 
 @router.put("/{service_id}/cancel", response_model=ServiceSchema, summary="取消增值服务")
-async def cancel_service(
+def cancel_service(
     service_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -208,7 +195,7 @@ async def cancel_service(
 # ========== 管理员接口 ==========
 
 @router.get("/admin/all", response_model=ServiceListResponse, summary="获取所有增值服务（管理员）")
-async def get_all_services_admin(
+def get_all_services_admin(
     status: Optional[ServiceStatus] = Query(None, description="筛选状态"),
     skip: int = Query(0, ge=0, description="跳过数量"),
     limit: int = Query(20, ge=1, le=100, description="每页数量"),
@@ -217,7 +204,7 @@ async def get_all_services_admin(
 ):
     """管理员获取所有增值服务列表"""
 
-    query = db.query(Service)
+    query = order_projection_query(db, Service, ServiceDetail)
 
     # 状态筛选
     if status is not None:
@@ -229,29 +216,13 @@ async def get_all_services_admin(
     # 分页查询
     services = query.order_by(Service.created_at.desc()).offset(skip).limit(limit).all()
 
-    # 构造详情列表
-    service_details = []
-    for service in services:
-        order = db.query(Order).filter(Order.id == service.order_id).first()
-        garden = None
-        user = db.query(User).filter(User.id == service.user_id).first()
-
-        if order:
-            garden = db.query(Garden).filter(Garden.id == order.garden_id).first()
-
-        service_dict = ServiceDetail.from_orm(service).dict()
-        if garden:
-            service_dict["garden_name"] = garden.name
-        if user:
-            service_dict["user_nickname"] = user.nickname
-
-        service_details.append(ServiceDetail(**service_dict))
+    service_details = [ServiceDetail.model_validate(row) for row in services]
 
     return ServiceListResponse(total=total, items=service_details)
 
 
 @router.put("/admin/{service_id}", response_model=ServiceSchema, summary="更新增值服务状态（管理员）")
-async def update_service_admin(
+def update_service_admin(
     service_id: int,
     service_update: ServiceUpdate,
     current_user: User = Depends(get_current_admin),
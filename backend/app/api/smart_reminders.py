@@ -10,9 +10,10 @@ from pydantic import BaseModel
 from app.core.database import get_db
 from app.api.deps import get_current_user
 from app.models.user import User
-from app.models.crop import SmartReminder, PlantingRecord, Crop
+from app.models.crop import SmartReminder, Crop
 from app.services.smart_reminder_engine import SmartReminderEngine
 from app.services.iot_service import IoTService
+from app.services.statistics import StatisticsService
 
 router = APIRouter()
 
@@ -66,14 +67,8 @@ def generate_smart_reminders(
 
     生成个性化的任务提醒
     """
-    # 首先更新所有种植记录的生长阶段
-    planting_records = db.query(PlantingRecord).filter(
-        PlantingRecord.user_id == current_user.id,
-        PlantingRecord.status == "growing"
-    ).all()
-
-    for record in planting_records:
-        SmartReminderEngine.update_growth_stage(db, record.id)
+    # 首先批量更新该用户所有种植记录的生长阶段
+    SmartReminderEngine.update_growth_stages(db, current_user.id)
 
     # 生成智能提醒
     reminders = SmartReminderEngine.generate_reminders(db, current_user.id)
@@ -171,13 +166,14 @@ def get_iot_status(
 def get_iot_history(
     garden_id: int,
     hours: int = Query(24, ge=1, le=168, description="查询最近多少小时的数据"),
+    resolution: str = Query("raw", regex="^(auto|raw|5m|1h|1d)$", description="数据粒度，默认原始读数"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     获取菜地的物联网历史数据
     """
-    readings = IoTService.get_latest_readings(db, garden_id, hours)
+    readings = IoTService.get_latest_readings(db, garden_id, hours, resolution)
 
     return {
         "garden_id": garden_id,
@@ -283,35 +279,6 @@ def get_reminder_statistics(
     current_user: User = Depends(get_current_user)
 ):
     """
-    获取提醒统计信息
+    获取提醒统计信息（一次分组查询，按用户短时缓存）
     """
-    total = db.query(SmartReminder).filter(
-        SmartReminder.user_id == current_user.id
-    ).count()
-
-    pending = db.query(SmartReminder).filter(
-        SmartReminder.user_id == current_user.id,
-        SmartReminder.status == "pending"
-    ).count()
-
-    completed = db.query(SmartReminder).filter(
-        SmartReminder.user_id == current_user.id,
-        SmartReminder.status == "completed"
-    ).count()
-
-    # 按类型统计
-    type_stats = {}
-    reminders = db.query(SmartReminder).filter(
-        SmartReminder.user_id == current_user.id,
-        SmartReminder.status == "pending"
-    ).all()
-
-    for reminder in reminders:
-        type_stats[reminder.reminder_type] = type_stats.get(reminder.reminder_type, 0) + 1
-
-    return {
-        "total": total,
-        "pending": pending,
-        "completed": completed,
-        "by_type": type_stats
-    }
+    return StatisticsService.reminder_stats(db, current_user.id)
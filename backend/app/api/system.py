@@ -0,0 +1,32 @@
+"""
+系统监控API路由
+"""
+from fastapi import APIRouter, Depends
+from app.core.database import async_engine, async_pool_metrics, engine, pool_metrics
+from app.models.user import User
+from app.api.deps import get_current_admin
+
+router = APIRouter()
+
+
+@router.get("/db-pool", summary="获取数据库连接池状态（管理员）")
+def get_db_pool_stats(
+    reset: bool = False,
+    current_user: User = Depends(get_current_admin)
+):
+    """
+    获取数据库连接池实时状态
+
+    包括已签出连接数、溢出连接数、获取连接等待时间直方图和超时次数。
+    reset=true 时返回当前数据后清空累计指标
+    """
+    result = {
+        "sync": pool_metrics.snapshot(engine.pool),
+        "async": async_pool_metrics.snapshot(async_engine.sync_engine.pool),
+    }
+
+    if reset:
+        pool_metrics.reset()
+        async_pool_metrics.reset()
+
+    return result
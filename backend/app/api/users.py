@@ -6,7 +6,7 @@ from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.models.user import User
 from app.schemas.user import User as UserSchema, UserUpdate
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, invalidate_user_cache
 
 router = APIRouter()
 
@@ -20,7 +20,7 @@ async def get_current_user_info(
 
 
 @router.put("/me", response_model=UserSchema, summary="更新当前用户信息")
-async def update_current_user_info(
+def update_current_user_info(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -38,4 +38,7 @@ async def update_current_user_info(
     db.commit()
     db.refresh(current_user)
 
+    # 用户信息已变更，清除认证缓存中的用户快照
+    invalidate_user_cache(current_user.id)
+
     return current_user
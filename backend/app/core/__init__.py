@@ -2,13 +2,14 @@
 核心模块
 """
 from .config import settings
-from .database import Base, get_db, init_db
+from .database import Base, get_db, get_async_db, init_db
 from .security import create_access_token, decode_access_token, get_password_hash, verify_password
 
 __all__ = [
     "settings",
     "Base",
     "get_db",
+    "get_async_db",
     "init_db",
     "create_access_token",
     "decode_access_token",
@@ -1,22 +1,103 @@
 """
 数据库连接模块
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from .config import settings
+from .db_metrics import PoolMetrics, monitored_pool_class
+from .query_stats import install_query_hooks
+
+# 同步驱动 -> 异步驱动
+_ASYNC_DRIVERS = {
+    "mysql+pymysql": "mysql+aiomysql",
+    "mysql": "mysql+aiomysql",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def _get_async_database_url() -> str:
+    """
+    获取异步数据库连接地址
+
+    优先使用 ASYNC_DATABASE_URL，否则由 DATABASE_URL 替换为对应的异步驱动
+    """
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+
+    scheme, sep, rest = settings.DATABASE_URL.partition("://")
+    return f"{_ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+# 连接池指标（同步/异步引擎各一份）
+pool_metrics = PoolMetrics("sync", settings.DATABASE_POOL_SLOW_WAIT_MS)
+async_pool_metrics = PoolMetrics("async", settings.DATABASE_POOL_SLOW_WAIT_MS)
+
+
+def _engine_options(url: str, pool_base: type, metrics: PoolMetrics) -> dict:
+    """
+    构造引擎参数
+
+    内存SQLite只能使用单连接池，不设置连接池大小和监控
+    """
+    options = {
+        "echo": settings.DATABASE_ECHO,
+        "pool_pre_ping": True,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE,
+    }
+    if ":memory:" in url or url.rstrip("/").endswith("sqlite:"):
+        return options
+
+    options.update(
+        poolclass=monitored_pool_class(pool_base, metrics),
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+    )
+    return options
+
+
+def _set_statement_timeout(dbapi_connection, connection_record):
+    """新建连接时设置会话级语句超时（MySQL max_execution_time，仅对只读SELECT生效）"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(
+        f"SET SESSION max_execution_time = {int(settings.DATABASE_STATEMENT_TIMEOUT_MS)}"
+    )
+    cursor.close()
+
 
 # 创建数据库引擎
 engine = create_engine(
     settings.DATABASE_URL,
-    echo=settings.DATABASE_ECHO,
-    pool_pre_ping=True,
-    pool_recycle=3600,
+    **_engine_options(settings.DATABASE_URL, QueuePool, pool_metrics),
 )
 
+# 创建异步数据库引擎（供高频读接口使用，不阻塞事件循环）
+async_engine = create_async_engine(
+    _get_async_database_url(),
+    **_engine_options(_get_async_database_url(), AsyncAdaptedQueuePool, async_pool_metrics),
+)
+
+for _sync_engine in (engine, async_engine.sync_engine):
+    if settings.DATABASE_STATEMENT_TIMEOUT_MS > 0 and _sync_engine.dialect.name == "mysql":
+        event.listen(_sync_engine, "connect", _set_statement_timeout)
+    # 请求级SQL条数/耗时统计
+    install_query_hooks(_sync_engine)
+
 # 创建Session工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 创建异步Session工厂
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 # 创建模型基类
 Base = declarative_base()
 
@@ -33,10 +114,19 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    获取异步数据库会话
+    用于 async def 路由的依赖注入
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def init_db():
     """
     初始化数据库
     创建所有表
     """
-    from app.models import user, garden, order, reminder, service, post, comment, like
+    from app.models import user, garden, order, reminder, service, post, comment, like, post_counter
     Base.metadata.create_all(bind=engine)
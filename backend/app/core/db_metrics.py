@@ -0,0 +1,164 @@
+"""
+数据库连接池监控模块
+统计连接获取等待时间、超时次数，并在连接池接近耗尽时输出告警日志
+"""
+import bisect
+import logging
+import threading
+import time
+from typing import Dict, List
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+# 等待时间直方图的桶上界（毫秒），最后一个桶为 +Inf
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 250, 500, 1000, 5000, 10000, 30000)
+
+# 同一连接池两次告警日志的最小间隔（秒），避免高峰期刷屏
+ALARM_INTERVAL_SECONDS = 10
+
+
+class PoolMetrics:
+    """
+    连接池指标（线程安全）
+
+    - 连接获取等待时间直方图（仅统计从池中取连接的耗时，不含SQL执行）
+    - 获取超时次数（QueuePool TimeoutError）
+    - 等待超过阈值的慢获取次数
+    """
+
+    def __init__(self, name: str, slow_wait_ms: float):
+        self.name = name
+        self.slow_wait_ms = slow_wait_ms
+        self._lock = threading.Lock()
+        self._bucket_counts: List[int] = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self._wait_count = 0
+        self._wait_sum_ms = 0.0
+        self._wait_max_ms = 0.0
+        self._slow_count = 0
+        self._timeout_count = 0
+        self._last_alarm_at = 0.0
+
+    def observe_wait(self, pool: QueuePool, wait_seconds: float) -> None:
+        """记录一次成功获取连接的等待时间"""
+        wait_ms = wait_seconds * 1000
+        with self._lock:
+            self._bucket_counts[bisect.bisect_left(WAIT_BUCKETS_MS, wait_ms)] += 1
+            self._wait_count += 1
+            self._wait_sum_ms += wait_ms
+            self._wait_max_ms = max(self._wait_max_ms, wait_ms)
+            slow = self.slow_wait_ms > 0 and wait_ms >= self.slow_wait_ms
+            if slow:
+                self._slow_count += 1
+
+        if slow and self._should_alarm():
+            logger.warning(
+                f"数据库连接池[{self.name}]获取连接等待 {wait_ms:.0f}ms，"
+                f"连接池接近耗尽: {pool.status()}"
+            )
+
+    def observe_timeout(self, pool: QueuePool) -> None:
+        """记录一次获取连接超时"""
+        with self._lock:
+            self._timeout_count += 1
+
+        if self._should_alarm():
+            logger.error(
+                f"数据库连接池[{self.name}]已耗尽，获取连接超时: {pool.status()}"
+            )
+
+    def _should_alarm(self) -> bool:
+        """告警限流"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_alarm_at < ALARM_INTERVAL_SECONDS:
+                return False
+            self._last_alarm_at = now
+            return True
+
+    def snapshot(self, pool) -> Dict:
+        """
+        获取连接池当前状态与累计指标
+
+        Args:
+            pool: 引擎的连接池（engine.pool）
+
+        Returns:
+            指标字典
+        """
+        stats = {"name": self.name, "pool_class": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            stats.update({
+                "pool_size": pool.size(),
+                "max_overflow": pool._max_overflow,
+                "timeout": pool.timeout(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": max(0, pool.overflow()),
+            })
+
+        with self._lock:
+            buckets = {}
+            cumulative = 0
+            for bound, count in zip(WAIT_BUCKETS_MS, self._bucket_counts):
+                cumulative += count
+                buckets[f"le_{bound}ms"] = cumulative
+            buckets["le_inf"] = cumulative + self._bucket_counts[-1]
+
+            stats["wait"] = {
+                "count": self._wait_count,
+                "avg_ms": round(self._wait_sum_ms / self._wait_count, 3) if self._wait_count else 0,
+                "max_ms": round(self._wait_max_ms, 3),
+                "slow_count": self._slow_count,
+                "slow_threshold_ms": self.slow_wait_ms,
+                "histogram": buckets,
+            }
+            stats["timeout_count"] = self._timeout_count
+
+        return stats
+
+    def reset(self) -> None:
+        """清空累计指标"""
+        with self._lock:
+            self._bucket_counts = [0] * (len(WAIT_BUCKETS_MS) + 1)
+            self._wait_count = 0
+            self._wait_sum_ms = 0.0
+            self._wait_max_ms = 0.0
+            self._slow_count = 0
+            self._timeout_count = 0
+
+
+class _MonitoredPoolMixin:
+    """在从池中取连接时记录等待时间和超时"""
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.observe_timeout(self)
+            raise
+        self.metrics.observe_wait(self, time.perf_counter() - start)
+        return connection
+
+
+def monitored_pool_class(base: type, metrics: PoolMetrics) -> type:
+    """
+    构造带监控的连接池类
+
+    指标挂在类属性上，engine.dispose() 重建连接池后仍然累计到同一对象
+
+    Args:
+        base: QueuePool 或 AsyncAdaptedQueuePool
+        metrics: 指标对象
+    """
+    return type(
+        f"Monitored{base.__name__}",
+        (_MonitoredPoolMixin, base),
+        {"metrics": metrics},
+    )
+
@@ -0,0 +1,126 @@
+"""
+请求级SQL统计模块
+统计每个请求执行的SQL条数和耗时，并检测同一语句在一个请求内重复执行（N+1查询）
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# IN 列表中的占位符（?、%s、%(name)s、:name）折叠为一个
+_IN_LIST_PATTERN = re.compile(
+    r"\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)"
+)
+_NUMBER_PATTERN = re.compile(r"\b\d+\b")
+_STRING_PATTERN = re.compile(r"'(?:[^']|'')*'")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """
+    归一化SQL语句，用于识别"同一条语句"
+
+    去掉字面量、折叠 IN 列表和空白，只保留语句结构
+    """
+    statement = _STRING_PATTERN.sub("?", statement)
+    statement = _NUMBER_PATTERN.sub("?", statement)
+    statement = _IN_LIST_PATTERN.sub("(?)", statement)
+    return _WHITESPACE_PATTERN.sub(" ", statement).strip()
+
+
+class QueryStats:
+    """单个请求的SQL统计"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.statements: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, elapsed: float) -> None:
+        """记录一次SQL执行"""
+        normalized = normalize_statement(statement)
+        with self._lock:
+            self.count += 1
+            self.total_seconds += elapsed
+            self.statements[normalized] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """返回在本请求内执行次数超过 threshold 的语句"""
+        with self._lock:
+            return [
+                (statement, count)
+                for statement, count in self.statements.most_common()
+                if count > threshold
+            ]
+
+
+# 当前请求的统计对象，不在请求上下文中（如定时任务）时为 None
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get("query_start_time")
+    if not start_times:
+        return
+    elapsed = time.perf_counter() - start_times.pop()
+
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+
+
+def install_query_hooks(engine: Engine) -> None:
+    """
+    在引擎上注册SQL统计钩子
+
+    Args:
+        engine: 同步引擎（异步引擎传入 async_engine.sync_engine）
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+async def query_stats_middleware(request: Request, call_next):
+    """
+    请求级SQL统计中间件
+
+    - 响应头 X-DB-Queries：SQL条数，X-DB-Time：SQL总耗时（毫秒）
+    - 同一归一化语句执行次数超过 DB_QUERY_REPEAT_THRESHOLD 时输出N+1告警日志
+    """
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        response = await call_next(request)
+    finally:
+        _current_stats.reset(token)
+
+    db_time_ms = stats.total_seconds * 1000
+    response.headers["X-DB-Queries"] = str(stats.count)
+    response.headers["X-DB-Time"] = f"{db_time_ms:.2f}"
+
+    route = f"{request.method} {request.url.path}"
+    if stats.count:
+        logger.info(f"{route} - SQL {stats.count} 条, 耗时 {db_time_ms:.2f}ms")
+
+    for statement, count in stats.repeated(settings.DB_QUERY_REPEAT_THRESHOLD):
+        logger.warning(
+            f"疑似N+1查询: {route} 中同一语句执行了 {count} 次: {statement[:300]}"
+        )
+
+    return response
@@ -0,0 +1,111 @@
+"""
+跨数据库的 UPSERT（插入或更新）/ 冲突忽略插入语句构造
+MySQL 使用 INSERT ... ON DUPLICATE KEY UPDATE，SQLite/PostgreSQL 使用 ON CONFLICT
+"""
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import case
+from sqlalchemy.orm import Session
+
+
+def _dialect_insert(dialect_name: str):
+    """获取方言对应的 insert 构造函数"""
+    if dialect_name == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        raise NotImplementedError(f"不支持的数据库类型: {dialect_name}")
+    return insert
+
+
+def upsert(
+    db: Session,
+    model,
+    rows: List[Dict[str, Any]],
+    index_elements: Sequence[str],
+    update: Callable[[Any], List[Tuple[str, Any]]],
+    where: Optional[Callable[[Any], Any]] = None,
+    batch_size: int = 1000,
+) -> None:
+    """
+    多行插入，唯一键冲突时更新
+
+    Args:
+        db: 数据库会话
+        model: ORM 模型类
+        rows: 待插入的行
+        index_elements: 唯一键列名（ON CONFLICT 需要）
+        update: 接收"新插入行"的列集合，返回 [(列名, 更新表达式)]。
+                MySQL 按顺序赋值，后面的表达式会看到前面已更新的列，
+                被 where 条件引用的列应放在最后
+        where: 接收"新插入行"的列集合，返回是否更新的条件，不传则总是更新
+        batch_size: 每条语句包含的行数（受数据库参数个数、包大小限制）
+    """
+    for i in range(0, len(rows), batch_size):
+        _upsert_batch(db, model, rows[i:i + batch_size], index_elements, update, where)
+
+
+def _upsert_batch(db, model, rows, index_elements, update, where) -> None:
+    """对一批行执行 upsert"""
+    if not rows:
+        return
+
+    table = model.__table__
+    insert = _dialect_insert(db.get_bind().dialect.name)
+    stmt = insert(table).values(rows)
+
+    if db.get_bind().dialect.name == "mysql":
+        incoming = stmt.inserted
+        values = update(incoming)
+        if where is not None:
+            condition = where(incoming)
+            values = [
+                (name, case((condition, expr), else_=table.c[name]))
+                for name, expr in values
+            ]
+        stmt = stmt.on_duplicate_key_update(values)
+    else:
+        incoming = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(index_elements),
+            set_=dict(update(incoming)),
+            where=where(incoming) if where is not None else None,
+        )
+
+    db.execute(stmt)
+
+
+def insert_ignore(
+    db: Session,
+    model,
+    rows: List[Dict[str, Any]],
+    index_elements: Sequence[str],
+    batch_size: int = 1000,
+) -> None:
+    """
+    多行插入，唯一键冲突的行跳过
+
+    MySQL 不使用 INSERT IGNORE（会把其他错误也降级为警告），
+    而是 ON DUPLICATE KEY UPDATE 把唯一键赋值为自身，等价于什么都不做
+
+    Args:
+        db: 数据库会话
+        model: ORM 模型类
+        rows: 待插入的行
+        index_elements: 唯一键列名
+        batch_size: 每条语句包含的行数
+    """
+    table = model.__table__
+    dialect_name = db.get_bind().dialect.name
+    insert = _dialect_insert(dialect_name)
+
+    for i in range(0, len(rows), batch_size):
+        stmt = insert(table).values(rows[i:i + batch_size])
+        if dialect_name == "mysql":
+            key = index_elements[0]
+            stmt = stmt.on_duplicate_key_update([(key, table.c[key])])
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=list(index_elements))
+        db.execute(stmt)
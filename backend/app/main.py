@@ -13,7 +13,9 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.core.database import init_db
+from app.core.query_stats import query_stats_middleware
 from app.api import api_router
+from app.services.iot_alerts import IoTAlertService
 
 # 创建FastAPI应用实例
 app = FastAPI(
@@ -32,8 +34,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-DB-Queries", "X-DB-Time"],
 )
 
+# 请求级SQL统计中间件（X-DB-Queries / X-DB-Time 响应头，N+1告警日志）
+app.middleware("http")(query_stats_middleware)
+
 
 # 应用启动事件
 @app.on_event("startup")
@@ -44,6 +50,9 @@ async def startup_event():
 
     # 初始化数据库（创建表）
     # init_db()  # 生产环境请谨慎使用，建议手动执行SQL脚本
+
+    # 启动环境警告消费线程（异常读数入库后立即生成提醒）
+    IoTAlertService.start()
     print("✅ 应用启动完成!")
 
 
@@ -52,6 +61,7 @@ async def startup_event():
 async def shutdown_event():
     """应用关闭时执行"""
     print("👋 应用正在关闭...")
+    IoTAlertService.stop()
 
 
 # 健康检查接口
@@ -9,6 +9,7 @@ from .service import Service, ServiceType, ServiceStatus
 from .post import Post
 from .comment import Comment
 from .like import Like
+from .post_counter import PostCounterDelta
 
 __all__ = [
     "User", "UserRole",
@@ -19,4 +20,5 @@ __all__ = [
     "Post",
     "Comment",
     "Like",
+    "PostCounterDelta",
 ]
@@ -1,7 +1,7 @@
 """
 作物生长规则模型
 """
-from sqlalchemy import Column, Integer, String, Float, JSON, DateTime, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Float, JSON, DateTime, Enum as SQLEnum, UniqueConstraint
 from sqlalchemy.sql import func
 from app.core.database import Base
 import enum
@@ -137,6 +137,47 @@ class IoTReading(Base):
     reading_time = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
 
+class IoTReadingRollup(Base):
+    """物联网读数汇总表（按 5m/1h/1d 时间桶汇总）"""
+    __tablename__ = "iot_reading_rollups"
+    __table_args__ = (
+        UniqueConstraint("sensor_id", "resolution", "bucket_start", name="uk_sensor_resolution_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    sensor_id = Column(Integer, nullable=False, comment="传感器ID")
+    resolution = Column(String(8), nullable=False, comment="汇总粒度：5m/1h/1d")
+    bucket_start = Column(DateTime(timezone=True), nullable=False, comment="时间桶起始时间")
+
+    reading_count = Column(Integer, nullable=False, default=0, comment="读数条数")
+    sum_value = Column(Float, nullable=False, default=0, comment="读数之和")
+    min_value = Column(Float, comment="最小值")
+    max_value = Column(Float, comment="最大值")
+    abnormal_count = Column(Integer, nullable=False, default=0, comment="异常读数条数")
+
+    @property
+    def avg_value(self) -> float:
+        """平均值"""
+        return self.sum_value / self.reading_count if self.reading_count else 0
+
+
+class SensorLatest(Base):
+    """传感器最新读数表（数据上报时 upsert 维护，用于查询当前状态）"""
+    __tablename__ = "sensor_latest"
+
+    sensor_id = Column(Integer, primary_key=True, autoincrement=False, comment="传感器ID")
+    garden_id = Column(Integer, nullable=False, index=True, comment="菜地ID")
+    sensor_type = Column(String(50), nullable=False, comment="传感器类型")
+
+    value = Column(Float, nullable=False, comment="读数值")
+    unit = Column(String(20), comment="单位")
+    is_abnormal = Column(Integer, default=0, comment="是否异常")
+    abnormal_reason = Column(String(200), comment="异常原因")
+    reading_time = Column(DateTime(timezone=True), nullable=False, comment="读数时间")
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
 class PlantingRecord(Base):
     """种植记录表"""
     __tablename__ = "planting_records"
@@ -209,6 +250,10 @@ class SmartReminder(Base):
     # 状态: pending（待处理）, completed（已完成）, ignored（已忽略）
 
     completed_at = Column(DateTime(timezone=True), comment="完成时间")
+    sent_at = Column(DateTime(timezone=True), comment="投递时间（为空表示未投递）")
+
+    # 去重键：用户:种植记录:类型:时间桶（系统生成的提醒才有，手动提醒为空）
+    dedup_key = Column(String(100), unique=True, comment="去重键")
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -0,0 +1,25 @@
+"""
+帖子计数增量数据模型
+"""
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class PostCounterDelta(Base):
+    """
+    帖子计数增量模型（只追加）
+
+    点赞/评论不再直接改写 posts 行，而是追加一条增量记录，
+    由定时任务批量合并回 posts.like_count / posts.comment_count
+    """
+    __tablename__ = "post_counter_deltas"
+
+    id = Column(Integer, primary_key=True, index=True, comment="增量ID")
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False, index=True, comment="帖子ID")
+    like_delta = Column(Integer, nullable=False, default=0, comment="点赞数增量")
+    comment_delta = Column(Integer, nullable=False, default=0, comment="评论数增量")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="记录时间")
+
+    def __repr__(self):
+        return f"<PostCounterDelta(post_id={self.post_id}, like={self.like_delta}, comment={self.comment_delta})>"
@@ -33,6 +33,7 @@ class Reminder(Base):
     content = Column(Text, nullable=False, comment="提醒内容")
     remind_time = Column(DateTime(timezone=True), nullable=False, comment="提醒时间")
     status = Column(Enum(ReminderStatus, values_callable=lambda x: [e.value for e in x]), default=ReminderStatus.PENDING, comment="状态")
+    sent_at = Column(DateTime(timezone=True), comment="投递时间（为空表示未投递）")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
 
     def __repr__(self):
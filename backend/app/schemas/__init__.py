@@ -2,19 +2,21 @@
 数据Schema模块
 """
 from .user import User, UserCreate, UserUpdate, WechatLoginRequest, LoginResponse
-from .garden import Garden, GardenCreate, GardenUpdate, GardenListResponse
-from .order import Order, OrderCreate, OrderUpdate, OrderDetail, OrderListResponse
+from .garden import Garden, GardenCreate, GardenUpdate, GardenListResponse, RentalPeriod
+from .order import Order, OrderCreate, OrderUpdate, OrderDetail, OrderListResponse, MyOrdersResponse
 from .service import Service, ServiceCreate, ServiceUpdate, ServiceDetail, ServiceListResponse
 from .post import Post, PostCreate, PostUpdate, PostDetail, PostListResponse
 from .post import Comment, CommentCreate, CommentDetail, CommentListResponse
-from .reminder import Reminder, ReminderCreate, ReminderUpdate, ReminderDetail, ReminderListResponse
+from .reminder import Reminder, ReminderCreate, ReminderUpdate, ReminderAutoCreateBatch, ReminderDetail, ReminderListResponse
+from .iot import IoTReadingIn, IoTReadingBatch, IoTReadingBatchResult
 
 __all__ = [
     "User", "UserCreate", "UserUpdate", "WechatLoginRequest", "LoginResponse",
-    "Garden", "GardenCreate", "GardenUpdate", "GardenListResponse",
-    "Order", "OrderCreate", "OrderUpdate", "OrderDetail", "OrderListResponse",
+    "Garden", "GardenCreate", "GardenUpdate", "GardenListResponse", "RentalPeriod",
+    "Order", "OrderCreate", "OrderUpdate", "OrderDetail", "OrderListResponse", "MyOrdersResponse",
     "Service", "ServiceCreate", "ServiceUpdate", "ServiceDetail", "ServiceListResponse",
     "Post", "PostCreate", "PostUpdate", "PostDetail", "PostListResponse",
     "Comment", "CommentCreate", "CommentDetail", "CommentListResponse",
-    "Reminder", "ReminderCreate", "ReminderUpdate", "ReminderDetail", "ReminderListResponse",
+    "Reminder", "ReminderCreate", "ReminderUpdate", "ReminderAutoCreateBatch", "ReminderDetail", "ReminderListResponse",
+    "IoTReadingIn", "IoTReadingBatch", "IoTReadingBatchResult",
 ]
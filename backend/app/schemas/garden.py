@@ -62,6 +62,16 @@ class OrderInfo(BaseModel):
         from_attributes = True
 
 
+class RentalPeriod(BaseModel):
+    """菜地租用日历中的占用租期"""
+    start_date: date = Field(..., description="开始日期")
+    end_date: date = Field(..., description="结束日期")
+    status: OrderStatus = Field(..., description="订单状态")
+
+    class Config:
+        from_attributes = True
+
+
 class Garden(GardenInDB):
     """菜地响应Schema（包含用户相关信息）"""
     is_mine: Optional[bool] = Field(default=False, description="是否是我的菜地")
@@ -73,5 +83,6 @@ class Garden(GardenInDB):
 
 class GardenListResponse(BaseModel):
     """菜地列表响应Schema"""
-    total: int = Field(..., description="总数")
+    total: Optional[int] = Field(None, description="总数（游标分页时不返回）")
     items: List[Garden] = Field(..., description="菜地列表")
+    next_cursor: Optional[str] = Field(None, description="下一页游标（仅游标分页时返回）")
@@ -0,0 +1,47 @@
+"""
+物联网数据Schema
+"""
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import Optional, List
+from datetime import datetime
+
+
+class IoTReadingIn(BaseModel):
+    """单条上报读数（sensor_id 与 device_id 至少提供一个）"""
+    sensor_id: Optional[int] = Field(None, description="传感器ID")
+    device_id: Optional[str] = Field(None, description="设备ID")
+    value: float = Field(..., description="读数值")
+    unit: Optional[str] = Field(None, description="单位，不传则按传感器类型补全")
+    reading_time: Optional[datetime] = Field(None, description="读数时间，不传则为服务器接收时间")
+
+    @field_validator("reading_time")
+    @classmethod
+    def to_local_naive(cls, value: Optional[datetime]) -> Optional[datetime]:
+        """带时区的读数时间转换为服务器本地时间（数据库中统一存不带时区的本地时间）"""
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone().replace(tzinfo=None)
+        return value
+
+    @model_validator(mode="after")
+    def check_sensor(self):
+        if self.sensor_id is None and not self.device_id:
+            raise ValueError("sensor_id 和 device_id 至少提供一个")
+        return self
+
+
+class IoTReadingBatch(BaseModel):
+    """批量上报读数请求"""
+    readings: List[IoTReadingIn] = Field(..., min_length=1, max_length=5000, description="读数列表")
+
+
+class IoTReadingRejected(BaseModel):
+    """未入库的读数"""
+    index: int = Field(..., description="在请求列表中的位置")
+    reason: str = Field(..., description="原因")
+
+
+class IoTReadingBatchResult(BaseModel):
+    """批量上报结果"""
+    accepted: int = Field(..., description="入库条数")
+    abnormal: int = Field(..., description="其中异常读数条数")
+    rejected: List[IoTReadingRejected] = Field(default_factory=list, description="未入库的读数")
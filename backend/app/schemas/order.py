@@ -2,7 +2,7 @@
 订单数据Schema
 """
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime, date
 from decimal import Decimal
 from app.models.order import OrderStatus
@@ -52,5 +52,11 @@ class OrderDetail(Order):
 
 class OrderListResponse(BaseModel):
     """订单列表响应Schema"""
-    total: int = Field(..., description="总数")
+    total: Optional[int] = Field(None, description="总数（游标分页时不返回）")
     items: List[OrderDetail] = Field(..., description="订单列表")
+    next_cursor: Optional[str] = Field(None, description="下一页游标（仅游标分页时返回）")
+
+
+class MyOrdersResponse(OrderListResponse):
+    """我的订单统计响应Schema（个人中心）"""
+    by_status: Dict[str, int] = Field(default_factory=dict, description="各状态订单数量")
@@ -51,8 +51,9 @@ class PostDetail(Post):
 
 class PostListResponse(BaseModel):
     """帖子列表响应Schema"""
-    total: int = Field(..., description="总数")
+    total: Optional[int] = Field(None, description="总数（游标分页时不返回）")
     items: List[PostDetail] = Field(..., description="帖子列表")
+    next_cursor: Optional[str] = Field(None, description="下一页游标（仅游标分页时返回）")
 
 
 class CommentBase(BaseModel):
@@ -19,6 +19,11 @@ class ReminderCreate(ReminderBase):
     order_id: int = Field(..., description="订单ID")
 
 
+class ReminderAutoCreateBatch(BaseModel):
+    """批量自动创建提醒请求Schema"""
+    order_ids: List[int] = Field(..., min_length=1, max_length=1000, description="订单ID列表")
+
+
 class ReminderUpdate(BaseModel):
     """更新任务提醒Schema"""
     status: Optional[ReminderStatus] = Field(None, description="状态")
@@ -50,8 +55,9 @@ class ReminderDetail(Reminder):
 
 class ReminderListResponse(BaseModel):
     """任务提醒列表响应Schema"""
-    total: int = Field(..., description="总数")
+    total: Optional[int] = Field(None, description="总数（游标分页时不返回）")
     items: List[ReminderDetail] = Field(..., description="提醒列表")
+    next_cursor: Optional[str] = Field(None, description="下一页游标（仅游标分页时返回）")
 
 
 class ReminderTemplate(BaseModel):
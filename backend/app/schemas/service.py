@@ -52,8 +52,9 @@ class ServiceDetail(Service):
 
 class ServiceListResponse(BaseModel):
     """增值服务列表响应Schema"""
-    total: int = Field(..., description="总数")
+    total: Optional[int] = Field(None, description="总数（游标分页时不返回）")
     items: List[ServiceDetail] = Field(..., description="服务列表")
+    next_cursor: Optional[str] = Field(None, description="下一页游标（仅游标分页时返回）")
 
 
 class ServicePriceConfig(BaseModel):
@@ -0,0 +1,177 @@
+"""
+作物环境阈值索引
+按菜地预先计算所有进行中作物的最严格阈值，读数异常检测只需查字典
+"""
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import and_, event, inspect
+from sqlalchemy.orm import Session, object_session
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.crop import PlantingRecord, Crop
+
+# 受作物环境需求约束的传感器类型
+REQUIREMENT_SENSOR_TYPES = ("temperature", "humidity", "soil_ph")
+
+# 土壤湿度阈值一般在20-80%（与作物无关，菜地有作物环境需求时才检查）
+SOIL_MOISTURE_RANGE = (20, 80)
+
+# 阈值类型：{sensor_type: (最小值或None, 最大值或None)}
+Thresholds = Dict[str, Tuple[Optional[float], Optional[float]]]
+
+# session.info 中记录待失效菜地的键，ALL 表示整个索引失效
+_DIRTY_KEY = "crop_threshold_dirty"
+_ALL = "*"
+
+# 进程内索引，TTL 兜底其他进程（调度器、脚本）的修改
+_index = TTLCache(
+    maxsize=settings.IOT_THRESHOLD_INDEX_MAX_SIZE,
+    ttl=settings.IOT_THRESHOLD_INDEX_TTL_SECONDS
+)
+
+
+class CropThresholdIndex:
+    """
+    菜地 -> 传感器类型 -> (最严格的最小值, 最严格的最大值)
+
+    - 多种作物同时生长时取所有作物最小值中的最大者、最大值中的最小者
+    - 种植记录或作物变更在事务提交后使相关菜地（作物变更时为全部）失效
+    """
+
+    @staticmethod
+    def get(db: Session, garden_id: int) -> Thresholds:
+        """获取单个菜地的阈值"""
+        return CropThresholdIndex.get_many(db, [garden_id])[garden_id]
+
+    @staticmethod
+    def get_many(db: Session, garden_ids: Iterable[int]) -> Dict[int, Thresholds]:
+        """
+        获取多个菜地的阈值，未命中的菜地一次批量加载
+
+        Returns:
+            {garden_id: 阈值}，没有进行中作物（或作物无环境需求）的菜地为空字典
+        """
+        result = {}
+        missing = set()
+        for garden_id in set(garden_ids):
+            thresholds = _index.get(garden_id)
+            if thresholds is None:
+                missing.add(garden_id)
+            else:
+                result[garden_id] = thresholds
+
+        if missing:
+            loaded = CropThresholdIndex._load(db, missing)
+            for garden_id in missing:
+                thresholds = loaded.get(garden_id, {})
+                _index.set(garden_id, thresholds)
+                result[garden_id] = thresholds
+
+        return result
+
+    @staticmethod
+    def _load(db: Session, garden_ids: Iterable[int]) -> Dict[int, Thresholds]:
+        """从数据库加载菜地阈值（种植记录、作物各一次查询）"""
+        planting_records = db.query(
+            PlantingRecord.garden_id, PlantingRecord.crop_id
+        ).filter(
+            and_(
+                PlantingRecord.garden_id.in_(garden_ids),
+                PlantingRecord.status == "growing"
+            )
+        ).all()
+
+        if not planting_records:
+            return {}
+
+        crop_ids = {crop_id for _, crop_id in planting_records}
+        requirements_by_crop = {
+            crop_id: requirements
+            for crop_id, requirements in db.query(
+                Crop.id, Crop.environment_requirements
+            ).filter(Crop.id.in_(crop_ids)).all()
+        }
+
+        result: Dict[int, Thresholds] = {}
+        for garden_id, crop_id in planting_records:
+            requirements = requirements_by_crop.get(crop_id)
+            if not requirements:
+                continue
+
+            thresholds = result.setdefault(garden_id, {"soil_moisture": SOIL_MOISTURE_RANGE})
+            for sensor_type in REQUIREMENT_SENSOR_TYPES:
+                req = requirements.get(sensor_type)
+                if not req:
+                    continue
+                low, high = thresholds.get(sensor_type, (None, None))
+                if req.get("min") is not None:
+                    low = req["min"] if low is None else max(low, req["min"])
+                if req.get("max") is not None:
+                    high = req["max"] if high is None else min(high, req["max"])
+                thresholds[sensor_type] = (low, high)
+
+        return result
+
+    @staticmethod
+    def invalidate(garden_id: int = None) -> None:
+        """使菜地（不传则全部）的阈值失效"""
+        if garden_id is None:
+            _index.clear()
+        else:
+            _index.delete(garden_id)
+
+
+def _mark_dirty(target, *garden_ids) -> None:
+    """记录待失效的菜地，提交后生效"""
+    session = object_session(target)
+    if session is None:
+        return
+    session.info.setdefault(_DIRTY_KEY, set()).update(garden_ids)
+
+
+@event.listens_for(PlantingRecord, "after_insert")
+@event.listens_for(PlantingRecord, "after_delete")
+def _planting_record_added_or_removed(mapper, connection, target):
+    _mark_dirty(target, target.garden_id)
+
+
+@event.listens_for(PlantingRecord, "after_update")
+def _planting_record_changed(mapper, connection, target):
+    # 只有菜地、作物、状态变化会影响阈值（生长阶段更新不影响）
+    attrs = inspect(target).attrs
+    if not any(attrs[key].history.has_changes() for key in ("garden_id", "crop_id", "status")):
+        return
+
+    garden_ids = {target.garden_id}
+    # 菜地变更时旧菜地也需要失效
+    garden_ids.update(attrs.garden_id.history.deleted or ())
+    _mark_dirty(target, *garden_ids)
+
+
+@event.listens_for(Crop, "after_update")
+@event.listens_for(Crop, "after_delete")
+def _crop_changed(mapper, connection, target):
+    _mark_dirty(target, _ALL)
+
+
+@event.listens_for(Session, "after_bulk_update")
+@event.listens_for(Session, "after_bulk_delete")
+def _bulk_changed(context):
+    if context.mapper.class_ in (PlantingRecord, Crop):
+        context.session.info.setdefault(_DIRTY_KEY, set()).add(_ALL)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    dirty = session.info.pop(_DIRTY_KEY, None)
+    if not dirty:
+        return
+    if _ALL in dirty:
+        CropThresholdIndex.invalidate()
+    else:
+        for garden_id in dirty:
+            CropThresholdIndex.invalidate(garden_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop(_DIRTY_KEY, None)
@@ -0,0 +1,225 @@
+"""
+物联网环境警告（事件驱动）
+读数入库时发布异常事件到进程内队列，后台消费线程立即生成 environment_alert 提醒，
+同一菜地在防抖时间内只提醒一次
+"""
+import logging
+import queue
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.crop import PlantingRecord, Crop, SmartReminder
+
+logger = logging.getLogger(__name__)
+
+# 优先级最高（5）的传感器类型，其余为4
+URGENT_SENSOR_TYPES = ("temperature", "soil_moisture")
+
+_queue: "queue.Queue[Dict]" = queue.Queue(maxsize=settings.IOT_ALERT_QUEUE_SIZE)
+
+# 菜地最近一次提醒时间（进程内防抖，跨进程由去重键兜底）
+_last_alert: Dict[int, datetime] = {}
+_last_alert_lock = threading.Lock()
+
+_consumer: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+class IoTAlertService:
+    """物联网环境警告服务"""
+
+    @staticmethod
+    def publish(events: List[Dict]) -> None:
+        """
+        发布异常读数事件（不阻塞，队列满时丢弃并记录日志）
+
+        Args:
+            events: 异常读数，每项包含 garden_id、sensor_id、sensor_type、value、unit、
+                    abnormal_reason、reading_time
+        """
+        dropped = set()
+        for event in events:
+            try:
+                _queue.put_nowait(event)
+            except queue.Full:
+                dropped.add(event["garden_id"])
+
+        if dropped:
+            logger.warning(f"环境警告队列已满，丢弃菜地 {sorted(dropped)} 的异常事件")
+
+    @staticmethod
+    def start(session_factory=None) -> None:
+        """启动后台消费线程（重复调用无副作用）"""
+        global _consumer
+        if _consumer is not None and _consumer.is_alive():
+            return
+
+        if session_factory is None:
+            from app.core.database import SessionLocal
+            session_factory = SessionLocal
+
+        _stop.clear()
+        _consumer = threading.Thread(
+            target=IoTAlertService._run,
+            args=(session_factory,),
+            name="iot-alert-consumer",
+            daemon=True
+        )
+        _consumer.start()
+        logger.info("环境警告消费线程已启动")
+
+    @staticmethod
+    def stop(timeout: float = 5) -> None:
+        """停止后台消费线程（处理完已取出的事件后退出）"""
+        global _consumer
+        _stop.set()
+        if _consumer is not None:
+            _consumer.join(timeout)
+            _consumer = None
+
+    @staticmethod
+    def _run(session_factory) -> None:
+        """消费循环：取出一批事件，一次处理"""
+        while not _stop.is_set():
+            try:
+                events = [_queue.get(timeout=1)]
+            except queue.Empty:
+                continue
+
+            while len(events) < settings.IOT_ALERT_BATCH_SIZE:
+                try:
+                    events.append(_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            db = session_factory()
+            try:
+                IoTAlertService.process_events(db, events)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"环境警告生成失败: {e}", exc_info=True)
+            finally:
+                db.close()
+
+    @staticmethod
+    def process_events(db: Session, events: List[Dict], now: datetime = None) -> List[SmartReminder]:
+        """
+        将一批异常事件转换为环境警告提醒
+
+        - 每个菜地取优先级最高的一条事件，防抖时间内已提醒过的菜地跳过
+        - 菜地内每个进行中、有环境需求的种植记录各生成一条提醒
+        - 已有防抖时间内待处理环境警告的用户跳过
+
+        Returns:
+            本批生成的提醒
+        """
+        from app.services.smart_reminder_engine import SmartReminderEngine
+
+        now = now or datetime.now()
+        debounce = timedelta(seconds=settings.IOT_ALERT_DEBOUNCE_SECONDS)
+
+        # 每个菜地只保留优先级最高的事件
+        by_garden: Dict[int, Dict] = {}
+        with _last_alert_lock:
+            for event in events:
+                garden_id = event["garden_id"]
+                last = _last_alert.get(garden_id)
+                if last is not None and now - last < debounce:
+                    continue
+                current = by_garden.get(garden_id)
+                if current is None or (
+                    IoTAlertService._priority(event["sensor_type"]) >
+                    IoTAlertService._priority(current["sensor_type"])
+                ):
+                    by_garden[garden_id] = event
+
+        if not by_garden:
+            return []
+
+        garden_ids = list(by_garden)
+        records = db.query(PlantingRecord).filter(
+            and_(
+                PlantingRecord.garden_id.in_(garden_ids),
+                PlantingRecord.status == "growing"
+            )
+        ).order_by(PlantingRecord.id).all()
+
+        crops = {
+            crop.id: crop
+            for crop in db.query(Crop).filter(
+                Crop.id.in_({record.crop_id for record in records})
+            ).all()
+        } if records else {}
+
+        # 防抖时间内已有待处理环境警告的用户和菜地
+        alerted = set(db.query(SmartReminder.user_id, SmartReminder.garden_id).filter(
+            and_(
+                SmartReminder.garden_id.in_(garden_ids),
+                SmartReminder.reminder_type == "environment_alert",
+                SmartReminder.status == "pending",
+                SmartReminder.created_at >= now - debounce
+            )
+        ).all())
+
+        reminders = []
+        for record in records:
+            crop = crops.get(record.crop_id)
+            if not crop or not crop.environment_requirements:
+                continue
+            if (record.user_id, record.garden_id) in alerted:
+                continue
+            reminders.append(IoTAlertService._build_reminder(
+                record, crop, by_garden[record.garden_id], now
+            ))
+
+        if not reminders:
+            return []
+
+        saved = SmartReminderEngine.save_reminders(db, reminders, now)
+
+        # 保存成功后才开始防抖，且只针对生成了提醒的菜地
+        with _last_alert_lock:
+            for garden_id in {reminder.garden_id for reminder in reminders}:
+                _last_alert[garden_id] = now
+        logger.info(f"生成 {len(saved)} 条环境警告提醒（菜地 {sorted({r.garden_id for r in saved})}）")
+        return saved
+
+    @staticmethod
+    def _priority(sensor_type: str) -> int:
+        return 5 if sensor_type in URGENT_SENSOR_TYPES else 4
+
+    @staticmethod
+    def _build_reminder(record: PlantingRecord, crop: Crop, event: Dict, now: datetime) -> SmartReminder:
+        """根据异常事件构造环境警告提醒"""
+        return SmartReminder(
+            user_id=record.user_id,
+            garden_id=record.garden_id,
+            planting_record_id=record.id,
+            reminder_type="environment_alert",
+            title=f"{crop.name}环境异常警告",
+            description=event["abnormal_reason"],
+            remind_time=now,
+            priority=IoTAlertService._priority(event["sensor_type"]),
+            source="iot_triggered",
+            extra_data={
+                "crop_name": crop.name,
+                "sensor_type": event["sensor_type"],
+                "value": event["value"],
+                "unit": event["unit"],
+                "abnormal_reason": event["abnormal_reason"]
+            }
+        )
+
+    @staticmethod
+    def reset() -> None:
+        """清空队列和防抖记录"""
+        with _last_alert_lock:
+            _last_alert.clear()
+        while True:
+            try:
+                _queue.get_nowait()
+            except queue.Empty:
+                break
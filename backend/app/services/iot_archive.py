@@ -0,0 +1,258 @@
+"""
+物联网原始读数归档服务
+超过保留期的原始读数：导出压缩文件 -> 删除（MySQL 分区表直接删除分区）
+各粒度汇总在读数入库时已增量维护，归档只处理原始读数，不重算汇总
+"""
+import csv
+import gzip
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+from sqlalchemy import and_, func, text
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.crop import IoTReading, IoTReadingRollup
+from app.services.iot_rollup import bucket_start
+
+logger = logging.getLogger(__name__)
+
+# 导出文件的列
+ARCHIVE_COLUMNS = ["id", "sensor_id", "value", "unit", "is_abnormal", "abnormal_reason", "reading_time"]
+
+# 按天分区的分区名前缀，如 p20250101
+PARTITION_PREFIX = "p"
+
+DAY_SECONDS = 86400
+
+
+class IoTArchiveService:
+    """物联网原始读数归档服务"""
+
+    @staticmethod
+    def archive_expired(db: Session, now: Optional[datetime] = None) -> Dict:
+        """
+        归档并删除超过保留期的原始读数，清理过期的5分钟汇总，维护未来分区
+
+        按天处理，每天一个事务，中途失败时已处理的天数不受影响，下次从未处理的天继续
+
+        Args:
+            db: 数据库会话
+            now: 当前时间（默认 datetime.now()）
+
+        Returns:
+            归档统计
+        """
+        now = now or datetime.now()
+        cutoff = bucket_start(now - timedelta(days=settings.IOT_RAW_RETENTION_DAYS), DAY_SECONDS)
+
+        partitions = IoTArchiveService._get_partitions(db)
+        archived_days: List[Dict] = []
+
+        while True:
+            oldest = db.query(func.min(IoTReading.reading_time)).filter(
+                IoTReading.reading_time < cutoff
+            ).scalar()
+            if oldest is None:
+                break
+
+            day = bucket_start(oldest, DAY_SECONDS)
+            archived_days.append(IoTArchiveService._archive_day(db, day, partitions))
+
+        rollups_deleted = IoTArchiveService._purge_rollups(db, now)
+
+        created = []
+        if partitions:
+            created = IoTArchiveService._ensure_future_partitions(db, now, partitions)
+
+        return {
+            "cutoff": cutoff.isoformat(),
+            "days": archived_days,
+            "rollups_deleted": rollups_deleted,
+            "partitions_created": created
+        }
+
+    @staticmethod
+    def _archive_day(db: Session, day: datetime, partitions: Set[str]) -> Dict:
+        """归档一天的原始读数"""
+        next_day = day + timedelta(days=1)
+        day_filter = and_(
+            IoTReading.reading_time >= day,
+            IoTReading.reading_time < next_day
+        )
+
+        # 1. 导出压缩文件（记录导出的最大ID，只删除已导出的行）
+        path, exported, max_id = IoTArchiveService._export(db, day, day_filter)
+
+        # 2. 删除原始读数：分区内容与导出一致时直接删除分区，否则按ID删除已导出的行
+        partition = f"{PARTITION_PREFIX}{day:%Y%m%d}"
+        deleted = None
+        if partition in partitions:
+            deleted = IoTArchiveService._drop_partition_if_exported(db, partition, exported, max_id)
+            if deleted is not None:
+                partitions.discard(partition)
+        if deleted is None:
+            deleted = IoTArchiveService._delete_rows(db, day_filter, max_id)
+
+        logger.info(f"已归档 {day:%Y-%m-%d} 的 {exported} 条原始读数到 {path}，删除 {deleted} 条")
+        return {
+            "day": day.date().isoformat(),
+            "exported": exported,
+            "deleted": deleted,
+            "file": path
+        }
+
+    @staticmethod
+    def _export(db: Session, day: datetime, day_filter) -> tuple:
+        """
+        将一天的原始读数按ID分批导出为 gzip 压缩的 CSV
+
+        先写临时文件再重命名，避免留下不完整的归档文件
+
+        Returns:
+            (文件路径, 导出条数, 最大ID)
+        """
+        directory = os.path.join(settings.IOT_ARCHIVE_DIR, f"{day:%Y}", f"{day:%m}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"iot_readings_{day:%Y%m%d}.csv.gz")
+        tmp_path = f"{path}.tmp"
+
+        exported = 0
+        last_id = 0
+        with gzip.open(tmp_path, "wt", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(ARCHIVE_COLUMNS)
+            while True:
+                rows = db.query(
+                    *[getattr(IoTReading, column) for column in ARCHIVE_COLUMNS]
+                ).filter(
+                    and_(day_filter, IoTReading.id > last_id)
+                ).order_by(IoTReading.id).limit(settings.IOT_ARCHIVE_BATCH_SIZE).all()
+
+                if not rows:
+                    break
+
+                for row in rows:
+                    writer.writerow([
+                        value.isoformat() if isinstance(value, datetime) else value
+                        for value in row
+                    ])
+                exported += len(rows)
+                last_id = rows[-1].id
+
+        # 同一天再次归档（如迟到的数据）时追加为新文件，不覆盖已有归档
+        if os.path.exists(path):
+            path = os.path.join(directory, f"iot_readings_{day:%Y%m%d}_{datetime.now():%H%M%S}.csv.gz")
+        os.replace(tmp_path, path)
+
+        return path, exported, last_id
+
+    @staticmethod
+    def _drop_partition_if_exported(db: Session, partition: str, exported: int, max_id: int) -> Optional[int]:
+        """
+        分区的条数和最大ID与导出结果一致时删除分区
+
+        检查和删除在表写锁内完成，导出后才写入该分区的读数（如迟到的数据）不会未归档就被删除
+
+        Returns:
+            删除的条数；分区内有未导出的读数时返回 None（由调用方按ID删除）
+        """
+        db.commit()
+        db.execute(text("LOCK TABLES iot_readings WRITE"))
+        try:
+            count, top_id = db.execute(text(
+                f"SELECT COUNT(*), COALESCE(MAX(id), 0) FROM iot_readings PARTITION ({partition})"
+            )).one()
+            if count != exported or top_id != max_id:
+                logger.warning(
+                    f"分区 {partition} 在导出后有新读数（导出 {exported} 条，当前 {count} 条），改为按ID删除"
+                )
+                return None
+
+            db.execute(text(f"ALTER TABLE iot_readings DROP PARTITION {partition}"))
+            return exported
+        finally:
+            db.execute(text("UNLOCK TABLES"))
+            db.commit()
+
+    @staticmethod
+    def _delete_rows(db: Session, day_filter, max_id: int) -> int:
+        """按ID分批删除已导出的原始读数（每批一个事务，避免长时间锁表）"""
+        deleted = 0
+        while True:
+            ids = [
+                row_id for (row_id,) in db.query(IoTReading.id).filter(
+                    and_(day_filter, IoTReading.id <= max_id)
+                ).limit(settings.IOT_ARCHIVE_BATCH_SIZE).all()
+            ]
+            if not ids:
+                break
+
+            db.query(IoTReading).filter(IoTReading.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+            deleted += len(ids)
+
+        return deleted
+
+    @staticmethod
+    def _purge_rollups(db: Session, now: datetime) -> int:
+        """删除超过保留期的5分钟汇总（1小时、1天汇总长期保留）"""
+        cutoff = now - timedelta(days=settings.IOT_ROLLUP_5M_RETENTION_DAYS)
+        deleted = db.query(IoTReadingRollup).filter(
+            and_(
+                IoTReadingRollup.resolution == "5m",
+                IoTReadingRollup.bucket_start < cutoff
+            )
+        ).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+
+    @staticmethod
+    def _get_partitions(db: Session) -> Set[str]:
+        """获取 iot_readings 的分区名（非 MySQL 或未分区时为空）"""
+        if db.get_bind().dialect.name != "mysql":
+            return set()
+
+        rows = db.execute(text(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'iot_readings' "
+            "AND PARTITION_NAME IS NOT NULL"
+        )).all()
+        return {name for (name,) in rows}
+
+    @staticmethod
+    def _ensure_future_partitions(db: Session, now: datetime, partitions: Set[str]) -> List[str]:
+        """从 pmax 中拆出未来几天的按天分区"""
+        if "pmax" not in partitions:
+            return []
+
+        today = bucket_start(now, DAY_SECONDS)
+        missing = []
+        for offset in range(settings.IOT_PARTITION_PRECREATE_DAYS + 1):
+            day = today + timedelta(days=offset)
+            name = f"{PARTITION_PREFIX}{day:%Y%m%d}"
+            if name not in partitions:
+                missing.append((name, day + timedelta(days=1)))
+
+        if not missing:
+            return []
+
+        # 分区只能按顺序追加在已有分区之后，跳过早于现有最新分区的日期
+        existing_days = sorted(
+            p for p in partitions if p.startswith(PARTITION_PREFIX) and p[1:].isdigit()
+        )
+        if existing_days:
+            missing = [(name, bound) for name, bound in missing if name > existing_days[-1]]
+        if not missing:
+            return []
+
+        definitions = ", ".join(
+            f"PARTITION {name} VALUES LESS THAN (UNIX_TIMESTAMP('{bound:%Y-%m-%d %H:%M:%S}'))"
+            for name, bound in missing
+        )
+        db.execute(text(
+            f"ALTER TABLE iot_readings REORGANIZE PARTITION pmax INTO "
+            f"({definitions}, PARTITION pmax VALUES LESS THAN MAXVALUE)"
+        ))
+        partitions.update(name for name, _ in missing)
+        return [name for name, _ in missing]
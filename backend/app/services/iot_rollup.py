@@ -0,0 +1,196 @@
+"""
+物联网读数汇总（rollup）服务
+按 5分钟/1小时/1天 为粒度，增量维护每个传感器的 最小/最大/平均值、条数和异常条数
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import and_, case
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.upsert import upsert
+from app.models.crop import IoTReading, IoTReadingRollup
+
+# 汇总粒度（秒），按从细到粗排列
+RESOLUTIONS = {
+    "5m": 300,
+    "1h": 3600,
+    "1d": 86400,
+}
+
+# 原始数据粒度名称
+RAW = "raw"
+
+# 分桶对齐的起点
+_EPOCH = datetime(2000, 1, 1)
+
+
+def bucket_start(reading_time: datetime, seconds: int) -> datetime:
+    """计算读数所在时间桶的起始时间"""
+    epoch = _EPOCH.replace(tzinfo=reading_time.tzinfo)
+    delta = reading_time - epoch
+    total = delta.days * 86400 + delta.seconds
+    return epoch + timedelta(seconds=total - total % seconds)
+
+
+class IoTRollupService:
+    """物联网读数汇总服务"""
+
+    @staticmethod
+    def apply(db: Session, readings: Iterable[Dict]) -> None:
+        """
+        将一批读数累加到各粒度的汇总表（不提交，随调用方事务一起提交）
+
+        Args:
+            db: 数据库会话
+            readings: 读数列表，每项包含 sensor_id、value、is_abnormal、reading_time
+        """
+        buckets: Dict[Tuple[int, str, datetime], Dict] = {}
+        for reading in readings:
+            value = reading["value"]
+            abnormal = 1 if reading["is_abnormal"] else 0
+            for resolution, seconds in RESOLUTIONS.items():
+                key = (reading["sensor_id"], resolution, bucket_start(reading["reading_time"], seconds))
+                row = buckets.get(key)
+                if row is None:
+                    buckets[key] = {
+                        "sensor_id": key[0],
+                        "resolution": resolution,
+                        "bucket_start": key[2],
+                        "reading_count": 1,
+                        "sum_value": value,
+                        "min_value": value,
+                        "max_value": value,
+                        "abnormal_count": abnormal
+                    }
+                else:
+                    row["reading_count"] += 1
+                    row["sum_value"] += value
+                    row["min_value"] = min(row["min_value"], value)
+                    row["max_value"] = max(row["max_value"], value)
+                    row["abnormal_count"] += abnormal
+
+        IoTRollupService.merge(db, list(buckets.values()))
+
+    @staticmethod
+    def merge(db: Session, rows: List[Dict]) -> None:
+        """
+        将已按桶汇总好的行合并到汇总表（不提交）
+
+        Args:
+            db: 数据库会话
+            rows: 每项包含 sensor_id、resolution、bucket_start、reading_count、
+                  sum_value、min_value、max_value、abnormal_count
+        """
+        rollup = IoTReadingRollup
+        upsert(
+            db,
+            rollup,
+            rows,
+            index_elements=["sensor_id", "resolution", "bucket_start"],
+            update=lambda new: [
+                ("reading_count", rollup.reading_count + new.reading_count),
+                ("sum_value", rollup.sum_value + new.sum_value),
+                ("min_value", case((new.min_value < rollup.min_value, new.min_value), else_=rollup.min_value)),
+                ("max_value", case((new.max_value > rollup.max_value, new.max_value), else_=rollup.max_value)),
+                ("abnormal_count", rollup.abnormal_count + new.abnormal_count),
+            ]
+        )
+
+    @staticmethod
+    def rebuild(db: Session, start: datetime, end: datetime, batch_size: int = 5000) -> int:
+        """
+        根据原始读数重建时间范围内的汇总（按天对齐，提交事务）
+
+        用于汇总表上线前的历史数据回填或修复
+
+        Returns:
+            参与汇总的原始读数条数
+        """
+        day = RESOLUTIONS["1d"]
+        start = bucket_start(start, day)
+        end = bucket_start(end, day) + timedelta(seconds=day)
+
+        db.query(IoTReadingRollup).filter(
+            and_(
+                IoTReadingRollup.bucket_start >= start,
+                IoTReadingRollup.bucket_start < end
+            )
+        ).delete(synchronize_session=False)
+
+        total = 0
+        last_id = 0
+        while True:
+            # 按主键分批读取，避免一次加载整个时间范围
+            rows = db.query(
+                IoTReading.id,
+                IoTReading.sensor_id,
+                IoTReading.value,
+                IoTReading.is_abnormal,
+                IoTReading.reading_time
+            ).filter(
+                and_(
+                    IoTReading.id > last_id,
+                    IoTReading.reading_time >= start,
+                    IoTReading.reading_time < end
+                )
+            ).order_by(IoTReading.id).limit(batch_size).all()
+
+            if not rows:
+                break
+
+            IoTRollupService.apply(db, [row._asdict() for row in rows])
+            total += len(rows)
+            last_id = rows[-1].id
+
+        db.commit()
+        return total
+
+    @staticmethod
+    def choose_resolution(hours: int, min_points: Optional[int] = None) -> str:
+        """
+        选择满足图表点数的最粗粒度
+
+        Args:
+            hours: 查询的时间跨度（小时）
+            min_points: 图表至少需要的点数，默认取配置 IOT_HISTORY_MIN_POINTS
+
+        Returns:
+            粒度名称（5m/1h/1d），跨度太短时返回 raw
+        """
+        if min_points is None:
+            min_points = settings.IOT_HISTORY_MIN_POINTS
+
+        span_seconds = hours * 3600
+        for resolution, seconds in reversed(list(RESOLUTIONS.items())):
+            if span_seconds // seconds >= min_points:
+                return resolution
+        return RAW
+
+    @staticmethod
+    def get_series(
+        db: Session,
+        sensor_ids: Sequence[int],
+        resolution: str,
+        start_time: datetime
+    ) -> Dict[int, List[IoTReadingRollup]]:
+        """
+        查询多个传感器的汇总序列（一次查询，按时间升序）
+
+        Returns:
+            {sensor_id: [汇总行, ...]}
+        """
+        if not sensor_ids:
+            return {}
+
+        rows = db.query(IoTReadingRollup).filter(
+            and_(
+                IoTReadingRollup.sensor_id.in_(sensor_ids),
+                IoTReadingRollup.resolution == resolution,
+                IoTReadingRollup.bucket_start >= bucket_start(start_time, RESOLUTIONS[resolution])
+            )
+        ).order_by(IoTReadingRollup.sensor_id, IoTReadingRollup.bucket_start).all()
+
+        result: Dict[int, List[IoTReadingRollup]] = {}
+        for row in rows:
+            result.setdefault(row.sensor_id, []).append(row)
+        return result
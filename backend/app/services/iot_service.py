@@ -4,8 +4,20 @@
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, desc
-from app.models.crop import IoTSensor, IoTReading, PlantingRecord, Crop, CropGrowthStage
+from sqlalchemy import and_, case, desc, func, insert, or_, update
+from app.core.upsert import upsert
+from app.services.iot_rollup import IoTRollupService, RAW
+from app.models.crop import IoTSensor, IoTReading, SensorLatest
+from app.services.iot_alerts import IoTAlertService
+from app.services.crop_threshold_index import CropThresholdIndex, Thresholds
+
+# 异常原因模板：(低于下限, 高于上限)
+ABNORMAL_MESSAGES = {
+    "temperature": ("温度过低，低于{}°C", "温度过高，高于{}°C"),
+    "humidity": ("湿度过低，低于{}%", "湿度过高，高于{}%"),
+    "soil_moisture": ("土壤过于干燥，需要浇水", "土壤过于湿润，注意排水"),
+    "soil_ph": ("土壤pH过低，低于{}", "土壤pH过高，高于{}"),
+}
 
 
 class IoTService:
@@ -50,22 +62,218 @@ class IoTService:
         )
 
         # 创建读数记录
+        now = datetime.now()
         reading = IoTReading(
             sensor_id=sensor_id,
             value=value,
             unit=unit,
             is_abnormal=1 if is_abnormal else 0,
-            abnormal_reason=abnormal_reason
+            abnormal_reason=abnormal_reason,
+            reading_time=now
         )
         db.add(reading)
 
-        # 更新传感器最后读数时间
-        sensor.last_reading_time = datetime.now()
+        # 更新传感器最后读数时间、汇总表和最新读数表
+        sensor.last_reading_time = now
+        IoTRollupService.apply(db, [{
+            "sensor_id": sensor_id,
+            "value": value,
+            "is_abnormal": reading.is_abnormal,
+            "reading_time": now
+        }])
+        latest_row = IoTService._latest_row(sensor, {
+            "value": value,
+            "unit": unit,
+            "is_abnormal": reading.is_abnormal,
+            "abnormal_reason": abnormal_reason,
+            "reading_time": now
+        })
+        IoTService.upsert_latest(db, [latest_row])
 
         db.commit()
+
+        # 提交后发布异常事件，由后台线程生成环境警告
+        if is_abnormal:
+            IoTAlertService.publish([latest_row])
+
         db.refresh(reading)
         return reading
 
+    @staticmethod
+    def record_readings_batch(db: Session, readings: List[Dict]) -> Dict:
+        """
+        批量记录传感器读数
+
+        整批只查询一次传感器和环境阈值，多行插入读数，
+        一条语句更新所有传感器的最后读数时间，在同一个事务中提交，
+        提交后发布异常事件
+
+        Args:
+            db: 数据库会话
+            readings: 读数列表，每项包含 sensor_id 或 device_id、value，
+                      可选 unit、reading_time
+
+        Returns:
+            {"accepted": 入库条数, "abnormal": 异常条数,
+             "rejected": [{"index": 位置, "reason": 原因}]}
+        """
+        # 一次解析所有传感器（按ID和设备ID）
+        sensor_ids = {r["sensor_id"] for r in readings if r.get("sensor_id") is not None}
+        device_ids = {r["device_id"] for r in readings if r.get("sensor_id") is None and r.get("device_id")}
+
+        sensors_by_id = {}
+        if sensor_ids:
+            for sensor in db.query(IoTSensor).filter(IoTSensor.id.in_(sensor_ids)).all():
+                sensors_by_id[sensor.id] = sensor
+        sensors_by_device = {}
+        if device_ids:
+            for sensor in db.query(IoTSensor).filter(IoTSensor.device_id.in_(device_ids)).all():
+                sensors_by_device[sensor.device_id] = sensor
+
+        # 一次获取涉及菜地的环境阈值
+        garden_ids = {s.garden_id for s in sensors_by_id.values()} | \
+            {s.garden_id for s in sensors_by_device.values()}
+        thresholds = CropThresholdIndex.get_many(db, garden_ids)
+
+        now = datetime.now()
+        rows = []
+        rejected = []
+        last_times: Dict[int, datetime] = {}
+        latest_rows: Dict[int, Dict] = {}
+        abnormal_events: List[Dict] = []
+        abnormal_count = 0
+
+        for index, item in enumerate(readings):
+            if item.get("sensor_id") is not None:
+                sensor = sensors_by_id.get(item["sensor_id"])
+            else:
+                sensor = sensors_by_device.get(item.get("device_id"))
+
+            if not sensor:
+                rejected.append({"index": index, "reason": "传感器不存在"})
+                continue
+            if not sensor.is_active:
+                rejected.append({"index": index, "reason": "传感器未激活"})
+                continue
+
+            value = item["value"]
+            is_abnormal, abnormal_reason = IoTService._evaluate_abnormal(
+                thresholds.get(sensor.garden_id, {}), sensor.sensor_type, value
+            )
+            if is_abnormal:
+                abnormal_count += 1
+
+            reading_time = item.get("reading_time") or now
+            rows.append({
+                "sensor_id": sensor.id,
+                "value": value,
+                "unit": item.get("unit") or IoTService._get_sensor_unit(sensor.sensor_type),
+                "is_abnormal": 1 if is_abnormal else 0,
+                "abnormal_reason": abnormal_reason,
+                "reading_time": reading_time
+            })
+
+            if is_abnormal:
+                abnormal_events.append(IoTService._latest_row(sensor, rows[-1]))
+
+            if sensor.id not in last_times or reading_time > last_times[sensor.id]:
+                last_times[sensor.id] = reading_time
+                latest_rows[sensor.id] = IoTService._latest_row(sensor, rows[-1])
+
+        if rows:
+            # 多行插入
+            db.execute(insert(IoTReading), rows)
+
+            # 一条语句更新所有传感器的最后读数时间（只向后推进，补传的历史读数不会回退）
+            batch_time = case(last_times, value=IoTSensor.id)
+            db.execute(
+                update(IoTSensor)
+                .where(IoTSensor.id.in_(last_times.keys()))
+                .values(last_reading_time=case(
+                    (or_(IoTSensor.last_reading_time.is_(None),
+                         IoTSensor.last_reading_time < batch_time), batch_time),
+                    else_=IoTSensor.last_reading_time
+                ))
+                .execution_options(synchronize_session=False)
+            )
+
+            # 累加到各粒度汇总
+            IoTRollupService.apply(db, rows)
+
+            # 每个传感器只 upsert 本批最新的一条
+            IoTService.upsert_latest(db, list(latest_rows.values()))
+
+        db.commit()
+
+        # 提交后发布异常事件，由后台线程生成环境警告
+        if abnormal_events:
+            IoTAlertService.publish(abnormal_events)
+
+        return {
+            "accepted": len(rows),
+            "abnormal": abnormal_count,
+            "rejected": rejected
+        }
+
+    @staticmethod
+    def _latest_row(sensor: IoTSensor, reading: Dict) -> Dict:
+        """构造最新读数表的一行"""
+        return {
+            "sensor_id": sensor.id,
+            "garden_id": sensor.garden_id,
+            "sensor_type": sensor.sensor_type,
+            "value": reading["value"],
+            "unit": reading["unit"],
+            "is_abnormal": reading["is_abnormal"],
+            "abnormal_reason": reading["abnormal_reason"],
+            "reading_time": reading["reading_time"]
+        }
+
+    @staticmethod
+    def upsert_latest(db: Session, rows: List[Dict]) -> None:
+        """
+        更新传感器最新读数（不提交）
+
+        只有读数时间不早于已有记录时才覆盖，补传的历史读数不会冲掉最新值
+        """
+        upsert(
+            db,
+            SensorLatest,
+            rows,
+            index_elements=["sensor_id"],
+            update=lambda new: [
+                ("garden_id", new.garden_id),
+                ("sensor_type", new.sensor_type),
+                ("value", new.value),
+                ("unit", new.unit),
+                ("is_abnormal", new.is_abnormal),
+                ("abnormal_reason", new.abnormal_reason),
+                ("updated_at", func.now()),
+                # 条件中引用了 reading_time，必须最后更新
+                ("reading_time", new.reading_time),
+            ],
+            where=lambda new: new.reading_time >= SensorLatest.reading_time
+        )
+
+    @staticmethod
+    def _backfill_latest(db: Session, sensor: IoTSensor) -> Optional[IoTReading]:
+        """最新读数表中没有该传感器时（如该表上线前的历史数据），从原始读数回填"""
+        latest = db.query(IoTReading).filter(
+            IoTReading.sensor_id == sensor.id
+        ).order_by(desc(IoTReading.reading_time)).first()
+
+        if latest:
+            IoTService.upsert_latest(db, [IoTService._latest_row(sensor, {
+                "value": latest.value,
+                "unit": latest.unit,
+                "is_abnormal": latest.is_abnormal,
+                "abnormal_reason": latest.abnormal_reason,
+                "reading_time": latest.reading_time
+            })])
+            db.commit()
+
+        return latest
+
     @staticmethod
     def _check_abnormal(
         db: Session,
@@ -73,57 +281,27 @@ class IoTService:
         sensor_type: str,
         value: float
     ) -> tuple:
-        """检查读数是否异常"""
-        # 获取该菜地的种植记录
-        planting_records = db.query(PlantingRecord).filter(
-            and_(
-                PlantingRecord.garden_id == garden_id,
-                PlantingRecord.status == "growing"
-            )
-        ).all()
+        """检查读数是否异常（查菜地阈值索引，命中时不访问数据库）"""
+        return IoTService._evaluate_abnormal(
+            CropThresholdIndex.get(db, garden_id), sensor_type, value
+        )
 
-        if not planting_records:
+    @staticmethod
+    def _evaluate_abnormal(
+        thresholds: Thresholds,
+        sensor_type: str,
+        value: float
+    ) -> tuple:
+        """根据菜地阈值索引判断读数是否异常"""
+        low, high = thresholds.get(sensor_type, (None, None))
+        messages = ABNORMAL_MESSAGES.get(sensor_type)
+        if not messages:
             return False, None
 
-        # 获取作物的环境需求
-        for record in planting_records:
-            crop = db.query(Crop).filter(Crop.id == record.crop_id).first()
-            if not crop or not crop.environment_requirements:
-                continue
-
-            requirements = crop.environment_requirements
-
-            # 根据传感器类型检查
-            if sensor_type == "temperature":
-                if "temperature" in requirements:
-                    temp_req = requirements["temperature"]
-                    if value < temp_req.get("min", -100):
-                        return True, f"温度过低，低于{temp_req['min']}°C"
-                    if value > temp_req.get("max", 100):
-                        return True, f"温度过高，高于{temp_req['max']}°C"
-
-            elif sensor_type == "humidity":
-                if "humidity" in requirements:
-                    hum_req = requirements["humidity"]
-                    if value < hum_req.get("min", 0):
-                        return True, f"湿度过低，低于{hum_req['min']}%"
-                    if value > hum_req.get("max", 100):
-                        return True, f"湿度过高，高于{hum_req['max']}%"
-
-            elif sensor_type == "soil_moisture":
-                # 土壤湿度阈值一般在20-80%
-                if value < 20:
-                    return True, "土壤过于干燥，需要浇水"
-                if value > 80:
-                    return True, "土壤过于湿润，注意排水"
-
-            elif sensor_type == "soil_ph":
-                if "soil_ph" in requirements:
-                    ph_req = requirements["soil_ph"]
-                    if value < ph_req.get("min", 0):
-                        return True, f"土壤pH过低，低于{ph_req['min']}"
-                    if value > ph_req.get("max", 14):
-                        return True, f"土壤pH过高，高于{ph_req['max']}"
+        if low is not None and value < low:
+            return True, messages[0].format(low)
+        if high is not None and value > high:
+            return True, messages[1].format(high)
 
         return False, None
 
@@ -131,9 +309,10 @@ class IoTService:
     def get_latest_readings(
         db: Session,
         garden_id: int,
-        hours: int = 24
+        hours: int = 24,
+        resolution: str = RAW
     ) -> Dict[str, List[Dict]]:
-        """获取最近的传感器读数"""
+        """获取最近的传感器读数（按时间倒序，默认原始读数，可指定粒度，规则同 get_history）"""
         # 获取该菜地的所有传感器
         sensors = db.query(IoTSensor).filter(
             and_(
@@ -142,29 +321,78 @@ class IoTService:
             )
         ).all()
 
-        result = {}
         cutoff_time = datetime.now() - timedelta(hours=hours)
+        _, series = IoTService.get_history(db, sensors, cutoff_time, hours, resolution)
 
-        for sensor in sensors:
+        return {
+            sensor.sensor_type: list(reversed(series.get(sensor.id, [])))
+            for sensor in sensors
+        }
+
+    @staticmethod
+    def get_history(
+        db: Session,
+        sensors: List[IoTSensor],
+        start_time: datetime,
+        hours: int,
+        resolution: str = "auto"
+    ) -> tuple:
+        """
+        查询传感器历史曲线（所有传感器一次查询，按时间升序）
+
+        Args:
+            db: 数据库会话
+            sensors: 传感器列表
+            start_time: 起始时间
+            hours: 时间跨度（小时），auto 时据此选择粒度
+            resolution: auto/raw/5m/1h/1d，auto 选择满足图表点数的最粗汇总粒度
+
+        Returns:
+            (实际粒度, {sensor_id: [数据点, ...]})
+        """
+        if resolution == "auto":
+            resolution = IoTRollupService.choose_resolution(hours)
+
+        sensor_ids = [sensor.id for sensor in sensors]
+        series: Dict[int, List[Dict]] = {}
+        if not sensor_ids:
+            return resolution, series
+
+        if resolution == RAW:
             readings = db.query(IoTReading).filter(
                 and_(
-                    IoTReading.sensor_id == sensor.id,
-                    IoTReading.reading_time >= cutoff_time
+                    IoTReading.sensor_id.in_(sensor_ids),
+                    IoTReading.reading_time >= start_time
                 )
-            ).order_by(desc(IoTReading.reading_time)).all()
+            ).order_by(IoTReading.sensor_id, IoTReading.reading_time).all()
 
-            result[sensor.sensor_type] = [
-                {
-                    "value": r.value,
-                    "unit": r.unit,
+            for r in readings:
+                series.setdefault(r.sensor_id, []).append({
                     "time": r.reading_time.isoformat(),
+                    "value": float(r.value),
+                    "unit": r.unit,
                     "is_abnormal": bool(r.is_abnormal),
                     "abnormal_reason": r.abnormal_reason
+                })
+            return resolution, series
+
+        units = {sensor.id: IoTService._get_sensor_unit(sensor.sensor_type) for sensor in sensors}
+        rollups = IoTRollupService.get_series(db, sensor_ids, resolution, start_time)
+        for sensor_id, rows in rollups.items():
+            series[sensor_id] = [
+                {
+                    "time": row.bucket_start.isoformat(),
+                    "value": round(row.avg_value, 2),
+                    "min": row.min_value,
+                    "max": row.max_value,
+                    "count": row.reading_count,
+                    "unit": units[sensor_id],
+                    "is_abnormal": row.abnormal_count > 0,
+                    "abnormal_count": row.abnormal_count
                 }
-                for r in readings
+                for row in rows
             ]
-
-        return result
+        return resolution, series
 
     @staticmethod
     def get_current_status(db: Session, garden_id: int, auto_simulate: bool = True) -> Dict:
@@ -192,31 +420,28 @@ class IoTService:
                 'last_update': '2025-12-09T10:30:00'
             }
         """
-        sensors = db.query(IoTSensor).filter(
+        # 传感器及其最新读数一次查询
+        query = db.query(IoTSensor, SensorLatest).outerjoin(
+            SensorLatest, SensorLatest.sensor_id == IoTSensor.id
+        ).filter(
             and_(
                 IoTSensor.garden_id == garden_id,
                 IoTSensor.is_active == 1
             )
-        ).all()
+        )
+        rows = query.all()
 
         # 如果没有传感器且允许自动模拟，先生成模拟数据
-        if not sensors and auto_simulate:
+        if not rows and auto_simulate:
             IoTService.simulate_readings(db, garden_id, realistic=True)
-            sensors = db.query(IoTSensor).filter(
-                and_(
-                    IoTSensor.garden_id == garden_id,
-                    IoTSensor.is_active == 1
-                )
-            ).all()
+            rows = query.all()
 
         sensor_list = []
         latest_time = None
 
-        for sensor in sensors:
-            # 获取最新读数
-            latest = db.query(IoTReading).filter(
-                IoTReading.sensor_id == sensor.id
-            ).order_by(desc(IoTReading.reading_time)).first()
+        for sensor, latest in rows:
+            if not latest:
+                latest = IoTService._backfill_latest(db, sensor)
 
             # 如果传感器没有读数且允许自动模拟，生成一条
             if not latest and auto_simulate:
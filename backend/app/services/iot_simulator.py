@@ -2,15 +2,25 @@
 物联网数据仿真器
 持续生成真实场景的传感器数据
 """
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import List, Dict
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.services.iot_service import IoTService
+from app.services.iot_rollup import IoTRollupService
 from app.models.garden import Garden
 import logging
 
 logger = logging.getLogger(__name__)
 
+SENSOR_TYPES = ["temperature", "humidity", "soil_moisture", "light", "soil_ph"]
+
+# 历史数据多行插入每条语句的行数
+HISTORY_INSERT_BATCH_SIZE = 2000
+
 
 class IoTSimulator:
     """物联网数据仿真器"""
@@ -34,76 +44,109 @@ class IoTSimulator:
         Returns:
             生成的数据统计
         """
-        from app.models.crop import IoTSensor, IoTReading
+        result = IoTSimulator.generate_historical_data_bulk(
+            db, [garden_id], days=days, interval_minutes=interval_minutes
+        )
+        return {
+            "garden_id": garden_id,
+            "total_readings": result["total_readings"],
+            "sensors": result["sensors"],
+            "time_range": result["time_range"]
+        }
 
-        logger.info(f"开始为菜地 {garden_id} 生成 {days} 天的历史数据")
+    @staticmethod
+    def generate_historical_data_bulk(
+        db: Session,
+        garden_ids: List[int],
+        days: int = 7,
+        interval_minutes: int = 30,
+        seed: int = None
+    ) -> Dict:
+        """
+        批量为多个菜地生成历史数据（向量化）
 
-        # 确保传感器存在
-        sensor_types = ["temperature", "humidity", "soil_moisture", "light", "soil_ph"]
-        sensors = []
+        每个传感器的整条时间轴用 NumPy 一次计算，阈值检查为数组掩码，
+        读数用多行 insert 写入，汇总按桶聚合后写入，每个菜地提交一次
 
-        for sensor_type in sensor_types:
-            sensor = db.query(IoTSensor).filter(
-                IoTSensor.garden_id == garden_id,
-                IoTSensor.sensor_type == sensor_type
-            ).first()
+        Args:
+            db: 数据库会话
+            garden_ids: 菜地ID列表
+            days: 生成多少天的历史数据
+            interval_minutes: 数据采集间隔（分钟）
+            seed: 随机种子（用于生成可复现的数据）
 
-            if not sensor:
-                sensor = IoTService.create_sensor(
-                    db,
-                    garden_id=garden_id,
-                    sensor_type=sensor_type,
-                    device_id=f"{sensor_type}_{garden_id}"
-                )
+        Returns:
+            生成的数据统计
+        """
+        import numpy as np
+        from app.models.crop import IoTReading
+        from app.services.crop_threshold_index import CropThresholdIndex
+
+        logger.info(f"开始为 {len(garden_ids)} 个菜地生成 {days} 天的历史数据")
 
-            sensors.append(sensor)
+        sensors_by_garden = IoTSimulator._ensure_sensors(db, garden_ids)
+        thresholds = CropThresholdIndex.get_many(db, garden_ids)
+        rng = np.random.default_rng(seed)
 
-        # 生成历史数据点
-        start_time = datetime.now() - timedelta(days=days)
-        current_time = start_time
+        # 时间轴（所有传感器共用）
         end_time = datetime.now()
+        start_time = end_time - timedelta(days=days)
+        step = np.timedelta64(interval_minutes * 60, "s")
+        count = int((end_time - start_time) // timedelta(minutes=interval_minutes)) + 1
+        times = np.datetime64(start_time, "s") + np.arange(count) * step
+        time_list = times.astype("datetime64[us]").tolist()
 
         generated_count = 0
+        sensor_count = 0
+        for garden_id in garden_ids:
+            sensors = sensors_by_garden.get(garden_id, [])
+            latest_rows = []
+            rollup_rows = []
 
-        while current_time <= end_time:
             for sensor in sensors:
-                # 根据时间生成真实数据
-                value = IoTSimulator._generate_value_for_time(
-                    sensor.sensor_type,
-                    garden_id,
-                    current_time
+                values = np.round(
+                    IoTSimulator._generate_series(sensor.sensor_type, garden_id, times, rng), 2
                 )
-
-                unit = IoTService._get_sensor_unit(sensor.sensor_type)
-
-                # 检查异常
-                is_abnormal, abnormal_reason = IoTService._check_abnormal(
-                    db, garden_id, sensor.sensor_type, value
+                abnormal, reasons = IoTSimulator._evaluate_series(
+                    thresholds.get(garden_id, {}), sensor.sensor_type, values
                 )
+                unit = IoTService._get_sensor_unit(sensor.sensor_type)
 
-                # 创建读数记录
-                reading = IoTReading(
-                    sensor_id=sensor.id,
-                    value=round(value, 2),
-                    unit=unit,
-                    is_abnormal=is_abnormal,
-                    abnormal_reason=abnormal_reason,
-                    reading_time=current_time
-                )
-
-                db.add(reading)
-                generated_count += 1
-
-            current_time += timedelta(minutes=interval_minutes)
-
-        db.commit()
+                value_list = values.tolist()
+                abnormal_list = abnormal.astype(int).tolist()
+                reason_list = reasons.tolist()
+                rows = [
+                    {
+                        "sensor_id": sensor.id,
+                        "value": value,
+                        "unit": unit,
+                        "is_abnormal": is_abnormal,
+                        "abnormal_reason": reason,
+                        "reading_time": reading_time
+                    }
+                    for value, is_abnormal, reason, reading_time
+                    in zip(value_list, abnormal_list, reason_list, time_list)
+                ]
+
+                # 多行插入（分批，控制单条语句大小）
+                for i in range(0, len(rows), HISTORY_INSERT_BATCH_SIZE):
+                    db.execute(insert(IoTReading), rows[i:i + HISTORY_INSERT_BATCH_SIZE])
+
+                rollup_rows.extend(IoTSimulator._rollup_series(sensor.id, times, values, abnormal))
+                latest_rows.append(IoTService._latest_row(sensor, rows[-1]))
+                generated_count += len(rows)
+                sensor_count += 1
+
+            IoTRollupService.merge(db, rollup_rows)
+            IoTService.upsert_latest(db, latest_rows)
+            db.commit()
 
         logger.info(f"成功生成 {generated_count} 条历史数据")
 
         return {
-            "garden_id": garden_id,
+            "gardens": len(garden_ids),
             "total_readings": generated_count,
-            "sensors": len(sensors),
+            "sensors": sensor_count,
             "time_range": {
                 "start": start_time.isoformat(),
                 "end": end_time.isoformat()
@@ -111,142 +154,307 @@ class IoTSimulator:
         }
 
     @staticmethod
-    def _generate_value_for_time(
-        sensor_type: str,
-        garden_id: int,
-        target_time: datetime
-    ) -> float:
+    def _ensure_sensors(db: Session, garden_ids: List[int], commit: bool = True) -> Dict[int, list]:
+        """确保每个菜地都有全部类型的传感器（缺失的一次批量创建，commit=False 时随调用方事务提交）"""
+        from app.models.crop import IoTSensor
+
+        def load():
+            # 每个菜地每种类型取第一个传感器
+            first: Dict[tuple, IoTSensor] = {}
+            for sensor in db.query(IoTSensor).filter(
+                IoTSensor.garden_id.in_(garden_ids),
+                IoTSensor.sensor_type.in_(SENSOR_TYPES)
+            ).order_by(IoTSensor.id).all():
+                first.setdefault((sensor.garden_id, sensor.sensor_type), sensor)
+
+            result: Dict[int, list] = {}
+            for (garden_id, _), sensor in first.items():
+                result.setdefault(garden_id, []).append(sensor)
+            return result
+
+        sensors_by_garden = load()
+
+        missing = []
+        for garden_id in garden_ids:
+            existing_types = {s.sensor_type for s in sensors_by_garden.get(garden_id, [])}
+            for sensor_type in SENSOR_TYPES:
+                if sensor_type not in existing_types:
+                    missing.append({
+                        "garden_id": garden_id,
+                        "sensor_type": sensor_type,
+                        "device_id": f"{sensor_type}_{garden_id}",
+                        "is_active": 1,
+                        "reading_interval": 300
+                    })
+
+        if not missing:
+            return sensors_by_garden
+
+        db.execute(insert(IoTSensor), missing)
+        if commit:
+            db.commit()
+        return load()
+
+    @staticmethod
+    def _generate_series(sensor_type: str, garden_id: int, times, rng):
         """
-        为特定时间点生成传感器数值
+        为整条时间轴生成传感器数值（向量化）
 
         Args:
             sensor_type: 传感器类型
             garden_id: 菜地ID
-            target_time: 目标时间
+            times: numpy datetime64 时间数组
+            rng: numpy 随机数生成器
 
         Returns:
-            传感器数值
+            numpy 数值数组
         """
-        import random
-        import math
+        import numpy as np
 
-        hour = target_time.hour
-        month = target_time.month
-        day_of_year = target_time.timetuple().tm_yday
+        size = len(times)
+        days = times.astype("datetime64[D]")
+        hour = (times - days).astype("timedelta64[h]").astype(int)
+        month = times.astype("datetime64[M]").astype(int) % 12 + 1
+        day_of_year = (days - times.astype("datetime64[Y]")).astype(int) + 1
 
         if sensor_type == "temperature":
             # 温度：季节 + 昼夜周期
             # 年度季节变化 (正弦波)
-            season_temp = 20 + 10 * math.sin((day_of_year - 80) * 2 * math.pi / 365)
+            season_temp = 20 + 10 * np.sin((day_of_year - 80) * 2 * np.pi / 365)
 
             # 昼夜变化 (正弦波)
-            daily_temp = 5 * math.sin((hour - 6) * math.pi / 12)
+            daily_temp = 5 * np.sin((hour - 6) * np.pi / 12)
 
             # 随机噪声
-            noise = random.uniform(-1.5, 1.5)
+            noise = rng.uniform(-1.5, 1.5, size)
 
-            value = season_temp + daily_temp + noise
-            return max(5, min(40, value))
+            return np.clip(season_temp + daily_temp + noise, 5, 40)
 
         elif sensor_type == "humidity":
             # 湿度：与温度反相关
             # 早晚湿度高，中午低
-            base_humidity = 65
-            daily_variation = -20 * math.sin((hour - 6) * math.pi / 12)
-            noise = random.uniform(-5, 5)
+            daily_variation = -20 * np.sin((hour - 6) * np.pi / 12)
+            noise = rng.uniform(-5, 5, size)
 
-            value = base_humidity + daily_variation + noise
-            return max(30, min(95, value))
+            return np.clip(65 + daily_variation + noise, 30, 95)
 
         elif sensor_type == "soil_moisture":
             # 土壤湿度：模拟浇水和蒸发
-            # 假设每天早上8点浇水
+            # 假设每天早上8点浇水，浇水后的湿度曲线 (指数衰减)
             hours_since_watering = (hour - 8) % 24
+            moisture_loss = 25 * (1 - np.exp(-hours_since_watering / 12))
+            noise = rng.uniform(-3, 3, size)
 
-            # 浇水后的湿度曲线 (指数衰减)
-            if hours_since_watering >= 0:
-                moisture_loss = 25 * (1 - math.exp(-hours_since_watering / 12))
-            else:
-                moisture_loss = 25 * (1 - math.exp((24 + hours_since_watering) / 12))
-
-            base_moisture = 70 - moisture_loss
-            noise = random.uniform(-3, 3)
-
-            value = base_moisture + noise
-            return max(15, min(85, value))
+            return np.clip(70 - moisture_loss + noise, 15, 85)
 
         elif sensor_type == "light":
             # 光照：严格遵循昼夜规律
-            if 6 <= hour < 20:
-                # 白天：正弦波模拟太阳轨迹
-                peak_hour = 13  # 下午1点光照最强
-                light_intensity = 8000 * math.sin((hour - 6) * math.pi / 14)
+            # 白天：正弦波模拟太阳轨迹
+            light_intensity = 8000 * np.sin((hour - 6) * np.pi / 14)
 
-                # 云层影响 (20%概率)
-                if random.random() < 0.2:
-                    light_intensity *= random.uniform(0.4, 0.8)
+            # 云层影响 (20%概率)
+            cloudy = rng.random(size) < 0.2
+            light_intensity = np.where(cloudy, light_intensity * rng.uniform(0.4, 0.8, size), light_intensity)
 
-                noise = random.uniform(-500, 500)
-                value = light_intensity + noise
-            else:
-                # 夜晚
-                value = random.uniform(0, 50)
+            daytime = light_intensity + rng.uniform(-500, 500, size)
+            # 夜晚
+            night = rng.uniform(0, 50, size)
 
-            return max(0, value)
+            is_day = (hour >= 6) & (hour < 20)
+            return np.maximum(0, np.where(is_day, daytime, night))
 
         elif sensor_type == "soil_ph":
             # pH值：相对稳定，长期缓慢变化
-            base_ph = 6.5
-
             # 长期趋势 (每月变化)
-            trend = 0.1 * math.sin(month * math.pi / 12)
-
-            noise = random.uniform(-0.2, 0.2)
+            trend = 0.1 * np.sin(month * np.pi / 12)
+            noise = rng.uniform(-0.2, 0.2, size)
 
-            value = base_ph + trend + noise
-            return max(5.5, min(8.0, value))
+            return np.clip(6.5 + trend + noise, 5.5, 8.0)
 
         else:
-            return random.uniform(0, 100)
+            return rng.uniform(0, 100, size)
 
     @staticmethod
-    def update_all_gardens(db: Session) -> List[Dict]:
+    def _evaluate_series(thresholds: Dict, sensor_type: str, values):
         """
-        为所有菜地更新当前传感器数据
+        用数组掩码检查整条序列是否异常（规则同 IoTService._evaluate_abnormal）
 
         Returns:
-            每个菜地的更新结果
+            (异常掩码数组, 异常原因数组（正常为None）)
         """
-        gardens = db.query(Garden).all()
-        results = []
+        import numpy as np
+        from app.services.iot_service import ABNORMAL_MESSAGES
 
-        for garden in gardens:
-            try:
-                simulated = IoTService.simulate_readings(
-                    db,
-                    garden.id,
-                    realistic=True
-                )
+        low, high = thresholds.get(sensor_type, (None, None))
+        messages = ABNORMAL_MESSAGES.get(sensor_type)
 
-                results.append({
-                    "garden_id": garden.id,
-                    "garden_name": garden.name,
-                    "success": True,
-                    "data": simulated
-                })
+        too_low = np.zeros(len(values), dtype=bool)
+        too_high = np.zeros(len(values), dtype=bool)
+        if messages and low is not None:
+            too_low = values < low
+        if messages and high is not None:
+            too_high = ~too_low & (values > high)
+
+        reasons = np.full(len(values), None, dtype=object)
+        if too_low.any():
+            reasons[too_low] = messages[0].format(low)
+        if too_high.any():
+            reasons[too_high] = messages[1].format(high)
+
+        return too_low | too_high, reasons
 
-                logger.info(f"已更新菜地 {garden.id} ({garden.name}) 的传感器数据")
+    @staticmethod
+    def _rollup_series(sensor_id: int, times, values, abnormal) -> List[Dict]:
+        """
+        按各汇总粒度聚合一条有序序列（向量化）
 
-            except Exception as e:
-                logger.error(f"更新菜地 {garden.id} 数据失败: {e}")
-                results.append({
-                    "garden_id": garden.id,
-                    "garden_name": garden.name,
-                    "success": False,
-                    "error": str(e)
+        时间轴有序，同一时间桶的读数连续，用 reduceat 按桶边界一次聚合
+        """
+        import numpy as np
+        from app.services.iot_rollup import RESOLUTIONS, _EPOCH
+
+        seconds = (times - np.datetime64(_EPOCH, "s")).astype("int64")
+        abnormal = abnormal.astype(int)
+
+        rows = []
+        for resolution, size in RESOLUTIONS.items():
+            keys = seconds - seconds % size
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+            counts = np.diff(np.append(starts, len(keys)))
+            sums = np.add.reduceat(values, starts)
+            mins = np.minimum.reduceat(values, starts)
+            maxs = np.maximum.reduceat(values, starts)
+            abnormal_counts = np.add.reduceat(abnormal, starts)
+            bucket_times = keys[starts].astype("timedelta64[s]") + np.datetime64(_EPOCH, "s")
+
+            for bucket, count, total, low, high, abnormal_count in zip(
+                bucket_times.astype("datetime64[us]").tolist(),
+                counts.tolist(), sums.tolist(), mins.tolist(), maxs.tolist(),
+                abnormal_counts.tolist()
+            ):
+                rows.append({
+                    "sensor_id": sensor_id,
+                    "resolution": resolution,
+                    "bucket_start": bucket,
+                    "reading_count": count,
+                    "sum_value": total,
+                    "min_value": low,
+                    "max_value": high,
+                    "abnormal_count": abnormal_count
                 })
 
-        return results
+        return rows
+
+    @staticmethod
+    def update_all_gardens(
+        db: Session,
+        shard_size: int = None,
+        workers: int = None,
+        session_factory=None
+    ) -> Dict:
+        """
+        为所有菜地更新当前传感器数据
+
+        菜地按ID分片，每个分片在独立线程中使用独立会话处理，整个分片一次提交；
+        某个分片失败不影响其他分片
+
+        Args:
+            db: 数据库会话（仅用于读取菜地列表）
+            shard_size: 每个分片的菜地数，默认取配置 IOT_REFRESH_SHARD_SIZE
+            workers: 并行线程数，默认取配置 IOT_REFRESH_WORKERS
+            session_factory: 分片使用的会话工厂，默认 SessionLocal
+
+        Returns:
+            汇总结果及每个分片的耗时、失败信息
+        """
+        from app.core.database import SessionLocal
+
+        shard_size = shard_size or settings.IOT_REFRESH_SHARD_SIZE
+        workers = workers or settings.IOT_REFRESH_WORKERS
+        session_factory = session_factory or SessionLocal
+
+        garden_ids = [garden_id for (garden_id,) in db.query(Garden.id).order_by(Garden.id).all()]
+        shards = [
+            garden_ids[i:i + shard_size]
+            for i in range(0, len(garden_ids), shard_size)
+        ]
+
+        started = time.perf_counter()
+        if len(shards) <= 1 or workers <= 1:
+            reports = [
+                IoTSimulator._refresh_shard(session_factory, index, shard)
+                for index, shard in enumerate(shards)
+            ]
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="iot-refresh") as executor:
+                reports = list(executor.map(
+                    lambda args: IoTSimulator._refresh_shard(session_factory, *args),
+                    enumerate(shards)
+                ))
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+
+        success = sum(r["gardens"] for r in reports if r["success"])
+        return {
+            "total": len(garden_ids),
+            "success": success,
+            "failed": len(garden_ids) - success,
+            "readings": sum(r["readings"] for r in reports),
+            "elapsed_ms": elapsed_ms,
+            "shards": reports
+        }
+
+    @staticmethod
+    def _refresh_shard(session_factory, index: int, garden_ids: List[int]) -> Dict:
+        """
+        刷新一个分片的菜地（独立会话，一次提交）
+
+        Returns:
+            分片报告：分片序号、菜地范围、菜地数、读数条数、耗时、是否成功、错误信息
+        """
+        started = time.perf_counter()
+        report = {
+            "shard": index,
+            "first_garden_id": garden_ids[0],
+            "last_garden_id": garden_ids[-1],
+            "gardens": len(garden_ids),
+            "readings": 0,
+            "abnormal": 0,
+            "success": True,
+            "error": None
+        }
+
+        db = session_factory()
+        try:
+            sensors_by_garden = IoTSimulator._ensure_sensors(db, garden_ids, commit=False)
+
+            readings = []
+            for garden_id in garden_ids:
+                for sensor in sensors_by_garden.get(garden_id, []):
+                    value = IoTService._generate_realistic_value(sensor.sensor_type, garden_id)
+                    readings.append({
+                        "sensor_id": sensor.id,
+                        "value": round(value, 2),
+                        "unit": IoTService._get_sensor_unit(sensor.sensor_type)
+                    })
+
+            # 整个分片一次多行插入、一次提交
+            result = IoTService.record_readings_batch(db, readings)
+            report["readings"] = result["accepted"]
+            report["abnormal"] = result["abnormal"]
+
+        except Exception as e:
+            db.rollback()
+            report["success"] = False
+            report["error"] = str(e)
+            logger.error(
+                f"物联网数据刷新分片 {index}（菜地 {garden_ids[0]}-{garden_ids[-1]}）失败: {e}",
+                exc_info=True
+            )
+        finally:
+            db.close()
+
+        report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return report
 
     @staticmethod
     def create_weather_event(
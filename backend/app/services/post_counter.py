@@ -0,0 +1,151 @@
+"""
+帖子计数服务
+点赞数/评论数采用"追加增量 + 定时合并"的写后（write-behind）方式维护
+"""
+from typing import Dict, Iterable, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models.post import Post
+from app.models.post_counter import PostCounterDelta
+
+
+class PostCounterService:
+    """
+    帖子计数服务
+
+    - 写入：点赞/取消点赞/评论/删除评论只追加一条增量记录，不锁 posts 行
+    - 读取：posts 中的基数 + 尚未合并的增量之和
+    - 合并：定时任务按增量ID批量锁定、汇总并回写 posts，然后删除已合并的增量
+
+    读取时基数和增量在同一个事务内查询，InnoDB 的一致性快照保证
+    不会在合并提交前后读到重复或缺失的计数
+    """
+
+    @staticmethod
+    def add_delta(db: Session, post_id: int, like_delta: int = 0, comment_delta: int = 0) -> None:
+        """
+        记录计数增量（随调用方事务一起提交）
+
+        Args:
+            db: 数据库会话
+            post_id: 帖子ID
+            like_delta: 点赞数增量
+            comment_delta: 评论数增量
+        """
+        db.add(PostCounterDelta(
+            post_id=post_id,
+            like_delta=like_delta,
+            comment_delta=comment_delta
+        ))
+
+    @staticmethod
+    def _pending_stmt(post_ids: Iterable[int]):
+        """构造按帖子汇总未合并增量的查询语句"""
+        return select(
+            PostCounterDelta.post_id,
+            func.sum(PostCounterDelta.like_delta),
+            func.sum(PostCounterDelta.comment_delta)
+        ).filter(
+            PostCounterDelta.post_id.in_(post_ids)
+        ).group_by(PostCounterDelta.post_id)
+
+    @staticmethod
+    def _to_pending_map(rows) -> Dict[int, Tuple[int, int]]:
+        """将汇总结果转换为 {post_id: (点赞增量, 评论增量)}"""
+        return {
+            post_id: (int(like_delta or 0), int(comment_delta or 0))
+            for post_id, like_delta, comment_delta in rows
+        }
+
+    @staticmethod
+    def get_pending(db: Session, post_ids: Iterable[int]) -> Dict[int, Tuple[int, int]]:
+        """
+        查询尚未合并的增量
+
+        Args:
+            db: 数据库会话
+            post_ids: 帖子ID列表
+
+        Returns:
+            {post_id: (点赞增量, 评论增量)}
+        """
+        post_ids = set(post_ids)
+        if not post_ids:
+            return {}
+
+        rows = db.execute(PostCounterService._pending_stmt(post_ids)).all()
+        return PostCounterService._to_pending_map(rows)
+
+    @staticmethod
+    async def get_pending_async(db: AsyncSession, post_ids: Iterable[int]) -> Dict[int, Tuple[int, int]]:
+        """查询尚未合并的增量（异步会话版本，返回值同 get_pending）"""
+        post_ids = set(post_ids)
+        if not post_ids:
+            return {}
+
+        result = await db.execute(PostCounterService._pending_stmt(post_ids))
+        return PostCounterService._to_pending_map(result.all())
+
+    @staticmethod
+    def get_counts(db: Session, post: Post) -> Tuple[int, int]:
+        """
+        获取单个帖子的实时计数
+
+        Returns:
+            (点赞数, 评论数)
+        """
+        like_delta, comment_delta = PostCounterService.get_pending(db, [post.id]).get(post.id, (0, 0))
+        return (
+            max(0, (post.like_count or 0) + like_delta),
+            max(0, (post.comment_count or 0) + comment_delta)
+        )
+
+    @staticmethod
+    def fold_deltas(db: Session, batch_size: int = 5000) -> int:
+        """
+        将增量合并回 posts 表
+
+        按ID锁定一批增量（SKIP LOCKED，多个合并任务并发时互不重复处理），
+        在同一事务中原子地累加到 posts 并删除这批增量。
+        只删除本次读到的增量ID，尚未提交的新增量留给下一轮
+
+        Args:
+            db: 数据库会话
+            batch_size: 单批处理的增量条数
+
+        Returns:
+            合并的增量条数
+        """
+        deltas = db.query(PostCounterDelta).order_by(
+            PostCounterDelta.id
+        ).limit(batch_size).with_for_update(skip_locked=True).all()
+
+        if not deltas:
+            db.rollback()
+            return 0
+
+        # 按帖子汇总
+        totals: Dict[int, list] = {}
+        for delta in deltas:
+            total = totals.setdefault(delta.post_id, [0, 0])
+            total[0] += delta.like_delta or 0
+            total[1] += delta.comment_delta or 0
+
+        for post_id, (like_delta, comment_delta) in totals.items():
+            if not like_delta and not comment_delta:
+                continue
+            db.query(Post).filter(Post.id == post_id).update(
+                {
+                    Post.like_count: Post.like_count + like_delta,
+                    Post.comment_count: Post.comment_count + comment_delta
+                },
+                synchronize_session=False
+            )
+
+        db.query(PostCounterDelta).filter(
+            PostCounterDelta.id.in_([delta.id for delta in deltas])
+        ).delete(synchronize_session=False)
+
+        db.commit()
+        return len(deltas)
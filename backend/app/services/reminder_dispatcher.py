@@ -0,0 +1,294 @@
+"""
+提醒投递调度器
+把即将到期的待发送提醒（智能提醒 + 订单任务提醒）放入按提醒时间排序的小顶堆，
+睡眠到最近一条到期，批量标记已发送并交给投递处理器；堆按时间窗口从索引范围扫描补充
+"""
+import heapq
+import itertools
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from sqlalchemy import and_, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.crop import SmartReminder
+from app.models.reminder import Reminder, ReminderStatus
+
+logger = logging.getLogger(__name__)
+
+# 提醒来源
+SMART = "smart"
+LEGACY = "legacy"
+
+# 投递处理器：接收一批已到期的提醒
+Handler = Callable[[List[Dict]], None]
+
+
+def _log_handler(items: List[Dict]) -> None:
+    """默认投递处理器：记录日志"""
+    for item in items:
+        logger.info(
+            f"投递提醒 [{item['kind']}#{item['id']}] 用户 {item['user_id']}: {item['title']}"
+            f"（提醒时间 {item['remind_time']:%Y-%m-%d %H:%M}）"
+        )
+
+
+class ReminderDispatcher:
+    """
+    提醒投递调度器
+
+    - 堆中只保存 [now - 回溯时间, 已加载到的时间) 窗口内未发送的提醒，入堆/出堆 O(log n)
+    - 每隔 REMINDER_DISPATCH_REFILL_SECONDS 或窗口用完时从数据库补充下一个窗口
+    - 到期提醒按来源批量 UPDATE 标记已发送（条件更新，重复标记无副作用）
+    """
+
+    def __init__(self, session_factory=None, handlers: Optional[List[Handler]] = None):
+        if session_factory is None:
+            from app.core.database import SessionLocal
+            session_factory = SessionLocal
+
+        self.session_factory = session_factory
+        self.handlers: List[Handler] = handlers if handlers is not None else [_log_handler]
+        self._heap: List[Tuple[datetime, int, Dict]] = []
+        self._queued: Set[Tuple[str, int]] = set()
+        self._counter = itertools.count()
+        self._loaded_until: Optional[datetime] = None
+        self._last_refill: Optional[datetime] = None
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------- 堆维护 ----------
+
+    def refill(self, db: Session, now: datetime) -> int:
+        """
+        从数据库补充堆：提醒时间在 [now - 回溯时间, now + 窗口) 内、未发送且未入堆的提醒
+
+        每次都从回溯下限开始扫描，上次加载后新建的、提醒时间已过的提醒也能被补充；
+        已发送的提醒不满足条件，扫描范围只包含窗口内待发送的行
+
+        Returns:
+            新入堆的条数
+        """
+        since = now - timedelta(hours=settings.REMINDER_DISPATCH_LOOKBACK_HOURS)
+        until = now + timedelta(minutes=settings.REMINDER_DISPATCH_WINDOW_MINUTES)
+
+        smart_rows = db.query(
+            SmartReminder.id, SmartReminder.user_id, SmartReminder.title, SmartReminder.remind_time
+        ).filter(
+            and_(
+                SmartReminder.sent_at.is_(None),
+                SmartReminder.remind_time >= since,
+                SmartReminder.remind_time < until,
+                SmartReminder.status == "pending"
+            )
+        ).all()
+
+        legacy_rows = db.query(
+            Reminder.id, Reminder.user_id, Reminder.content, Reminder.remind_time
+        ).filter(
+            and_(
+                Reminder.sent_at.is_(None),
+                Reminder.remind_time >= since,
+                Reminder.remind_time < until,
+                Reminder.status == ReminderStatus.PENDING
+            )
+        ).all()
+
+        added = 0
+        for kind, rows in ((SMART, smart_rows), (LEGACY, legacy_rows)):
+            for row_id, user_id, title, remind_time in rows:
+                if (kind, row_id) in self._queued:
+                    continue
+                self.push({
+                    "kind": kind,
+                    "id": row_id,
+                    "user_id": user_id,
+                    "title": title,
+                    "remind_time": remind_time
+                })
+                added += 1
+
+        self._loaded_until = until
+        self._last_refill = now
+        return added
+
+    def push(self, item: Dict) -> None:
+        """提醒入堆（计数器保证同一时间的提醒按入堆顺序出堆）"""
+        heapq.heappush(self._heap, (item["remind_time"], next(self._counter), item))
+        self._queued.add((item["kind"], item["id"]))
+
+    def pop_due(self, now: datetime, limit: int) -> List[Dict]:
+        """弹出最多 limit 条已到期的提醒"""
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < limit:
+            _, _, item = heapq.heappop(self._heap)
+            self._queued.discard((item["kind"], item["id"]))
+            due.append(item)
+        return due
+
+    def next_due_time(self) -> Optional[datetime]:
+        """堆顶（最近一条）的提醒时间"""
+        return self._heap[0][0] if self._heap else None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    # ---------- 投递 ----------
+
+    def dispatch_due(self, db: Session, now: datetime) -> int:
+        """
+        投递所有已到期的提醒（按批标记已发送，每批一次提交）
+
+        Returns:
+            投递条数
+        """
+        dispatched = 0
+        while True:
+            due = self.pop_due(now, settings.REMINDER_DISPATCH_BATCH_SIZE)
+            if not due:
+                return dispatched
+
+            try:
+                # 堆中的提醒可能已被完成、忽略或删除，只投递本次真正标记成功的
+                due = ReminderDispatcher.mark_sent(db, due, now)
+                db.commit()
+            except Exception as e:
+                # 未标记成功的提醒仍是待发送状态，下次补充时重新入堆
+                db.rollback()
+                logger.error(f"标记提醒已发送失败: {e}", exc_info=True)
+                return dispatched
+
+            if not due:
+                continue
+
+            for handler in self.handlers:
+                try:
+                    handler(due)
+                except Exception as e:
+                    logger.error(f"提醒投递处理器 {handler} 失败: {e}", exc_info=True)
+
+            dispatched += len(due)
+
+    @staticmethod
+    def mark_sent(db: Session, items: List[Dict], now: datetime) -> List[Dict]:
+        """
+        按来源批量标记已发送（不提交）
+
+        条件更新只匹配仍待处理且未投递的提醒；支持 RETURNING 的数据库直接返回标记的ID，
+        否则按 ID 和本次投递时间读回
+
+        Returns:
+            本次标记成功的提醒（堆中已完成、忽略或删除的提醒不在其中）
+        """
+        # 按秒截断，TIMESTAMP 列不保存微秒，读回时才能按投递时间匹配
+        sent_at = now.replace(microsecond=0)
+        returning = db.get_bind().dialect.update_returning
+
+        marked: Set[Tuple[str, int]] = set()
+        for kind, model, pending in (
+            (SMART, SmartReminder, SmartReminder.status == "pending"),
+            (LEGACY, Reminder, Reminder.status == ReminderStatus.PENDING),
+        ):
+            ids = [item["id"] for item in items if item["kind"] == kind]
+            if not ids:
+                continue
+
+            stmt = (
+                update(model)
+                .where(and_(model.id.in_(ids), model.sent_at.is_(None), pending))
+                .values(sent_at=sent_at)
+                .execution_options(synchronize_session=False)
+            )
+            if returning:
+                marked_ids = db.execute(stmt.returning(model.id)).scalars().all()
+            else:
+                db.execute(stmt)
+                marked_ids = [
+                    row_id for (row_id,) in db.query(model.id).filter(
+                        and_(model.id.in_(ids), model.sent_at == sent_at)
+                    ).all()
+                ]
+            marked.update((kind, row_id) for row_id in marked_ids)
+
+        return [item for item in items if (item["kind"], item["id"]) in marked]
+
+    def run_once(self, now: Optional[datetime] = None) -> Dict:
+        """
+        执行一轮：需要时补充堆，然后投递已到期的提醒
+
+        Returns:
+            {"refilled": 新入堆条数, "dispatched": 投递条数, "queued": 堆中剩余条数}
+        """
+        now = now or datetime.now()
+        db = self.session_factory()
+        try:
+            refilled = 0
+            if self._needs_refill(now):
+                refilled = self.refill(db, now)
+                db.rollback()  # 结束只读事务，避免长事务持有快照
+            dispatched = self.dispatch_due(db, now)
+        finally:
+            db.close()
+
+        return {"refilled": refilled, "dispatched": dispatched, "queued": len(self._heap)}
+
+    def _needs_refill(self, now: datetime) -> bool:
+        if self._loaded_until is None or now >= self._loaded_until:
+            return True
+        return (now - self._last_refill).total_seconds() >= settings.REMINDER_DISPATCH_REFILL_SECONDS
+
+    def _seconds_until_next(self, now: datetime) -> float:
+        """距离下一次需要醒来（最近一条到期或下次补充）的秒数"""
+        next_refill = self._last_refill + timedelta(seconds=settings.REMINDER_DISPATCH_REFILL_SECONDS)
+        wake_at = min(next_refill, self._loaded_until)
+        next_due = self.next_due_time()
+        if next_due is not None:
+            wake_at = min(wake_at, next_due)
+        return max(0.0, (wake_at - now).total_seconds())
+
+    # ---------- 后台线程 ----------
+
+    def start(self) -> None:
+        """启动后台投递线程（重复调用无副作用）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="reminder-dispatcher", daemon=True)
+        self._thread.start()
+        logger.info("提醒投递调度器已启动")
+
+    def stop(self, timeout: float = 5) -> None:
+        """停止后台投递线程"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def wake(self) -> None:
+        """立即补充并投递（如刚创建了马上到期的提醒）"""
+        self._last_refill = None
+        self._loaded_until = None
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                result = self.run_once()
+                if result["dispatched"]:
+                    logger.info(f"已投递 {result['dispatched']} 条提醒，待投递 {result['queued']} 条")
+            except Exception as e:
+                logger.error(f"提醒投递失败: {e}", exc_info=True)
+
+            timeout = settings.REMINDER_DISPATCH_REFILL_SECONDS
+            if self._last_refill is not None:
+                timeout = self._seconds_until_next(datetime.now())
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+
+# 进程内的投递调度器（在调度器进程中启动，多进程同时投递会重复发送）
+dispatcher = ReminderDispatcher()
@@ -0,0 +1,157 @@
+"""
+租用日历服务
+每块菜地的租期区间由订单表的 (garden_id, start_date, end_date) 索引维护，
+重叠检查和按时间段筛选可租菜地都走该索引的范围扫描
+"""
+from datetime import date, datetime
+from typing import Dict, List, Optional
+from sqlalchemy import Select, and_, exists, select, update
+from sqlalchemy.orm import Session
+from app.models.garden import Garden, GardenStatus
+from app.models.order import Order, OrderStatus
+
+# 占用租期的订单状态（待支付订单也占用，取消后释放）
+BLOCKING_STATUSES = (OrderStatus.PENDING, OrderStatus.PAID, OrderStatus.ACTIVE)
+
+# 使菜地处于"已租出"状态的订单状态（已支付且租期覆盖当天）
+RENTED_STATUSES = (OrderStatus.PAID, OrderStatus.ACTIVE)
+
+
+class RentalCalendarService:
+    """租用日历服务"""
+
+    @staticmethod
+    def overlap_condition(garden_id, start_date: date, end_date: date):
+        """
+        菜地在 [start_date, end_date]（两端都包含）内的占用订单条件
+
+        garden_id 可以是菜地ID，也可以是外层查询的列（如 Garden.id，构造关联子查询）；
+        garden_id 等值 + start_date 范围命中 idx_garden_period 索引，end_date 在索引内过滤
+        """
+        return and_(
+            Order.garden_id == garden_id,
+            Order.start_date <= end_date,
+            Order.end_date >= start_date,
+            Order.status.in_(BLOCKING_STATUSES)
+        )
+
+    @staticmethod
+    def overlap_select(
+        garden_id: int,
+        start_date: date,
+        end_date: date,
+        exclude_order_id: Optional[int] = None
+    ) -> Select:
+        """
+        菜地在指定时间段内占用订单的查询语句（按开始日期排序，同步/异步会话通用）
+
+        Args:
+            garden_id: 菜地ID
+            start_date: 开始日期
+            end_date: 结束日期
+            exclude_order_id: 排除的订单ID（检查订单自身时使用）
+        """
+        stmt = select(Order).filter(
+            RentalCalendarService.overlap_condition(garden_id, start_date, end_date)
+        )
+        if exclude_order_id is not None:
+            stmt = stmt.filter(Order.id != exclude_order_id)
+        return stmt.order_by(Order.start_date)
+
+    @staticmethod
+    def find_overlaps(
+        db: Session,
+        garden_id: int,
+        start_date: date,
+        end_date: date,
+        exclude_order_id: Optional[int] = None
+    ) -> List[Order]:
+        """查询菜地在指定时间段内的占用订单"""
+        stmt = RentalCalendarService.overlap_select(garden_id, start_date, end_date, exclude_order_id)
+        return db.execute(stmt).scalars().all()
+
+    @staticmethod
+    def is_available(
+        db: Session,
+        garden_id: int,
+        start_date: date,
+        end_date: date,
+        exclude_order_id: Optional[int] = None
+    ) -> bool:
+        """菜地在指定时间段内是否没有占用订单（EXISTS 查询，找到一条即停止）"""
+        condition = RentalCalendarService.overlap_condition(garden_id, start_date, end_date)
+        if exclude_order_id is not None:
+            condition = and_(condition, Order.id != exclude_order_id)
+        return not db.query(exists().where(condition)).scalar()
+
+    @staticmethod
+    def available_condition(start_date: date, end_date: date):
+        """
+        菜地在指定时间段内可租的条件（用于菜地查询的 WHERE）
+
+        NOT EXISTS 关联子查询，数据库对每块菜地做一次索引探测（反连接），
+        不在 Python 中逐块菜地计算；维护中的菜地不可租
+        """
+        return and_(
+            Garden.status != GardenStatus.MAINTENANCE,
+            ~exists().where(
+                RentalCalendarService.overlap_condition(Garden.id, start_date, end_date)
+            )
+        )
+
+    @staticmethod
+    def rented_condition(garden_id, today: date):
+        """菜地当天处于租期内的条件（有已支付/进行中的订单覆盖当天），garden_id 含义同 overlap_condition"""
+        return exists().where(
+            and_(
+                Order.garden_id == garden_id,
+                Order.start_date <= today,
+                Order.end_date >= today,
+                Order.status.in_(RENTED_STATUSES)
+            )
+        )
+
+    @staticmethod
+    def sync_garden_status(db: Session, garden: Garden, today: Optional[date] = None) -> None:
+        """
+        按租用日历刷新菜地状态（不提交）
+
+        有已支付/进行中的订单覆盖当天则为已租出，否则为可租用；维护中的菜地不变。
+        订单状态变化后调用，未来租期的支付或取消不会改变菜地当前的状态
+        """
+        if garden.status == GardenStatus.MAINTENANCE:
+            return
+
+        today = today or datetime.now().date()
+        db.flush()
+        rented = db.query(RentalCalendarService.rented_condition(garden.id, today)).scalar()
+        garden.status = GardenStatus.RENTED if rented else GardenStatus.AVAILABLE
+
+    @staticmethod
+    def sync_all_garden_status(db: Session, today: Optional[date] = None) -> Dict[str, int]:
+        """
+        按租用日历批量刷新所有菜地状态（两条 UPDATE，提交事务）
+
+        租期开始或结束后菜地状态随日期变化，由定时任务每天执行
+
+        Returns:
+            {"rented": 变为已租出的菜地数, "available": 变为可租用的菜地数}
+        """
+        today = today or datetime.now().date()
+        rented = RentalCalendarService.rented_condition(Garden.id, today)
+
+        to_rented = db.execute(
+            update(Garden)
+            .where(and_(Garden.status == GardenStatus.AVAILABLE, rented))
+            .values(status=GardenStatus.RENTED)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        to_available = db.execute(
+            update(Garden)
+            .where(and_(Garden.status == GardenStatus.RENTED, ~rented))
+            .values(status=GardenStatus.AVAILABLE)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+
+        return {"rented": to_rented, "available": to_available}
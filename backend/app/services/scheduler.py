@@ -7,9 +7,15 @@ import time
 import logging
 from datetime import datetime
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.core.database import SessionLocal
 from app.services.smart_reminder_engine import SmartReminderEngine
 from app.services.iot_simulator import IoTSimulator
+from app.services.post_counter import PostCounterService
+from app.services.iot_archive import IoTArchiveService
+from app.services.iot_alerts import IoTAlertService
+from app.services.reminder_dispatcher import dispatcher
+from app.services.rental_calendar import RentalCalendarService
 
 # 配置日志
 logging.basicConfig(
@@ -63,16 +69,34 @@ class TaskScheduler:
 
         db = SessionLocal()
         try:
-            # 更新所有菜地的传感器数据
-            results = IoTSimulator.update_all_gardens(db)
-
-            success_count = sum(1 for r in results if r.get("success"))
-            logger.info(f"成功更新 {success_count}/{len(results)} 个菜地的传感器数据")
-
-            # 记录失败的菜地
-            for result in results:
-                if not result.get("success"):
-                    logger.error(f"菜地 {result['garden_id']} 更新失败: {result.get('error')}")
+            # 分片并行更新所有菜地的传感器数据
+            result = IoTSimulator.update_all_gardens(db)
+
+            logger.info(
+                f"成功更新 {result['success']}/{result['total']} 个菜地的传感器数据，"
+                f"共 {result['readings']} 条读数，耗时 {result['elapsed_ms']}ms"
+            )
+
+            # 记录每个分片的耗时和失败
+            for shard in result["shards"]:
+                if shard["success"]:
+                    logger.info(
+                        f"  分片 {shard['shard']}（菜地 {shard['first_garden_id']}-{shard['last_garden_id']}）: "
+                        f"{shard['readings']} 条读数，耗时 {shard['elapsed_ms']}ms"
+                    )
+                else:
+                    logger.error(
+                        f"  分片 {shard['shard']}（菜地 {shard['first_garden_id']}-{shard['last_garden_id']}）"
+                        f"更新失败: {shard['error']}"
+                    )
+
+            # 耗时超过调度间隔时提示调整分片/线程数
+            interval_ms = settings.IOT_REFRESH_INTERVAL_MINUTES * 60 * 1000
+            if result["elapsed_ms"] > interval_ms:
+                logger.warning(
+                    f"物联网数据更新耗时 {result['elapsed_ms']}ms 超过调度间隔 "
+                    f"{settings.IOT_REFRESH_INTERVAL_MINUTES} 分钟，请调大 IOT_REFRESH_WORKERS"
+                )
 
         except Exception as e:
             logger.error(f"物联网数据更新失败: {e}", exc_info=True)
@@ -90,19 +114,10 @@ class TaskScheduler:
 
         db = SessionLocal()
         try:
-            from app.models.crop import PlantingRecord
-
-            # 获取所有进行中的种植记录
-            records = db.query(PlantingRecord).filter(
-                PlantingRecord.status == "growing"
-            ).all()
-
-            updated_count = 0
-            for record in records:
-                if SmartReminderEngine.update_growth_stage(db, record.id):
-                    updated_count += 1
+            # 批量计算并更新所有进行中种植记录的生长阶段
+            result = SmartReminderEngine.update_growth_stages(db)
 
-            logger.info(f"成功更新 {updated_count}/{len(records)} 条种植记录的生长阶段")
+            logger.info(f"成功更新 {result['updated']}/{result['total']} 条种植记录的生长阶段")
 
         except Exception as e:
             logger.error(f"生长阶段更新失败: {e}", exc_info=True)
@@ -112,6 +127,66 @@ class TaskScheduler:
         logger.info("作物生长阶段更新任务完成")
         logger.info("=" * 60)
 
+    @staticmethod
+    def sync_garden_status():
+        """按租用日历刷新菜地租用状态任务"""
+        db = SessionLocal()
+        try:
+            result = RentalCalendarService.sync_all_garden_status(db)
+            logger.info(f"菜地状态刷新：{result['rented']} 块变为已租出，{result['available']} 块变为可租用")
+
+        except Exception as e:
+            db.rollback()
+            logger.error(f"菜地状态刷新失败: {e}", exc_info=True)
+        finally:
+            db.close()
+
+    @staticmethod
+    def fold_post_counters():
+        """合并帖子点赞/评论计数增量任务"""
+        db = SessionLocal()
+        try:
+            folded = 0
+            while True:
+                count = PostCounterService.fold_deltas(db)
+                folded += count
+                if count == 0:
+                    break
+
+            if folded:
+                logger.info(f"已合并 {folded} 条帖子计数增量")
+
+        except Exception as e:
+            db.rollback()
+            logger.error(f"帖子计数合并失败: {e}", exc_info=True)
+        finally:
+            db.close()
+
+    @staticmethod
+    def archive_iot_readings():
+        """归档过期的物联网原始读数任务"""
+        logger.info("=" * 60)
+        logger.info("开始执行物联网读数归档任务")
+
+        db = SessionLocal()
+        try:
+            result = IoTArchiveService.archive_expired(db)
+
+            archived = sum(day["exported"] for day in result["days"])
+            logger.info(f"归档 {len(result['days'])} 天共 {archived} 条原始读数（截止 {result['cutoff']}）")
+            logger.info(f"清理5分钟汇总 {result['rollups_deleted']} 条")
+            if result["partitions_created"]:
+                logger.info(f"新建分区: {', '.join(result['partitions_created'])}")
+
+        except Exception as e:
+            db.rollback()
+            logger.error(f"物联网读数归档失败: {e}", exc_info=True)
+        finally:
+            db.close()
+
+        logger.info("物联网读数归档任务完成")
+        logger.info("=" * 60)
+
     @staticmethod
     def daily_summary():
         """每日统计汇总"""
@@ -167,18 +242,31 @@ class TaskScheduler:
         """启动调度器"""
         logger.info("智能菜地调度器启动")
         logger.info("调度任务配置:")
-        logger.info("  - 更新物联网数据: 每5分钟")
+        logger.info(f"  - 更新物联网数据: 每{settings.IOT_REFRESH_INTERVAL_MINUTES}分钟（分片并行）")
         logger.info("  - 更新生长阶段: 每天00:00")
         logger.info("  - 生成智能提醒: 每天06:00, 12:00, 18:00")
         logger.info("  - 每日统计汇总: 每天23:00")
+        logger.info("  - 合并帖子计数: 每1分钟")
+        logger.info("  - 归档物联网读数: 每天03:00")
+        logger.info("  - 环境警告: 异常读数入库后实时生成")
+        logger.info("  - 提醒投递: 按提醒时间实时投递")
         logger.info("")
 
-        # 物联网数据更新 - 每5分钟
-        schedule.every(5).minutes.do(TaskScheduler.update_iot_data)
+        # 调度器进程内刷新的读数也会发布异常事件
+        IoTAlertService.start()
+
+        # 提醒投递只在调度器进程中运行（多进程同时投递会重复发送）
+        dispatcher.start()
+
+        # 物联网数据更新 - 默认每5分钟
+        schedule.every(settings.IOT_REFRESH_INTERVAL_MINUTES).minutes.do(TaskScheduler.update_iot_data)
 
         # 生长阶段更新 - 每天凌晨执行
         schedule.every().day.at("00:00").do(TaskScheduler.update_growth_stages)
 
+        # 菜地租用状态刷新 - 每天凌晨执行（租期开始/结束）
+        schedule.every().day.at("00:05").do(TaskScheduler.sync_garden_status)
+
         # 智能提醒生成 - 每天早、中、晚各执行一次
         schedule.every().day.at("06:00").do(TaskScheduler.generate_smart_reminders)
         schedule.every().day.at("12:00").do(TaskScheduler.generate_smart_reminders)
@@ -187,9 +275,16 @@ class TaskScheduler:
         # 每日统计 - 每天晚上11点
         schedule.every().day.at("23:00").do(TaskScheduler.daily_summary)
 
+        # 帖子计数合并 - 每分钟
+        schedule.every(1).minutes.do(TaskScheduler.fold_post_counters)
+
+        # 物联网原始读数归档 - 每天凌晨3点
+        schedule.every().day.at("03:00").do(TaskScheduler.archive_iot_readings)
+
         # 立即执行一次初始化任务
         logger.info("执行初始化任务...")
         TaskScheduler.update_growth_stages()
+        TaskScheduler.sync_garden_status()
         TaskScheduler.generate_smart_reminders()
         TaskScheduler.update_iot_data()
 
@@ -204,6 +299,7 @@ class TaskScheduler:
         except Exception as e:
             logger.error(f"调度器异常: {e}", exc_info=True)
         finally:
+            dispatcher.stop()
             logger.info("调度器已停止")
 
 
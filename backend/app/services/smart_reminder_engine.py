@@ -5,12 +5,22 @@
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, func, case, update
+from app.core.upsert import insert_ignore
+from app.services.statistics import StatisticsService
 from app.models.crop import (
     PlantingRecord, Crop, CropGrowthStage, SmartReminder,
-    IoTReading, IoTSensor, GrowthStage
+    GrowthStage
 )
-from app.services.iot_service import IoTService
+
+# 按生长规则周期性生成的提醒类型
+RULE_REMINDER_TYPES = ("watering", "fertilizing", "weeding", "pest_check")
+
+# 去重键的时间桶（小时），同一用户、种植记录、类型在一个桶内只生成一条提醒
+DEDUP_BUCKET_HOURS = {
+    "environment_alert": 1,
+    "default": 6,
+}
 
 
 class SmartReminderEngine:
@@ -22,10 +32,14 @@ class SmartReminderEngine:
         生成智能提醒
         综合考虑：
         1. 作物生长规则
-        2. 物联网传感器数据
-        3. 历史记录
+        2. 历史记录
+
+        按集合处理：作物、阶段规则、最后完成时间、待处理提醒各一次查询，
+        规则在内存中计算，新提醒一次批量写入并提交
+
+        环境警告由读数入库时的异常事件触发（见 IoTAlertService），不在这里轮询
         """
-        reminders = []
+        now = datetime.now()
 
         # 获取所有进行中的种植记录
         query = db.query(PlantingRecord).filter(
@@ -35,316 +49,335 @@ class SmartReminderEngine:
             query = query.filter(PlantingRecord.user_id == user_id)
 
         planting_records = query.all()
+        if not planting_records:
+            return []
+
+        context = SmartReminderEngine._load_context(
+            db, planting_records, query.with_entities(PlantingRecord.id), now
+        )
 
+        reminders = []
         for record in planting_records:
-            # 1. 基于生长规则的提醒
-            rule_reminders = SmartReminderEngine._generate_rule_based_reminders(
-                db, record
-            )
-            reminders.extend(rule_reminders)
+            crop = context["crops"].get(record.crop_id)
+            if not crop:
+                continue
 
-            # 2. 基于物联网数据的提醒
-            iot_reminders = SmartReminderEngine._generate_iot_based_reminders(
-                db, record
-            )
-            reminders.extend(iot_reminders)
+            # 1. 基于生长规则的提醒
+            reminders.extend(SmartReminderEngine._generate_rule_based_reminders(
+                record, crop, context, now
+            ))
 
-            # 3. 收获提醒
+            # 2. 收获提醒
             harvest_reminder = SmartReminderEngine._check_harvest_time(
-                db, record
+                record, crop, context, now
             )
             if harvest_reminder:
                 reminders.append(harvest_reminder)
 
         # 保存提醒到数据库（去重）
-        for reminder in reminders:
-            SmartReminderEngine._save_reminder(db, reminder)
+        return SmartReminderEngine.save_reminders(db, reminders, now, context["pending"])
 
-        return reminders
+    @staticmethod
+    def _load_context(
+        db: Session,
+        planting_records: List[PlantingRecord],
+        record_ids,
+        now: datetime
+    ) -> Dict:
+        """
+        一次加载生成提醒所需的全部数据
+
+        Args:
+            db: 数据库会话
+            planting_records: 进行中的种植记录
+            record_ids: 种植记录ID子查询（避免超长的 IN 列表）
+            now: 本次生成的时间
+
+        Returns:
+            crops: {crop_id: Crop}
+            stage_rules: {(crop_id, stage): CropGrowthStage}
+            last_completed: {(planting_record_id, reminder_type): 最后完成时间}
+            pending: 6小时内的待处理提醒 {(user_id, planting_record_id, reminder_type)}
+            pending_harvest: 有待处理收获提醒的种植记录ID
+        """
+        crop_ids = {record.crop_id for record in planting_records}
+
+        crops = {
+            crop.id: crop
+            for crop in db.query(Crop).filter(Crop.id.in_(crop_ids)).all()
+        }
+
+        # 每个作物每个阶段取第一条规则
+        stage_rules = {}
+        for rule in db.query(CropGrowthStage).filter(
+            CropGrowthStage.crop_id.in_(crop_ids)
+        ).order_by(CropGrowthStage.id).all():
+            stage_rules.setdefault((rule.crop_id, rule.stage), rule)
+
+        # 各类任务的最后完成时间（一次分组查询）
+        last_completed = {
+            (planting_record_id, reminder_type): completed_at
+            for planting_record_id, reminder_type, completed_at in db.query(
+                SmartReminder.planting_record_id,
+                SmartReminder.reminder_type,
+                func.max(SmartReminder.completed_at)
+            ).filter(
+                and_(
+                    SmartReminder.planting_record_id.in_(record_ids),
+                    SmartReminder.reminder_type.in_(RULE_REMINDER_TYPES),
+                    SmartReminder.status == "completed"
+                )
+            ).group_by(
+                SmartReminder.planting_record_id,
+                SmartReminder.reminder_type
+            ).all()
+        }
+
+        # 用于去重的待处理提醒（收获提醒不限时间，其他类型只看最近6小时）
+        pending = set()
+        pending_harvest = set()
+        for user_id, planting_record_id, reminder_type, created_at in db.query(
+            SmartReminder.user_id,
+            SmartReminder.planting_record_id,
+            SmartReminder.reminder_type,
+            SmartReminder.created_at
+        ).filter(
+            and_(
+                SmartReminder.status == "pending",
+                SmartReminder.planting_record_id.in_(record_ids),
+                or_(
+                    SmartReminder.reminder_type == "harvest",
+                    SmartReminder.created_at >= now - timedelta(hours=6)
+                )
+            )
+        ).all():
+            if reminder_type == "harvest":
+                pending_harvest.add(planting_record_id)
+            if created_at >= now - timedelta(hours=6):
+                pending.add((user_id, planting_record_id, reminder_type))
+
+        return {
+            "crops": crops,
+            "stage_rules": stage_rules,
+            "last_completed": last_completed,
+            "pending": pending,
+            "pending_harvest": pending_harvest
+        }
 
     @staticmethod
     def _generate_rule_based_reminders(
-        db: Session,
-        record: PlantingRecord
+        record: PlantingRecord,
+        crop: Crop,
+        context: Dict,
+        now: datetime
     ) -> List[SmartReminder]:
         """基于作物生长规则生成提醒"""
         reminders = []
 
-        # 获取作物信息
-        crop = db.query(Crop).filter(Crop.id == record.crop_id).first()
-        if not crop:
-            return reminders
-
         # 获取当前生长阶段的规则
-        stage_rule = db.query(CropGrowthStage).filter(
-            and_(
-                CropGrowthStage.crop_id == record.crop_id,
-                CropGrowthStage.stage == record.current_stage
-            )
-        ).first()
-
+        stage_rule = context["stage_rules"].get((record.crop_id, record.current_stage))
         if not stage_rule:
             return reminders
 
-        now = datetime.now()
+        def is_due(reminder_type: str, frequency: int) -> bool:
+            last_time = context["last_completed"].get((record.id, reminder_type))
+            days_since = (now - last_time).days if last_time else frequency + 1
+            return days_since >= frequency
 
         # 浇水提醒
-        if stage_rule.watering_frequency:
-            last_watering = SmartReminderEngine._get_last_completion_time(
-                db, record.id, "watering"
-            )
-            days_since = (now - last_watering).days if last_watering else stage_rule.watering_frequency + 1
-
-            if days_since >= stage_rule.watering_frequency:
-                reminders.append(SmartReminder(
-                    user_id=record.user_id,
-                    garden_id=record.garden_id,
-                    planting_record_id=record.id,
-                    reminder_type="watering",
-                    title=f"该给{crop.name}浇水了",
-                    description=f"建议浇水量：{stage_rule.watering_amount}升",
-                    remind_time=now,
-                    priority=4,
-                    source="rule_based",
-                    extra_data={
-                        "crop_name": crop.name,
-                        "growth_stage": record.current_stage,
-                        "watering_amount": stage_rule.watering_amount,
-                        "frequency": stage_rule.watering_frequency
-                    }
-                ))
+        if stage_rule.watering_frequency and is_due("watering", stage_rule.watering_frequency):
+            reminders.append(SmartReminder(
+                user_id=record.user_id,
+                garden_id=record.garden_id,
+                planting_record_id=record.id,
+                reminder_type="watering",
+                title=f"该给{crop.name}浇水了",
+                description=f"建议浇水量：{stage_rule.watering_amount}升",
+                remind_time=now,
+                priority=4,
+                source="rule_based",
+                extra_data={
+                    "crop_name": crop.name,
+                    "growth_stage": record.current_stage,
+                    "watering_amount": stage_rule.watering_amount,
+                    "frequency": stage_rule.watering_frequency
+                }
+            ))
 
         # 施肥提醒
-        if stage_rule.fertilizing_frequency:
-            last_fertilizing = SmartReminderEngine._get_last_completion_time(
-                db, record.id, "fertilizing"
-            )
-            days_since = (now - last_fertilizing).days if last_fertilizing else stage_rule.fertilizing_frequency + 1
-
-            if days_since >= stage_rule.fertilizing_frequency:
-                reminders.append(SmartReminder(
-                    user_id=record.user_id,
-                    garden_id=record.garden_id,
-                    planting_record_id=record.id,
-                    reminder_type="fertilizing",
-                    title=f"该给{crop.name}施肥了",
-                    description=f"推荐肥料：{stage_rule.fertilizer_type}",
-                    remind_time=now,
-                    priority=3,
-                    source="rule_based",
-                    extra_data={
-                        "crop_name": crop.name,
-                        "growth_stage": record.current_stage,
-                        "fertilizer_type": stage_rule.fertilizer_type,
-                        "frequency": stage_rule.fertilizing_frequency
-                    }
-                ))
+        if stage_rule.fertilizing_frequency and is_due("fertilizing", stage_rule.fertilizing_frequency):
+            reminders.append(SmartReminder(
+                user_id=record.user_id,
+                garden_id=record.garden_id,
+                planting_record_id=record.id,
+                reminder_type="fertilizing",
+                title=f"该给{crop.name}施肥了",
+                description=f"推荐肥料：{stage_rule.fertilizer_type}",
+                remind_time=now,
+                priority=3,
+                source="rule_based",
+                extra_data={
+                    "crop_name": crop.name,
+                    "growth_stage": record.current_stage,
+                    "fertilizer_type": stage_rule.fertilizer_type,
+                    "frequency": stage_rule.fertilizing_frequency
+                }
+            ))
 
         # 除草提醒
-        if stage_rule.weeding_frequency:
-            last_weeding = SmartReminderEngine._get_last_completion_time(
-                db, record.id, "weeding"
-            )
-            days_since = (now - last_weeding).days if last_weeding else stage_rule.weeding_frequency + 1
-
-            if days_since >= stage_rule.weeding_frequency:
-                reminders.append(SmartReminder(
-                    user_id=record.user_id,
-                    garden_id=record.garden_id,
-                    planting_record_id=record.id,
-                    reminder_type="weeding",
-                    title=f"{crop.name}需要除草",
-                    description="及时清除杂草，避免与作物争夺养分",
-                    remind_time=now,
-                    priority=2,
-                    source="rule_based",
-                    extra_data={
-                        "crop_name": crop.name,
-                        "growth_stage": record.current_stage,
-                        "frequency": stage_rule.weeding_frequency
-                    }
-                ))
+        if stage_rule.weeding_frequency and is_due("weeding", stage_rule.weeding_frequency):
+            reminders.append(SmartReminder(
+                user_id=record.user_id,
+                garden_id=record.garden_id,
+                planting_record_id=record.id,
+                reminder_type="weeding",
+                title=f"{crop.name}需要除草",
+                description="及时清除杂草，避免与作物争夺养分",
+                remind_time=now,
+                priority=2,
+                source="rule_based",
+                extra_data={
+                    "crop_name": crop.name,
+                    "growth_stage": record.current_stage,
+                    "frequency": stage_rule.weeding_frequency
+                }
+            ))
 
         # 病虫害检查提醒
-        if stage_rule.pest_check_frequency:
-            last_check = SmartReminderEngine._get_last_completion_time(
-                db, record.id, "pest_check"
-            )
-            days_since = (now - last_check).days if last_check else stage_rule.pest_check_frequency + 1
-
-            if days_since >= stage_rule.pest_check_frequency:
-                pest_info = ", ".join(crop.common_pests) if crop.common_pests else "常见病虫害"
-                reminders.append(SmartReminder(
-                    user_id=record.user_id,
-                    garden_id=record.garden_id,
-                    planting_record_id=record.id,
-                    reminder_type="pest_check",
-                    title=f"检查{crop.name}的病虫害",
-                    description=f"注意观察：{pest_info}",
-                    remind_time=now,
-                    priority=3,
-                    source="rule_based",
-                    extra_data={
-                        "crop_name": crop.name,
-                        "growth_stage": record.current_stage,
-                        "common_pests": crop.common_pests
-                    }
-                ))
-
-        return reminders
-
-    @staticmethod
-    def _generate_iot_based_reminders(
-        db: Session,
-        record: PlantingRecord
-    ) -> List[SmartReminder]:
-        """基于物联网数据生成提醒"""
-        reminders = []
-
-        crop = db.query(Crop).filter(Crop.id == record.crop_id).first()
-        if not crop or not crop.environment_requirements:
-            return reminders
-
-        # 获取最新的传感器读数
-        sensors = db.query(IoTSensor).filter(
-            and_(
-                IoTSensor.garden_id == record.garden_id,
-                IoTSensor.is_active == 1
-            )
-        ).all()
-
-        now = datetime.now()
-        requirements = crop.environment_requirements
-
-        for sensor in sensors:
-            # 获取最新读数
-            latest_reading = db.query(IoTReading).filter(
-                IoTReading.sensor_id == sensor.id
-            ).order_by(IoTReading.reading_time.desc()).first()
-
-            if not latest_reading:
-                continue
-
-            # 如果读数已经标记为异常，生成提醒
-            if latest_reading.is_abnormal:
-                # 检查是否已有类似提醒（避免重复）
-                existing = db.query(SmartReminder).filter(
-                    and_(
-                        SmartReminder.user_id == record.user_id,
-                        SmartReminder.garden_id == record.garden_id,
-                        SmartReminder.reminder_type == "environment_alert",
-                        SmartReminder.status == "pending",
-                        SmartReminder.created_at >= now - timedelta(hours=1)
-                    )
-                ).first()
-
-                if not existing:
-                    priority = 5 if sensor.sensor_type in ["temperature", "soil_moisture"] else 4
-
-                    reminders.append(SmartReminder(
-                        user_id=record.user_id,
-                        garden_id=record.garden_id,
-                        planting_record_id=record.id,
-                        reminder_type="environment_alert",
-                        title=f"{crop.name}环境异常警告",
-                        description=latest_reading.abnormal_reason,
-                        remind_time=now,
-                        priority=priority,
-                        source="iot_triggered",
-                        extra_data={
-                            "crop_name": crop.name,
-                            "sensor_type": sensor.sensor_type,
-                            "value": latest_reading.value,
-                            "unit": latest_reading.unit,
-                            "abnormal_reason": latest_reading.abnormal_reason
-                        }
-                    ))
+        if stage_rule.pest_check_frequency and is_due("pest_check", stage_rule.pest_check_frequency):
+            pest_info = ", ".join(crop.common_pests) if crop.common_pests else "常见病虫害"
+            reminders.append(SmartReminder(
+                user_id=record.user_id,
+                garden_id=record.garden_id,
+                planting_record_id=record.id,
+                reminder_type="pest_check",
+                title=f"检查{crop.name}的病虫害",
+                description=f"注意观察：{pest_info}",
+                remind_time=now,
+                priority=3,
+                source="rule_based",
+                extra_data={
+                    "crop_name": crop.name,
+                    "growth_stage": record.current_stage,
+                    "common_pests": crop.common_pests
+                }
+            ))
 
         return reminders
 
     @staticmethod
     def _check_harvest_time(
-        db: Session,
-        record: PlantingRecord
+        record: PlantingRecord,
+        crop: Crop,
+        context: Dict,
+        now: datetime
     ) -> Optional[SmartReminder]:
         """检查是否到收获时间"""
         if not record.expected_harvest_date:
             return None
 
-        now = datetime.now()
         days_until_harvest = (record.expected_harvest_date - now).days
 
-        # 提前3天提醒
-        if 0 <= days_until_harvest <= 3:
-            crop = db.query(Crop).filter(Crop.id == record.crop_id).first()
-
-            # 检查是否已有收获提醒
-            existing = db.query(SmartReminder).filter(
-                and_(
-                    SmartReminder.planting_record_id == record.id,
-                    SmartReminder.reminder_type == "harvest",
-                    SmartReminder.status == "pending"
-                )
-            ).first()
-
-            if not existing:
-                return SmartReminder(
-                    user_id=record.user_id,
-                    garden_id=record.garden_id,
-                    planting_record_id=record.id,
-                    reminder_type="harvest",
-                    title=f"{crop.name}即将可以收获",
-                    description=f"预计{days_until_harvest}天后可以收获，请做好准备",
-                    remind_time=now,
-                    priority=5,
-                    source="rule_based",
-                    extra_data={
-                        "crop_name": crop.name,
-                        "expected_harvest_date": record.expected_harvest_date.isoformat(),
-                        "days_until_harvest": days_until_harvest
-                    }
-                )
+        # 提前3天提醒，已有待处理的收获提醒时跳过
+        if 0 <= days_until_harvest <= 3 and record.id not in context["pending_harvest"]:
+            return SmartReminder(
+                user_id=record.user_id,
+                garden_id=record.garden_id,
+                planting_record_id=record.id,
+                reminder_type="harvest",
+                title=f"{crop.name}即将可以收获",
+                description=f"预计{days_until_harvest}天后可以收获，请做好准备",
+                remind_time=now,
+                priority=5,
+                source="rule_based",
+                extra_data={
+                    "crop_name": crop.name,
+                    "expected_harvest_date": record.expected_harvest_date.isoformat(),
+                    "days_until_harvest": days_until_harvest
+                }
+            )
 
         return None
 
     @staticmethod
-    def _get_last_completion_time(
-        db: Session,
-        planting_record_id: int,
-        reminder_type: str
-    ) -> Optional[datetime]:
-        """获取某类任务的最后完成时间"""
-        last_reminder = db.query(SmartReminder).filter(
-            and_(
-                SmartReminder.planting_record_id == planting_record_id,
-                SmartReminder.reminder_type == reminder_type,
-                SmartReminder.status == "completed"
-            )
-        ).order_by(SmartReminder.completed_at.desc()).first()
+    def _dedup_key(reminder: SmartReminder, now: datetime) -> str:
+        """
+        生成提醒的去重键：用户:种植记录:类型:时间桶
 
-        return last_reminder.completed_at if last_reminder else None
+        - 收获提醒：以预计收获日期为桶，每个收获日期只提醒一次
+        - 环境警告：1小时一个桶
+        - 其他规则提醒：6小时一个桶
+        """
+        if reminder.reminder_type == "harvest":
+            bucket = reminder.extra_data["expected_harvest_date"][:10].replace("-", "")
+        else:
+            hours = DEDUP_BUCKET_HOURS.get(reminder.reminder_type, DEDUP_BUCKET_HOURS["default"])
+            bucket = now.replace(hour=now.hour - now.hour % hours).strftime("%Y%m%d%H")
+
+        return f"{reminder.user_id}:{reminder.planting_record_id}:{reminder.reminder_type}:{bucket}"
 
     @staticmethod
-    def _save_reminder(db: Session, reminder: SmartReminder) -> SmartReminder:
-        """保存提醒（去重）"""
-        # 检查是否已存在相同的提醒
-        existing = db.query(SmartReminder).filter(
-            and_(
-                SmartReminder.user_id == reminder.user_id,
-                SmartReminder.planting_record_id == reminder.planting_record_id,
-                SmartReminder.reminder_type == reminder.reminder_type,
-                SmartReminder.status == "pending",
-                SmartReminder.created_at >= datetime.now() - timedelta(hours=6)
-            )
-        ).first()
+    def save_reminders(
+        db: Session,
+        reminders: List[SmartReminder],
+        now: datetime,
+        pending=()
+    ) -> List[SmartReminder]:
+        """
+        批量保存提醒（一条插入语句、一次提交）
 
-        if existing:
-            return existing
+        先按已加载的待处理提醒过滤，再以去重键冲突忽略插入，
+        接口、调度器、环境警告同时生成时也不会产生重复提醒
 
-        db.add(reminder)
+        Args:
+            db: 数据库会话
+            reminders: 待保存的提醒
+            now: 本次生成的时间（决定去重键的时间桶）
+            pending: 已存在的待处理提醒 {(user_id, planting_record_id, reminder_type)}
+
+        Returns:
+            本批提醒对应的数据库记录（含并发写入的同键提醒）
+        """
+        seen = set(pending)
+        keys = set()
+        rows = []
+        for reminder in reminders:
+            key = (reminder.user_id, reminder.planting_record_id, reminder.reminder_type)
+            if key in seen:
+                continue
+            seen.add(key)
+
+            dedup_key = SmartReminderEngine._dedup_key(reminder, now)
+            keys.add(dedup_key)
+
+            rows.append({
+                "user_id": reminder.user_id,
+                "garden_id": reminder.garden_id,
+                "planting_record_id": reminder.planting_record_id,
+                "reminder_type": reminder.reminder_type,
+                "title": reminder.title,
+                "description": reminder.description,
+                "remind_time": reminder.remind_time,
+                "priority": reminder.priority,
+                "source": reminder.source,
+                "extra_data": reminder.extra_data,
+                "status": "pending",
+                "dedup_key": dedup_key,
+                "created_at": now
+            })
+
+        if not rows:
+            return []
+
+        insert_ignore(db, SmartReminder, rows, index_elements=["dedup_key"])
         db.commit()
-        db.refresh(reminder)
-        return reminder
+        for user_id in {row["user_id"] for row in rows}:
+            StatisticsService.invalidate(user_id)
+
+        # 按去重键读回（一次查询）
+        return db.query(SmartReminder).filter(
+            SmartReminder.dedup_key.in_(keys)
+        ).order_by(SmartReminder.id).all()
 
     @staticmethod
     def complete_reminder(db: Session, reminder_id: int, user_id: int) -> bool:
@@ -364,6 +397,98 @@ class SmartReminderEngine:
         db.commit()
         return True
 
+    @staticmethod
+    def update_growth_stages(db: Session, user_id: int = None, batch_size: int = 1000) -> Dict:
+        """
+        批量更新进行中作物的生长阶段
+
+        每个作物的阶段累计边界只计算一次，所有记录的阶段在内存中按种植天数计算，
+        有变化的记录用 CASE 批量 UPDATE，一次提交
+
+        Args:
+            db: 数据库会话
+            user_id: 只更新该用户的种植记录（不传则全部）
+            batch_size: 每条 UPDATE 语句包含的记录数
+
+        Returns:
+            {"total": 进行中的记录数, "updated": 阶段或阶段天数有变化的记录数}
+        """
+        query = db.query(
+            PlantingRecord.id,
+            PlantingRecord.crop_id,
+            PlantingRecord.planting_date,
+            PlantingRecord.current_stage,
+            PlantingRecord.current_stage_day
+        ).filter(
+            and_(
+                PlantingRecord.status == "growing",
+                PlantingRecord.planting_date.isnot(None)
+            )
+        )
+        if user_id:
+            query = query.filter(PlantingRecord.user_id == user_id)
+
+        records = query.all()
+        if not records:
+            return {"total": 0, "updated": 0}
+
+        boundaries = SmartReminderEngine._stage_boundaries(db, {r.crop_id for r in records})
+
+        now = datetime.now()
+        stages: Dict[int, str] = {}
+        stage_days: Dict[int, int] = {}
+        for record in records:
+            crop_boundaries = boundaries.get(record.crop_id)
+            if not crop_boundaries:
+                continue
+
+            days_since_planting = (now - record.planting_date).days
+            stage, stage_day = GrowthStage.HARVEST, record.current_stage_day
+            for name, start_day, end_day in crop_boundaries:
+                if days_since_planting < end_day:
+                    stage, stage_day = name, days_since_planting - start_day + 1
+                    break
+
+            if stage != record.current_stage or stage_day != record.current_stage_day:
+                stages[record.id] = stage
+                stage_days[record.id] = stage_day
+
+        # 生长阶段不影响环境阈值，使用表级 UPDATE，不触发阈值索引的批量失效
+        table = PlantingRecord.__table__
+        ids = list(stages)
+        for i in range(0, len(ids), batch_size):
+            batch = ids[i:i + batch_size]
+            db.execute(
+                update(table)
+                .where(table.c.id.in_(batch))
+                .values(
+                    current_stage=case({k: stages[k] for k in batch}, value=table.c.id),
+                    current_stage_day=case({k: stage_days[k] for k in batch}, value=table.c.id)
+                )
+            )
+        db.commit()
+
+        return {"total": len(records), "updated": len(ids)}
+
+    @staticmethod
+    def _stage_boundaries(db: Session, crop_ids) -> Dict[int, List[tuple]]:
+        """
+        计算作物各生长阶段的累计天数边界（一次查询）
+
+        Returns:
+            {crop_id: [(阶段, 起始天数, 结束天数), ...]}，按阶段顺序排列
+        """
+        boundaries: Dict[int, List[tuple]] = {}
+        for crop_id, stage, stage_days in db.query(
+            CropGrowthStage.crop_id, CropGrowthStage.stage, CropGrowthStage.stage_days
+        ).filter(
+            CropGrowthStage.crop_id.in_(crop_ids)
+        ).order_by(CropGrowthStage.id).all():
+            crop_boundaries = boundaries.setdefault(crop_id, [])
+            start_day = crop_boundaries[-1][2] if crop_boundaries else 0
+            crop_boundaries.append((stage, start_day, start_day + (stage_days or 0)))
+        return boundaries
+
     @staticmethod
     def update_growth_stage(db: Session, planting_record_id: int) -> bool:
         """更新作物生长阶段"""
@@ -0,0 +1,124 @@
+"""
+聚合统计服务
+每张表一次 GROUP BY 得到各状态/类型的数量，个人中心的统计按用户短时缓存
+"""
+from typing import Callable, Dict, Sequence, Tuple
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session, object_session
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.crop import SmartReminder
+from app.models.order import Order, OrderStatus
+
+# session.info 中记录待失效用户的键
+_DIRTY_KEY = "stats_dirty_users"
+
+# (统计名称, 用户ID) -> 统计结果
+# ORM 修改在提交后使对应用户失效，绕过 ORM 的批量写入需自行调用 invalidate
+_stats_cache = TTLCache(maxsize=settings.STATS_CACHE_MAX_SIZE, ttl=settings.STATS_CACHE_TTL_SECONDS)
+
+
+class StatisticsService:
+    """聚合统计服务"""
+
+    @staticmethod
+    def group_counts(db: Session, group_by: Sequence, *criteria) -> Dict[Tuple, int]:
+        """
+        按列分组计数（一次查询）
+
+        Args:
+            db: 数据库会话
+            group_by: 分组列
+            criteria: 过滤条件
+
+        Returns:
+            {(分组值, ...): 数量}
+        """
+        rows = db.query(*group_by, func.count()).filter(*criteria).group_by(*group_by).all()
+        return {tuple(row[:-1]): row[-1] for row in rows}
+
+    @staticmethod
+    def _cached(name: str, user_id: int, compute: Callable[[], Dict]) -> Dict:
+        """按用户缓存统计结果（STATS_CACHE_TTL_SECONDS 为0时不缓存）"""
+        key = (name, user_id)
+        result = _stats_cache.get(key)
+        if result is None:
+            result = compute()
+            _stats_cache.set(key, result)
+        return result
+
+    @staticmethod
+    def order_stats(db: Session, user_id: int) -> Dict:
+        """
+        用户订单统计：总数及各状态数量
+
+        Returns:
+            {"total": 总数, "by_status": {状态: 数量}}（包含数量为0的状态）
+        """
+        def compute():
+            counts = StatisticsService.group_counts(
+                db, [Order.status], Order.user_id == user_id
+            )
+            by_status = {status.value: 0 for status in OrderStatus}
+            for (status,), count in counts.items():
+                by_status[status.value if isinstance(status, OrderStatus) else status] = count
+            return {"total": sum(counts.values()), "by_status": by_status}
+
+        return StatisticsService._cached("orders", user_id, compute)
+
+    @staticmethod
+    def reminder_stats(db: Session, user_id: int) -> Dict:
+        """
+        用户智能提醒统计：总数、待处理数、已完成数、待处理提醒按类型的数量
+
+        Returns:
+            {"total", "pending", "completed", "by_type": {类型: 待处理数量}}
+        """
+        def compute():
+            counts = StatisticsService.group_counts(
+                db, [SmartReminder.status, SmartReminder.reminder_type],
+                SmartReminder.user_id == user_id
+            )
+            by_type: Dict[str, int] = {}
+            by_status: Dict[str, int] = {}
+            for (status, reminder_type), count in counts.items():
+                by_status[status] = by_status.get(status, 0) + count
+                if status == "pending":
+                    by_type[reminder_type] = count
+            return {
+                "total": sum(counts.values()),
+                "pending": by_status.get("pending", 0),
+                "completed": by_status.get("completed", 0),
+                "by_type": by_type
+            }
+
+        return StatisticsService._cached("reminders", user_id, compute)
+
+    @staticmethod
+    def invalidate(user_id: int) -> None:
+        """使用户的统计缓存失效"""
+        _stats_cache.delete(("orders", user_id))
+        _stats_cache.delete(("reminders", user_id))
+
+
+@event.listens_for(Order, "after_insert")
+@event.listens_for(Order, "after_update")
+@event.listens_for(Order, "after_delete")
+@event.listens_for(SmartReminder, "after_insert")
+@event.listens_for(SmartReminder, "after_update")
+@event.listens_for(SmartReminder, "after_delete")
+def _record_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_DIRTY_KEY, set()).add(target.user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    for user_id in session.info.pop(_DIRTY_KEY, ()):
+        StatisticsService.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop(_DIRTY_KEY, None)
@@ -71,13 +71,78 @@ CREATE TABLE IF NOT EXISTS `smart_reminders` (
   `extra_data` JSON COMMENT '元数据',
   `status` VARCHAR(20) DEFAULT 'pending' COMMENT '状态(pending/completed/ignored)',
   `completed_at` TIMESTAMP NULL COMMENT '完成时间',
+  `sent_at` TIMESTAMP NULL COMMENT '投递时间(为空表示未投递)',
+  `dedup_key` VARCHAR(100) NULL COMMENT '去重键(用户:种植记录:类型:时间桶)',
   `created_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   `updated_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  UNIQUE KEY `uk_dedup_key` (`dedup_key`),
   INDEX `idx_user_status` (`user_id`, `status`),
   INDEX `idx_remind_time` (`remind_time`),
+  INDEX `idx_sent_remind_time` (`sent_at`, `remind_time`),
   INDEX `idx_type` (`reminder_type`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='智能提醒表';
 
+-- 5. 传感器最新读数表（数据上报时 upsert 维护）
+CREATE TABLE IF NOT EXISTS `sensor_latest` (
+  `sensor_id` INT PRIMARY KEY COMMENT '传感器ID',
+  `garden_id` INT NOT NULL COMMENT '菜地ID',
+  `sensor_type` VARCHAR(50) NOT NULL COMMENT '传感器类型',
+  `value` FLOAT NOT NULL COMMENT '读数值',
+  `unit` VARCHAR(20) COMMENT '单位',
+  `is_abnormal` INT DEFAULT 0 COMMENT '是否异常(1=异常,0=正常)',
+  `abnormal_reason` VARCHAR(200) COMMENT '异常原因',
+  `reading_time` TIMESTAMP NOT NULL COMMENT '读数时间',
+  `updated_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  INDEX `idx_garden` (`garden_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='传感器最新读数表';
+
+-- 从已有读数回填最新读数（可重复执行）
+INSERT IGNORE INTO `sensor_latest`
+  (`sensor_id`, `garden_id`, `sensor_type`, `value`, `unit`, `is_abnormal`, `abnormal_reason`, `reading_time`)
+SELECT s.`id`, s.`garden_id`, s.`sensor_type`, r.`value`, r.`unit`, r.`is_abnormal`, r.`abnormal_reason`, r.`reading_time`
+FROM `iot_sensors` s
+JOIN `iot_readings` r ON r.`id` = (
+  SELECT r2.`id` FROM `iot_readings` r2
+  WHERE r2.`sensor_id` = s.`id`
+  ORDER BY r2.`reading_time` DESC, r2.`id` DESC
+  LIMIT 1
+);
+
+-- 6. 传感器读数汇总表（按 5m/1h/1d 时间桶汇总）
+CREATE TABLE IF NOT EXISTS `iot_reading_rollups` (
+  `id` INT PRIMARY KEY AUTO_INCREMENT COMMENT '汇总ID',
+  `sensor_id` INT NOT NULL COMMENT '传感器ID',
+  `resolution` VARCHAR(8) NOT NULL COMMENT '汇总粒度(5m/1h/1d)',
+  `bucket_start` TIMESTAMP NOT NULL COMMENT '时间桶起始时间',
+  `reading_count` INT NOT NULL DEFAULT 0 COMMENT '读数条数',
+  `sum_value` DOUBLE NOT NULL DEFAULT 0 COMMENT '读数之和',
+  `min_value` FLOAT COMMENT '最小值',
+  `max_value` FLOAT COMMENT '最大值',
+  `abnormal_count` INT NOT NULL DEFAULT 0 COMMENT '异常读数条数',
+  UNIQUE KEY `uk_sensor_resolution_bucket` (`sensor_id`, `resolution`, `bucket_start`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='传感器读数汇总表';
+
+-- 从已有读数回填汇总（可重复执行，已有的桶按原始读数重新计算后覆盖）
+-- 时间桶与 iot_rollup.bucket_start 一致：从 2000-01-01 起按粒度秒数对齐
+INSERT INTO `iot_reading_rollups`
+  (`sensor_id`, `resolution`, `bucket_start`, `reading_count`, `sum_value`, `min_value`, `max_value`, `abnormal_count`)
+SELECT r.`sensor_id`, g.`resolution`,
+       DATE_ADD('2000-01-01', INTERVAL TIMESTAMPDIFF(SECOND, '2000-01-01', r.`reading_time`) DIV g.`seconds` * g.`seconds` SECOND) AS `bucket`,
+       COUNT(*), SUM(r.`value`), MIN(r.`value`), MAX(r.`value`), SUM(r.`is_abnormal` <> 0)
+FROM `iot_readings` r
+CROSS JOIN (
+  SELECT '5m' AS `resolution`, 300 AS `seconds`
+  UNION ALL SELECT '1h', 3600
+  UNION ALL SELECT '1d', 86400
+) g
+GROUP BY r.`sensor_id`, g.`resolution`, `bucket`
+ON DUPLICATE KEY UPDATE
+  `reading_count` = VALUES(`reading_count`),
+  `sum_value` = VALUES(`sum_value`),
+  `min_value` = VALUES(`min_value`),
+  `max_value` = VALUES(`max_value`),
+  `abnormal_count` = VALUES(`abnormal_count`);
+
 -- 验证表是否创建成功
 SHOW TABLES LIKE '%iot%';
 SHOW TABLES LIKE '%planting%';
@@ -88,3 +153,5 @@ DESCRIBE iot_sensors;
 DESCRIBE iot_readings;
 DESCRIBE planting_records;
 DESCRIBE smart_reminders;
+DESCRIBE sensor_latest;
+DESCRIBE iot_reading_rollups;
@@ -73,6 +73,8 @@ CREATE TABLE orders (
     INDEX idx_user_id (user_id),
     INDEX idx_garden_id (garden_id),
     INDEX idx_status (status),
+    INDEX idx_user_created (user_id, created_at, id),
+    INDEX idx_garden_period (garden_id, start_date, end_date),
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (garden_id) REFERENCES gardens(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='订单表';
@@ -91,7 +93,7 @@ CREATE TABLE posts (
     comment_count INT DEFAULT 0 COMMENT '评论数',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '发布时间',
     INDEX idx_user_id (user_id),
-    INDEX idx_created_at (created_at),
+    INDEX idx_created_at (created_at, id),
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='社区帖子表';
 
@@ -127,6 +129,21 @@ CREATE TABLE likes (
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='点赞表';
 
+-- ============================================
+-- 6.1 帖子计数增量表 (post_counter_deltas)
+-- 点赞/评论只追加增量，由调度器定时合并回 posts
+-- ============================================
+DROP TABLE IF EXISTS post_counter_deltas;
+CREATE TABLE post_counter_deltas (
+    id INT PRIMARY KEY AUTO_INCREMENT COMMENT '增量ID',
+    post_id INT NOT NULL COMMENT '帖子ID',
+    like_delta INT NOT NULL DEFAULT 0 COMMENT '点赞数增量',
+    comment_delta INT NOT NULL DEFAULT 0 COMMENT '评论数增量',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '记录时间',
+    INDEX idx_post_id (post_id),
+    FOREIGN KEY (post_id) REFERENCES posts(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='帖子计数增量表';
+
 -- ============================================
 -- 7. 增值服务表 (services)
 -- ============================================
@@ -144,6 +161,7 @@ CREATE TABLE services (
     INDEX idx_order_id (order_id),
     INDEX idx_user_id (user_id),
     INDEX idx_status (status),
+    INDEX idx_user_created (user_id, created_at, id),
     FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='增值服务表';
@@ -160,11 +178,14 @@ CREATE TABLE reminders (
     content TEXT NOT NULL COMMENT '提醒内容',
     remind_time TIMESTAMP NOT NULL COMMENT '提醒时间',
     status ENUM('pending', 'sent', 'completed') DEFAULT 'pending' COMMENT '状态',
+    sent_at TIMESTAMP NULL COMMENT '投递时间(为空表示未投递)',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
     INDEX idx_order_id (order_id),
     INDEX idx_user_id (user_id),
     INDEX idx_remind_time (remind_time),
     INDEX idx_status (status),
+    INDEX idx_user_remind_time (user_id, remind_time, id),
+    INDEX idx_sent_remind_time (sent_at, remind_time),
     FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='任务提醒表';
@@ -292,11 +313,15 @@ CREATE TABLE smart_reminders (
     extra_data JSON COMMENT '元数据',
     status VARCHAR(20) DEFAULT 'pending' COMMENT '状态',
     completed_at TIMESTAMP NULL COMMENT '完成时间',
+    sent_at TIMESTAMP NULL COMMENT '投递时间(为空表示未投递)',
+    dedup_key VARCHAR(100) NULL COMMENT '去重键(用户:种植记录:类型:时间桶)',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    UNIQUE KEY uk_dedup_key (dedup_key),
     INDEX idx_user_id (user_id),
     INDEX idx_garden_id (garden_id),
     INDEX idx_remind_time (remind_time),
+    INDEX idx_sent_remind_time (sent_at, remind_time),
     INDEX idx_status (status)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='智能提醒记录表';
 
@@ -113,14 +113,13 @@ def generate_sample_iot_data():
 
         logger.info(f"为 {len(gardens)} 个菜地生成历史数据（最近7天）...")
 
-        for garden in gardens:
-            result = IoTSimulator.generate_historical_data(
-                db,
-                garden_id=garden.id,
-                days=7,
-                interval_minutes=60  # 每小时一次
-            )
-            logger.info(f"  ✓ 菜地 {garden.name}: {result['total_readings']} 条数据")
+        result = IoTSimulator.generate_historical_data_bulk(
+            db,
+            [garden.id for garden in gardens],
+            days=7,
+            interval_minutes=60  # 每小时一次
+        )
+        logger.info(f"  ✓ {result['gardens']} 个菜地共 {result['total_readings']} 条数据")
 
         logger.info("✓ 示例物联网数据生成完成")
         return True
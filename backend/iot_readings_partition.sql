@@ -0,0 +1,28 @@
+-- iot_readings 按天分区（MySQL，可选）
+-- 分区后归档任务直接 DROP PARTITION 删除过期数据，不再逐行 DELETE，
+-- 过期数据的索引（idx_sensor_time）也随分区一起释放
+--
+-- 注意：
+-- 1. 分区表的主键必须包含分区列，因此主键改为 (id, reading_time)
+-- 2. 执行前请备份数据，ALTER 会重建整张表，数据量大时请在低峰期执行
+-- 3. 初始分区：p_history 存放今天之前的数据（由归档任务按行删除），
+--    之后的按天分区和 pmax 由归档任务（TaskScheduler.archive_iot_readings）每天自动拆分
+
+USE garden_db;
+
+ALTER TABLE `iot_readings`
+  MODIFY `reading_time` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '读数时间',
+  DROP PRIMARY KEY,
+  ADD PRIMARY KEY (`id`, `reading_time`);
+
+-- 请将日期替换为执行当天
+ALTER TABLE `iot_readings`
+  PARTITION BY RANGE (UNIX_TIMESTAMP(`reading_time`)) (
+    PARTITION p_history VALUES LESS THAN (UNIX_TIMESTAMP('2025-01-01 00:00:00')),
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+  );
+
+-- 查看分区
+SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS
+FROM information_schema.PARTITIONS
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'iot_readings';
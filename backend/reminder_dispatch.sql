@@ -0,0 +1,18 @@
+-- 提醒投递调度器所需的字段和索引（已有数据库升级用，新建库已包含）
+-- 调度器按时间窗口范围扫描待投递的提醒（投递状态单独记录在 sent_at，不改变提醒状态）：
+--   smart_reminders: sent_at IS NULL AND remind_time 在窗口内
+--   reminders:       sent_at IS NULL AND remind_time 在窗口内
+
+USE garden_db;
+
+ALTER TABLE `smart_reminders`
+  ADD COLUMN `sent_at` TIMESTAMP NULL COMMENT '投递时间(为空表示未投递)' AFTER `completed_at`,
+  ADD INDEX `idx_sent_remind_time` (`sent_at`, `remind_time`);
+
+ALTER TABLE `reminders`
+  ADD COLUMN `sent_at` TIMESTAMP NULL COMMENT '投递时间(为空表示未投递)' AFTER `status`,
+  ADD INDEX `idx_sent_remind_time` (`sent_at`, `remind_time`);
+
+-- 已到期的历史提醒视为已投递，避免上线时集中补发
+UPDATE `smart_reminders` SET `sent_at` = `remind_time` WHERE `remind_time` < NOW();
+UPDATE `reminders` SET `sent_at` = `remind_time` WHERE `remind_time` < NOW();
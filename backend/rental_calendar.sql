@@ -0,0 +1,8 @@
+-- 菜地租用日历所需的索引（已有数据库升级用，新建库已包含）
+-- 下单重叠检查和按时间段筛选可租菜地都按菜地查询租期区间：
+--   orders: garden_id = ? AND start_date <= 结束日期 AND end_date >= 开始日期
+
+USE garden_db;
+
+ALTER TABLE `orders`
+  ADD INDEX `idx_garden_period` (`garden_id`, `start_date`, `end_date`);
@@ -0,0 +1,13 @@
+-- smart_reminders 增加去重键（已有数据库升级用，新建库已包含）
+-- 提醒生成使用 INSERT ... ON DUPLICATE KEY UPDATE，依靠唯一索引保证
+-- 接口和调度器同时生成时也不会产生重复提醒
+--
+-- 已有提醒的 dedup_key 为 NULL，不受唯一索引约束
+
+USE garden_db;
+
+ALTER TABLE `smart_reminders`
+  ADD COLUMN `dedup_key` VARCHAR(100) NULL COMMENT '去重键(用户:种植记录:类型:时间桶)' AFTER `completed_at`,
+  ADD UNIQUE KEY `uk_dedup_key` (`dedup_key`);
+
+DESCRIBE smart_reminders;